@@ -0,0 +1,94 @@
+"""
+This module contains the heavy analytics computations on latent
+trajectories.
+
+The functions only depend on their arguments, so that they can be executed
+in the worker processes of the job scheduler. Each function accepts an
+optional `progress` callable receiving the completed fraction of the work.
+"""
+from typing import Callable, List
+
+import numpy as np
+
+from tslearn.barycenters import dtw_barycenter_averaging
+from tslearn.utils import to_time_series_dataset
+from dtaidistance.dtw_ndim import distance_matrix_fast
+
+
+# Quantiles of the distances to the barycenter stored with the d2b documents.
+QUANTILES = (0.05, 0.25, 0.75, 0.95)
+
+
+def _report(progress: Callable[[float], None], value: float) -> None:
+    if progress is not None:
+        progress(value)
+
+
+def barycenter(sequences: List[np.ndarray], progress=None) -> np.ndarray:
+    """Computes the DTW barycenter of the given latent sequences.
+
+    Returns
+    -------
+    An array of shape [n_frames, n_dims].
+    """
+    res = dtw_barycenter_averaging(to_time_series_dataset(sequences))
+    _report(progress, 1.0)
+    return res
+
+
+def distances_to_barycenter(sequences: List[np.ndarray], barycenter: np.ndarray,
+                            window=25, psi=2, progress=None) -> List[float]:
+    """Computes the DTW distance of every sequence to the barycenter.
+
+    The distances are computed in one call to dtaidistance, which distributes them
+    over all cores.
+
+    Returns
+    -------
+    A list with one distance per sequence.
+    """
+    if len(sequences) == 0:
+        return []
+
+    series = [np.ascontiguousarray(barycenter, dtype=np.double)]
+    series += [np.ascontiguousarray(seq, dtype=np.double) for seq in sequences]
+    values = distance_matrix_fast(series, window=window, psi=psi, block=((0, 1), (1, len(series))),
+                                  compact=True, parallel=True)
+    _report(progress, 1.0)
+    return np.asarray(values).tolist()
+
+
+def referent_distances(items: List[tuple], window=25, psi=2, progress=None) -> List[tuple]:
+    """Computes the distances to the barycenter for several referents.
+
+    Parameters
+    ----------
+    items:
+        A list of tuples (referent, sequences, barycenter). A missing barycenter is
+        computed from the sequences.
+
+    Returns
+    -------
+    A list of tuples (referent, barycenter, distances).
+    """
+    res = []
+    for i, (referent, sequences, bary) in enumerate(items):
+        if bary is None:
+            bary = barycenter(sequences)
+        res.append((referent, np.asarray(bary), distances_to_barycenter(sequences, bary, window=window, psi=psi)))
+        _report(progress, (i + 1) / len(items))
+    return res
+
+
+def summary_statistics(values: List[float]) -> dict:
+    """Computes the summary statistics of distances stored with the d2b documents."""
+    values = np.asarray(values, dtype=np.double)
+    if values.size == 0:
+        return {'median': None, 'mean': None, 'var': None, 'quantiles': {}}
+
+    return {
+        'median': float(np.median(values)),
+        'mean': float(np.mean(values)),
+        'var': float(np.var(values)),
+        'quantiles': {f'q{int(q * 100):02d}': float(v) for q, v in zip(QUANTILES, np.quantile(values, QUANTILES))},
+    }
@@ -3,20 +3,27 @@ This module handles the routing of different request to the
 appropiate controller methods.
 """
 import os
-import threading
+import json
+import time
 from functools import wraps
 from pathlib import Path
 from uuid import uuid4
 from typing import List
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
 from flask_uploads import UploadSet, configure_uploads
 
 import click
 import numpy as np
 
+import http_cache
+import metrics
+import profiling
 from controller import Controller
+from inference import InferenceBatcher
+from jobs import JobScheduler, QueueFullError
+from serialization import FRAMES_MIMETYPE
 
 
 class ValidationError(Exception):
@@ -51,12 +58,79 @@ def validate_request_field(field_name, required=True, field_type=str):
         return wrapper
     return decorator
 
+def negotiate_format(f):
+    """Serves the binary frame format to clients that prefer it over json.
+
+    The wrapped route receives a `binary` keyword argument and may return bytes,
+    which are sent with the binary frame mimetype.
+    """
+    @wraps(f)
+    def wrapper(*args, **kw):
+        accepted = request.accept_mimetypes.best_match(['application/json', FRAMES_MIMETYPE])
+        res = f(*args, binary=accepted == FRAMES_MIMETYPE, **kw)
+
+        if isinstance(res, bytes):
+            return Response(res, mimetype=FRAMES_MIMETYPE)
+        return res
+    return wrapper
+
 UPLOAD_FOLDER = Path.cwd() / 'uploads'
 
 @click.command()
 @click.option(
     '--debug', is_flag=True, default=False
 )
+@click.option(
+    '--memory-budget', type=int, default=4096,
+    help='Maximum memory in MB used by the configurations kept in memory.'
+)
+@click.option(
+    '--workers', type=int, default=2,
+    help='Number of worker processes running clustering and barycenter jobs.'
+)
+@click.option(
+    '--max-queued', type=int, default=16,
+    help='Number of jobs that may wait for a free worker before new jobs are rejected.'
+)
+@click.option(
+    '--warmup-barycenters', is_flag=True, default=False,
+    help='Compute the barycenters of all referents in the background when a configuration is initialized.'
+)
+@click.option(
+    '--decode-resolution', type=float, default=1e-3,
+    help='Resolution to which hovered latent codes are quantized for the decode cache. 0 disables the cache.'
+)
+@click.option(
+    '--lattice-size', type=int, default=0,
+    help='Number of points along each axis of the lattice decoded for interpolated hover decoding, e.g. 128. '
+         'The lattice is decoded on every load of a configuration. 0 disables it.'
+)
+@click.option(
+    '--precision', type=click.Choice(['float64', 'float32', 'int8']), default='float32',
+    help='Inference precision of the configurations that do not set their own.'
+)
+@click.option(
+    '--batch-window', type=float, default=0.0,
+    help='Time in ms a batch waits for further decoder calls of concurrent requests.'
+)
+@click.option(
+    '--max-batch-size', type=int, default=1024,
+    help='Number of latent codes after which a batch is decoded without waiting for the end of the window.'
+)
+@click.option(
+    '--response-cache-size', type=int, default=256,
+    help='Number of analytical responses cached under their ETags. 0 disables the cache, ETags and compression '
+         'are still used.'
+)
+@click.option(
+    '--response-cache-bytes', type=int, default=256 * 1024 ** 2,
+    help='Maximum number of bytes of the cached analytical responses, including their compressed copies.'
+)
+@click.option(
+    '--profile-dir', type=click.Path(file_okay=False), default=None,
+    help='Allow clients to profile single requests with the X-Profile header or the profile query flag. '
+         'The profiles are stored in this directory.'
+)
 def cli(**kwargs):
     app = create_app(**kwargs)
     app.run('0.0.0.0', 5000, debug=kwargs['debug'])
@@ -70,16 +144,99 @@ def create_app(**kwargs):
     app.config['UPLOADED_FILES_DEST'] = UPLOAD_FOLDER
     uploads_set = UploadSet('files', {'pth', 'h5', 'csv'})
     configure_uploads(app, (uploads_set,))
-    CORS(app)
-
-    controller = Controller(filestore=uploads_set, upload_dir=UPLOAD_FOLDER)
+    # The ETag header is exposed to the frontend, which revalidates POST responses itself
+    CORS(app, expose_headers=['ETag'])
+
+    scheduler = JobScheduler(max_workers=kwargs.get('workers', 2), max_queued=kwargs.get('max_queued', 16))
+    inference = InferenceBatcher(window=kwargs.get('batch_window', 0.0) / 1000,
+                                 max_batch_size=kwargs.get('max_batch_size', 1024))
+    controller = Controller(filestore=uploads_set, upload_dir=UPLOAD_FOLDER,
+                            memory_budget=kwargs.get('memory_budget', 4096) * 1024 ** 2,
+                            scheduler=scheduler,
+                            warmup_barycenters=kwargs.get('warmup_barycenters', False),
+                            decode_resolution=kwargs.get('decode_resolution', 1e-3) or None,
+                            inference=inference,
+                            lattice_size=kwargs.get('lattice_size', 0) or None,
+                            default_precision=kwargs.get('precision', 'float32'))
+    controller.create_indexes()
+
+    responses = http_cache.ResponseCache(controller.config_version,
+                                         maxsize=kwargs.get('response_cache_size', 256),
+                                         maxbytes=kwargs.get('response_cache_bytes', 256 * 1024 ** 2))
+    binary_formats = ('application/json', FRAMES_MIMETYPE)
+
+    registry = metrics.Registry()
+    request_latency = registry.histogram('irl_request_seconds', 'Latency of the requests by route.',
+                                         ['route', 'method', 'status'])
+    registry.add(metrics.PHASES)
+    registry.register(controller.collect_metrics)
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_latency(response):
+        # Label by the route pattern, so that the number of series stays bounded
+        if 'request_start' in g:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            request_latency.observe(time.perf_counter() - g.request_start, route, request.method,
+                                    response.status_code)
+        return response
+
+    @app.route('/api/metrics')
+    def get_metrics():
+        return Response(registry.render(), content_type=metrics.CONTENT_TYPE)
+
+    # The profiling hooks are only installed if profiling is allowed
+    profile_dir = kwargs.get('profile_dir')
+    if profile_dir is not None:
+        @app.before_request
+        def start_profiler():
+            if request.headers.get(profiling.PROFILE_HEADER) or request.args.get(profiling.PROFILE_PARAM):
+                g.profiler = profiling.Sampler().start()
+
+        @app.after_request
+        def store_profile(response):
+            sampler = g.pop('profiler', None)
+            if sampler is not None:
+                response.headers[profiling.PROFILE_ID_HEADER] = profiling.save(sampler.stop(), profile_dir)
+            return response
+
+        @app.teardown_request
+        def stop_profiler(_):
+            sampler = g.pop('profiler', None)
+            if sampler is not None:
+                sampler.stop()
+
+        @app.route('/api/profiles/<profile_id>')
+        def get_profile(profile_id):
+            file = profiling.path(profile_dir, profile_id)
+            if file is None:
+                return jsonify({"error": f"Unknown profile: {profile_id}"}), 404
+            return Response(file.read_text(), mimetype='text/plain')
+
+    @app.errorhandler(QueueFullError)
+    def queue_full(err):
+        return jsonify({"error": str(err)}), 503
 
     ############################# App Config Data ###############################
 
     @app.route('/api/config/new', methods=["POST"])
     def new_config():
         name = request.form['name']
-        return controller.new_config(name, request.files['model_file'], request.files['data_file'])
+        return controller.new_config(name, request.files['model_file'], request.files['data_file'],
+                                     inference_precision=request.form.get('precision'))
+
+    @app.route('/api/config/precision', methods=["POST"])
+    @validate_request_field('configID', required=True, field_type=str)
+    @validate_request_field('precision', required=True, field_type=str)
+    def set_precision(data):
+        return controller.set_precision(data['configID'], data['precision'])
+
+    @app.route('/api/config/precision/report/<configID>')
+    def get_precision_report(configID):
+        return controller.get_precision_report(configID)
 
     @app.route('/api/config/list', methods=["GET"])
     def list_config():
@@ -96,45 +253,138 @@ def create_app(**kwargs):
     @app.route('/api/data/skeleton_grid/', methods=["POST"])
     @validate_request_field('xrange', required=True, field_type=list)
     @validate_request_field('yrange', required=True, field_type=list)
+    @validate_request_field('configID', required=True, field_type=str)
     def skeleton_grid(data):
-        return controller.calculate_skeleton_grid(data['xrange'], data['yrange'])
+        return controller.calculate_skeleton_grid(data['xrange'], data['yrange'], data['configID'])
 
     @app.route('/api/data/decode/', methods=["POST"])
+    @negotiate_format
     @validate_request_field('latent_code', required=True, field_type=np.ndarray)
-    def decode(data):
+    @validate_request_field('mode', required=False, field_type=str)
+    @validate_request_field('configID', required=True, field_type=str)
+    def decode(data, binary):
         latent_code = np.array(data['latent_code'])
-        return controller.calculate_reconstruction(latent_code)
+        return controller.calculate_reconstruction(latent_code, data['configID'], mode=data['mode'] or 'exact',
+                                                   binary=binary)
+
+    @app.route('/api/data/decode/batch', methods=["POST"])
+    @negotiate_format
+    @validate_request_field('queries', required=True, field_type=list)
+    @validate_request_field('samples', required=False, field_type=int)
+    @validate_request_field('mode', required=False, field_type=str)
+    @validate_request_field('configID', required=True, field_type=str)
+    def decode_batch(data, binary):
+        return controller.calculate_reconstruction_batch(data['queries'], data['configID'], samples=data['samples'],
+                                                         mode=data['mode'] or 'exact', binary=binary)
+
+    @app.route('/api/status/decode_cache')
+    def get_decode_cache_status():
+        return controller.get_decode_cache_status()
+
+    @app.route('/api/status/lattice/<configID>')
+    def get_lattice_status(configID):
+        return controller.get_lattice_status(configID)
+
+    @app.route('/api/status/response_cache')
+    def get_response_cache_status():
+        return jsonify(responses.stats())
+
+    @app.route('/api/status/inference')
+    def get_inference_status():
+        return controller.get_inference_status()
 
     @app.route('/api/data/skeleton/', methods=["POST"])
+    @negotiate_format
     @validate_request_field('index', required=False, field_type=int)
-    def original_skeleton(data):
-        return controller.get_skeleton(data['index'])
+    @validate_request_field('configID', required=True, field_type=str)
+    def original_skeleton(data, binary):
+        return controller.get_skeleton(data['index'], data['configID'], binary=binary)
 
     ######################### Dataset Info #####################################
 
     @app.route('/api/data/trials/values', methods=["POST"])
+    @responses.cached(binary_formats)
+    @negotiate_format
     @validate_request_field('gesture_type', required=True, field_type=List[str])
-    def trials_values(data):
-        return controller.get_latent_trial_values(data['gesture_type'])
+    @validate_request_field('viewport', required=False, field_type=dict)
+    @validate_request_field('tolerance', required=False, field_type=float)
+    @validate_request_field('configID', required=True, field_type=str)
+    def trials_values(data, binary):
+        tolerance = data['tolerance'] if data['tolerance'] is not None else 1.0
+        return controller.get_latent_trial_values(data['gesture_type'], data['configID'], viewport=data['viewport'],
+                                                  tolerance=tolerance, binary=binary)
+
+    @app.route('/api/data/density', methods=["POST"])
+    @responses.cached(binary_formats)
+    @negotiate_format
+    @validate_request_field('gesture_type', required=True, field_type=List[str])
+    @validate_request_field('xrange', required=True, field_type=list)
+    @validate_request_field('yrange', required=True, field_type=list)
+    @validate_request_field('bins', required=False, field_type=int)
+    @validate_request_field('configID', required=True, field_type=str)
+    def density(data, binary):
+        return controller.get_density(data['gesture_type'], data['xrange'], data['yrange'], data['configID'],
+                                      bins=data['bins'] or 128, binary=binary)
+
+    @app.route('/api/data/frames/nearest', methods=["POST"])
+    @negotiate_format
+    @validate_request_field('point', required=True, field_type=List[float])
+    @validate_request_field('k', required=False, field_type=int)
+    @validate_request_field('gesture_type', required=False, field_type=List[str])
+    @validate_request_field('configID', required=True, field_type=str)
+    def nearest_frames(data, binary):
+        return controller.get_nearest_frames(data['point'], data['configID'], gesture_type=data['gesture_type'],
+                                             k=data['k'] or 1, binary=binary)
+
+    @app.route('/api/data/frames/radius', methods=["POST"])
+    @negotiate_format
+    @validate_request_field('point', required=True, field_type=List[float])
+    @validate_request_field('radius', required=True, field_type=float)
+    @validate_request_field('gesture_type', required=False, field_type=List[str])
+    @validate_request_field('configID', required=True, field_type=str)
+    def frames_within_radius(data, binary):
+        return controller.get_frames_within_radius(data['point'], data['radius'], data['configID'],
+                                                   gesture_type=data['gesture_type'], binary=binary)
+
+    @app.route('/api/data/frames/polygon', methods=["POST"])
+    @negotiate_format
+    @validate_request_field('polygon', required=True, field_type=List[List[float]])
+    @validate_request_field('gesture_type', required=False, field_type=List[str])
+    @validate_request_field('configID', required=True, field_type=str)
+    def frames_within_polygon(data, binary):
+        return controller.get_frames_within_polygon(data['polygon'], data['configID'],
+                                                    gesture_type=data['gesture_type'], binary=binary)
 
     @app.route('/api/data/referents', methods=["GET"])
+    @responses.cached()
     def get_referents():
-        return controller.get_referents()
+        if 'configID' not in request.args:
+            return jsonify({"error": ValidationError('configID').message}), 400
+        return controller.get_referents(request.args['configID'])
 
 
     ############################# Bary Center Data ###############################
 
     @app.route('/api/data/barycenters', methods=["POST"])
+    @responses.cached(when=lambda body: not json.loads(body)['pending'])
     @validate_request_field('gesture_type', required=True, field_type=List[str])
     @validate_request_field('configID', required=True, field_type=str)
     def barycenters(data):
         return controller.get_barycenters(data['gesture_type'], data['configID'])
 
+    @app.route('/api/status/barycenters/<configID>')
+    def get_barycenter_status(configID):
+        return controller.get_barycenter_status(configID)
+
     @app.route('/api/data/barycenter_reconstruction', methods=["POST"])
+    @responses.cached(binary_formats)
+    @negotiate_format
     @validate_request_field('referent', required=True, field_type=str)
     @validate_request_field('configID', required=True, field_type=str)
-    def get_barycenter_reconstruction(data):
-        barycenter = controller.get_barycenter_reconstruction(data['referent'], data['configID'])
+    def get_barycenter_reconstruction(data, binary):
+        barycenter = controller.get_barycenter_reconstruction(data['referent'], data['configID'], binary=binary)
+        if isinstance(barycenter, str) and barycenter.startswith('{"error"'):
+            return barycenter, 404
         return barycenter
     
     ############################# Clustering Data ###############################
@@ -144,26 +394,35 @@ def create_app(**kwargs):
     @validate_request_field('k', required=True, field_type=int)
     @validate_request_field('init', required=True, field_type=List[List[int]])
     @validate_request_field('centroid_names', required=True, field_type=str)
+    @validate_request_field('configID', required=True, field_type=str)
+    @validate_request_field('restarts', required=False, field_type=int)
+    @validate_request_field('window', required=False, field_type=int)
+    @validate_request_field('max_iter', required=False, field_type=int)
+    @validate_request_field('tol', required=False, field_type=float)
+    @validate_request_field('warm_start', required=False, field_type=str)
     def trigger_clustering(data):
         uid = uuid4()
-        th = threading.Thread(
-            target=controller.run_clustering,
-            args=(str(uid), data['rid'], data['k'], data['init'], data['centroid_names']))
-        th.start()
+        options = {key: data[key] for key in ('restarts', 'window', 'max_iter', 'tol', 'warm_start') if data[key] is not None}
+        controller.run_clustering(str(uid), data['rid'], data['k'], data['init'], data['centroid_names'], data['configID'], **options)
         return jsonify(status_link=f'/status/cluster/id/{uid}')
 
     @app.route('/api/status/cluster/id/<uuid:uuid>')
     def get_cluster_status(uuid):
         return controller.get_cluster_status(uuid)
 
+    @app.route('/api/cluster/cancel/id/<uuid:uuid>', methods=["POST"])
+    def cancel_cluster(uuid):
+        return controller.cancel_clustering(uuid)
+
     @app.route('/api/cluster/id/<uuid:uuid>')
     def get_cluster(uuid):
         return controller.get_cluster(uuid)
     
     @app.route('/api/cluster/list', methods=["POST"])
     @validate_request_field('referent', required=True, field_type=str)
+    @validate_request_field('configID', required=True, field_type=str)
     def list_cluster(data):
-        return controller.list_clusters(data['referent'])
+        return controller.list_clusters(data['referent'], data['configID'])
     
     @app.route('/api/cluster/config/update', methods=["POST"])
     @validate_request_field('K', required=True, field_type=int)
@@ -175,27 +434,42 @@ def create_app(**kwargs):
         return controller.update_config(data)
 
     @app.route('/api/data/raw/gesture', methods=["POST"])
+    @negotiate_format
     @validate_request_field('rid', required=True, field_type=str)
     @validate_request_field('pid', required=True, field_type=int)
     @validate_request_field('tid', required=True, field_type=int)
-    def get_gesture(data):
-        return controller.get_raw_gesture(data['rid'], data['pid'], data['tid'])
+    @validate_request_field('configID', required=True, field_type=str)
+    def get_gesture(data, binary):
+        return controller.get_raw_gesture(data['rid'], data['pid'], data['tid'], data['configID'], binary=binary)
 
 
     ############################# Metric Info ###############################
 
     @app.route('/api/data/d2b', methods=["POST"])
+    @responses.cached()
     @validate_request_field('referent', required=True, field_type=str)
     @validate_request_field('configID', required=True, field_type=str)
     def get_d2b(data):
         return controller.get_mean_d2b(data['referent'], data['configID'])
 
+    @app.route('/api/data/d2b/all', methods=["POST"])
+    @responses.cached()
+    @validate_request_field('configID', required=True, field_type=str)
+    def get_all_d2b(data):
+        return controller.get_all_d2b(data['configID'])
+
     @app.route('/api/nn', methods=["POST"])
     @validate_request_field('z1', required=True, field_type=List[float])
     @validate_request_field('z2', required=True, field_type=List[float])
     @validate_request_field('GestureType', required=True, field_type=str)
+    @validate_request_field('configID', required=True, field_type=str)
+    @validate_request_field('k', required=False, field_type=int)
+    @validate_request_field('window', required=False, field_type=int)
+    @validate_request_field('all_referents', required=False, field_type=bool)
     def get_nn(data):
-        return controller.get_nn(data['GestureType'], data['z1'], data['z2'])
+        return controller.get_nn(data['GestureType'], data['z1'], data['z2'], data['configID'],
+                                 k=data['k'], window=data['window'],
+                                 all_referents=bool(data['all_referents']))
 
     return app
 
@@ -0,0 +1,91 @@
+"""
+This module stores numpy arrays in MongoDB documents as typed binary
+blobs.
+
+An encoded array is a subdocument with the entries `dtype`, `shape` and
+either `bytes`, holding the raw array buffer, or `gridfs`, holding the id
+of a GridFS file with the buffer if the array exceeds `GRIDFS_THRESHOLD`
+bytes. Values stored before the introduction of this module are nested
+lists, which are still decoded.
+"""
+from typing import Dict, List
+
+import numpy as np
+from bson.binary import Binary
+
+
+# Arrays with more bytes are stored in GridFS instead of the document itself.
+GRIDFS_THRESHOLD = 1024 ** 2
+
+
+def encode(arr, fs=None) -> dict:
+    """Encodes an array into a subdocument.
+
+    Parameters
+    ----------
+    arr:
+        The array to encode.
+    fs:
+        The GridFS instance storing large arrays. Arrays are always stored inline if None.
+    """
+    arr = np.ascontiguousarray(arr)
+    doc = {'dtype': arr.dtype.str, 'shape': list(arr.shape)}
+
+    if fs is not None and arr.nbytes > GRIDFS_THRESHOLD:
+        doc['gridfs'] = fs.put(arr.tobytes())
+    else:
+        doc['bytes'] = Binary(arr.tobytes())
+
+    return doc
+
+
+def decode(value, fs=None) -> np.ndarray:
+    """Decodes an encoded array or a list-encoded legacy value.
+
+    The returned array shares the buffer read from the database and is read-only.
+    """
+    if not is_encoded(value):
+        return np.array(value)
+
+    if 'gridfs' in value:
+        buffer = fs.get(value['gridfs']).read()
+    else:
+        buffer = value['bytes']
+
+    return np.frombuffer(buffer, dtype=np.dtype(value['dtype'])).reshape(value['shape'])
+
+
+def is_encoded(value) -> bool:
+    return isinstance(value, dict) and 'dtype' in value and 'shape' in value
+
+
+def delete(value, fs) -> None:
+    """Removes the GridFS files of an encoded array or encoded columns, if they have any."""
+    if isinstance(value, dict) and 'columns' in value:
+        for col in value['columns'].values():
+            delete(col, fs)
+    elif is_encoded(value) and 'gridfs' in value and fs is not None:
+        fs.delete(value['gridfs'])
+
+
+def encode_columns(records: List[dict], fs=None) -> dict:
+    """Encodes a list of records into one column per field.
+
+    Numeric columns are encoded as arrays, all others are stored as lists.
+    """
+    columns = dict()
+    for name in (records[0].keys() if records else []):
+        values = np.asarray([r[name] for r in records])
+        columns[name] = encode(values, fs) if values.dtype.kind in 'biuf' else values.tolist()
+
+    return {'columns': columns, 'length': len(records)}
+
+
+def decode_columns(value, fs=None) -> List[dict]:
+    """Decodes columns encoded by :func encode_columns: or a list of legacy records."""
+    if not (isinstance(value, dict) and 'columns' in value):
+        return value
+
+    columns: Dict[str, list] = {name: decode(col, fs).tolist() if is_encoded(col) else col
+                                for name, col in value['columns'].items()}
+    return [dict(zip(columns.keys(), row)) for row in zip(*columns.values())] if columns else []
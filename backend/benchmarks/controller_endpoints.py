@@ -0,0 +1,210 @@
+"""
+This script measures the latency of the Controller methods behind the
+endpoints on synthetic configurations of growing size.
+
+Every size is a synthetic dataset and randomly initialized model, see
+:mod synthetic:, served by a Controller whose database is an in-memory
+mongomock instance, so that no MongoDB server is needed. Results that the
+controller stores or caches, e.g. barycenters and grid tiles, are removed
+before every repetition of the cold cases. The additional packages of the
+benchmarks are listed in `benchmarks/requirements.txt`:
+
+    pip install -r benchmarks/requirements.txt
+
+    python benchmarks/controller_endpoints.py --trials 1 --trials 4 --trials 16 --out report.json
+    python benchmarks/controller_endpoints.py --trials 1 --trials 4 --trials 16 --baseline report.json
+
+The report is a json document with the environment and the median and 95th
+percentile latency of every case and size. Passing the report of an earlier
+commit as `--baseline` prints the relative change of every median.
+"""
+import sys
+import json
+import time
+import platform
+import datetime
+import subprocess
+import tempfile
+from pathlib import Path
+
+import click
+import numpy as np
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import synthetic  # noqa: E402
+from controller import Controller  # noqa: E402
+
+
+CONFIG = 'benchmark'
+
+
+def _environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=Path(__file__).parent).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        'commit': commit,
+        'timestamp': datetime.datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'threads': torch.get_num_threads(),
+    }
+
+
+def create_controller(upload_dir, workers, lattice_size) -> Controller:
+    """Creates a controller serving the synthetic configuration from an in-memory database."""
+    try:
+        import mongomock
+        import mongomock.gridfs
+    except ImportError:
+        raise SystemExit('The benchmarks require mongomock: pip install -r benchmarks/requirements.txt')
+
+    import gridfs
+    from jobs import JobScheduler
+
+    mongomock.gridfs.enable_gridfs_integration()
+    controller = Controller(filestore=None, upload_dir=upload_dir, scheduler=JobScheduler(max_workers=workers),
+                            lattice_size=lattice_size or None)
+    controller.db = mongomock.MongoClient()['irl']
+    controller.fs = gridfs.GridFS(controller.db)
+    controller.db['config'].insert_one({'name': CONFIG, 'model': synthetic.MODEL_FILE, 'data': synthetic.DATA_FILE})
+    controller.create_indexes()
+    return controller
+
+
+def wait_for_cluster(controller, uid):
+    while json.loads(controller.get_cluster_status(uid))['status'] in ('QUEUED', 'RUNNING'):
+        time.sleep(0.005)
+
+
+def cases(controller, rng):
+    """Returns the benchmark cases as a dictionary of (setup, run) pairs.
+
+    The setup is called before every repetition and is not timed.
+    """
+    state = controller.configs.get(CONFIG)
+    referents = state.trials.referents.tolist()
+    referent = referents[0]
+    lo, hi = state.latent_mean.min(axis=0), state.latent_mean.max(axis=0)
+    xrange, yrange = [float(lo[0]), float(hi[0])], [float(lo[1]), float(hi[1])]
+    query = state.trial_latents[state.trials.referent_slice(referent)][:40]
+    init = [{'z1': c[:, 0].tolist(), 'z2': c[:, 1].tolist()} for c in np.array_split(query, 2)]
+
+    def nothing():
+        pass
+
+    def random_code():
+        return rng.uniform(lo, hi, size=(1, 2))
+
+    def clear_grid():
+        controller._grid_tiles.clear()
+
+    def clear_barycenters():
+        controller.db['barycenters'].delete_many({})
+
+    def clear_d2b():
+        controller.db['d2b'].delete_many({})
+
+    def evict():
+        controller.configs.evict(CONFIG)
+
+    def cluster():
+        uid = str(rng.integers(1 << 62))
+        controller.run_clustering(uid, referent, 2, init, ['Centroid 0', 'Centroid 1'], CONFIG, restarts=1)
+        wait_for_cluster(controller, uid)
+
+    return {
+        'load_config': (evict, lambda: controller.configs.get(CONFIG)),
+        'grid': (clear_grid, lambda: controller.calculate_skeleton_grid(xrange, yrange, CONFIG)),
+        'grid_cached': (nothing, lambda: controller.calculate_skeleton_grid(xrange, yrange, CONFIG)),
+        'decode': (nothing, lambda: controller.calculate_reconstruction(random_code(), CONFIG)),
+        'decode_lattice': (nothing, lambda: controller.calculate_reconstruction(random_code(), CONFIG, mode='lattice')),
+        'decode_batch': (nothing, lambda: controller.calculate_reconstruction_batch(
+            np.array_split(query, 10), CONFIG, samples=16)),
+        'trials': (nothing, lambda: controller.get_latent_trial_values(referents, CONFIG)),
+        'trials_binary': (nothing, lambda: controller.get_latent_trial_values(referents, CONFIG, binary=True)),
+        'trials_viewport': (nothing, lambda: controller.get_latent_trial_values(
+            referents, CONFIG, viewport={'xrange': xrange, 'yrange': yrange})),
+        'density': (nothing, lambda: controller.get_density(referents, xrange, yrange, CONFIG)),
+        'frames_nearest': (nothing, lambda: controller.get_nearest_frames(random_code()[0].tolist(), CONFIG, k=10)),
+        'barycenter': (clear_barycenters, lambda: controller.get_barycenters([referent], CONFIG)),
+        'd2b': (clear_d2b, lambda: controller.get_mean_d2b(referent, CONFIG)),
+        'nn': (nothing, lambda: controller.get_nn(referent, query[:, 0].tolist(), query[:, 1].tolist(), CONFIG, k=10)),
+        'clustering': (nothing, cluster),
+    }
+
+
+def measure(setup, run, repeat, warmup=1) -> dict:
+    """Returns the median and 95th percentile latency of `run` in milliseconds."""
+    timings = []
+    for i in range(warmup + repeat):
+        setup()
+        start = time.perf_counter()
+        run()
+        if i >= warmup:
+            timings.append((time.perf_counter() - start) * 1000)
+
+    return {'median_ms': float(np.median(timings)), 'p95_ms': float(np.quantile(timings, 0.95)),
+            'repeat': repeat}
+
+
+def compare(report, baseline):
+    """Prints the relative change of the median latencies against a baseline report."""
+    reference = {(r['case'], r['n_frames']): r['median_ms'] for r in baseline['results']}
+    print(f'\nChange against {baseline["environment"].get("commit")}')
+    for r in report['results']:
+        ref = reference.get((r['case'], r['n_frames']))
+        change = f'{(r["median_ms"] / ref - 1) * 100:+.1f} %' if ref else 'n/a'
+        print(f'{r["case"]:>16} {r["n_frames"]:>9} {change:>10}')
+
+
+@click.command()
+@click.option('--trials', type=int, multiple=True, default=(1, 4, 16),
+              help='Trials per participant and referent of each dataset size.')
+@click.option('--referents', type=int, default=10)
+@click.option('--participants', type=int, default=5)
+@click.option('--frames', type=int, default=60)
+@click.option('--repeat', type=int, default=10)
+@click.option('--case', 'selected', multiple=True, help='Only run the given cases.')
+@click.option('--workers', type=int, default=2)
+@click.option('--lattice-size', type=int, default=128, help='Size of the decoded lattice, 0 disables it.')
+@click.option('--out', type=click.Path(dir_okay=False), default=None, help='File the json report is written to.')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='Report of an earlier run to compare against.')
+def main(trials, referents, participants, frames, repeat, selected, workers, lattice_size, out, baseline):
+    report = {'environment': _environment(), 'results': []}
+    print(f'{"case":>16} {"frames":>9} {"median [ms]":>12} {"p95 [ms]":>10}')
+
+    for n_trials in trials:
+        with tempfile.TemporaryDirectory() as upload_dir:
+            _, _, n_frames = synthetic.write_config(upload_dir, n_referents=referents, n_participants=participants,
+                                                    n_trials=n_trials, n_frames=frames)
+            controller = create_controller(Path(upload_dir), workers, lattice_size)
+            rng = np.random.default_rng(0)
+
+            try:
+                for name, (setup, run) in cases(controller, rng).items():
+                    if selected and name not in selected:
+                        continue
+                    result = measure(setup, run, repeat)
+                    report['results'].append({'case': name, 'n_frames': n_frames, 'n_trials': n_trials,
+                                              'referents': referents, 'participants': participants, **result})
+                    print(f'{name:>16} {n_frames:>9} {result["median_ms"]:>12.2f} {result["p95_ms"]:>10.2f}')
+            finally:
+                controller.jobs.shutdown()
+
+    if out:
+        Path(out).write_text(json.dumps(report, indent=2))
+    if baseline:
+        compare(report, json.loads(Path(baseline).read_text()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+This script measures the decoding throughput and latency of concurrent
+hover requests with and without micro-batching.
+
+Every client thread decodes single latent codes in a loop, like the hover
+requests of one user. The decoder is a randomly initialized model with
+the architecture used by the backend:
+
+    python benchmarks/inference_batching.py --clients 1 4 16 --windows 0 1 2 5
+"""
+import sys
+import time
+import threading
+from pathlib import Path
+
+import click
+import numpy as np
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from irl_model.model import VAEFully512R4  # noqa: E402
+from inference import InferenceBatcher  # noqa: E402
+
+
+def direct_decode(model, latent):
+    with torch.no_grad():
+        return model.decode(torch.from_numpy(latent)).numpy()
+
+
+def run_clients(decode, clients, calls):
+    """Runs `clients` threads decoding `calls` single codes each.
+
+    Returns
+    -------
+    A tuple (calls per second, median latency in ms, 95th percentile latency in ms).
+    """
+    latencies = [[] for _ in range(clients)]
+
+    def client(i):
+        rng = np.random.default_rng(i)
+        for _ in range(calls):
+            latent = rng.normal(size=(1, 2)).astype(np.float32)
+            start = time.perf_counter()
+            decode(latent)
+            latencies[i].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    values = np.concatenate(latencies) * 1000
+    return clients * calls / elapsed, float(np.median(values)), float(np.quantile(values, 0.95))
+
+
+@click.command()
+@click.option('--clients', type=int, multiple=True, default=(1, 4, 16))
+@click.option('--windows', type=float, multiple=True, default=(0, 1, 2, 5), help='Batch windows in ms.')
+@click.option('--calls', type=int, default=200, help='Number of decodes per client.')
+@click.option('--max-batch-size', type=int, default=1024)
+def main(clients, windows, calls, max_batch_size):
+    model = VAEFully512R4(inp_dim=60, z_dim=2)
+    model.eval()
+
+    print(f'{"clients":>8} {"window [ms]":>12} {"calls/s":>10} {"p50 [ms]":>10} {"p95 [ms]":>10} {"rows/batch":>11}')
+
+    for n in clients:
+        throughput, p50, p95 = run_clients(lambda latent: direct_decode(model, latent), n, calls)
+        print(f'{n:>8} {"direct":>12} {throughput:>10.0f} {p50:>10.3f} {p95:>10.3f} {1:>11.1f}')
+
+        for window in windows:
+            batcher = InferenceBatcher(window=window / 1000, max_batch_size=max_batch_size)
+            throughput, p50, p95 = run_clients(lambda latent: batcher.decode(model, latent), n, calls)
+            rows = batcher.stats()['mean_batch_rows']
+            print(f'{n:>8} {window:>12.1f} {throughput:>10.0f} {p50:>10.3f} {p95:>10.3f} {rows:>11.1f}')
+
+
+if __name__ == '__main__':
+    main()
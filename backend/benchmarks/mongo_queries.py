@@ -0,0 +1,93 @@
+"""
+This script measures the latency of the controller queries on growing
+collections, with and without the indexes created at startup.
+
+It requires a running MongoDB server and writes into a scratch database,
+which is dropped afterwards:
+
+    python benchmarks/mongo_queries.py --uri mongodb://localhost:27017 --sizes 1000 10000 50000
+"""
+import sys
+import time
+import datetime
+from pathlib import Path
+
+import click
+import numpy as np
+import pymongo
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from controller import Controller  # noqa: E402
+
+
+def populate(db, size, n_configs=20, n_referents=50):
+    """Fills the collections with `size` cluster status and barycenter documents."""
+    rng = np.random.default_rng(0)
+    now = datetime.datetime.utcnow()
+    init = [{'z1': rng.normal(size=40).tolist(), 'z2': rng.normal(size=40).tolist()} for _ in range(3)]
+
+    status = [{
+        'id': f'job-{i}',
+        'referent': f'referent-{i % n_referents}',
+        'configID': f'config-{(i // n_referents) % n_configs}',
+        'init_keys': init,
+        'K': 3,
+        'centroid_names': ['Centroid 0', 'Centroid 1', 'Centroid 2'],
+        'timestamp': now,
+        'status': 'FINISHED' if i % 7 else 'ERROR',
+    } for i in range(size)]
+
+    barycenters = [{
+        'Referent': f'referent-{i % n_referents}',
+        'configID': f'config-{i // n_referents}',
+        'data': rng.normal(size=(60, 2)).tolist(),
+    } for i in range(size)]
+
+    for name, docs in (('cluster_status', status), ('barycenters', barycenters)):
+        for start in range(0, len(docs), 5000):
+            db[name].insert_many(docs[start:start + 5000])
+
+
+def measure(fn, repeat):
+    """Returns the median latency of `fn` in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+@click.command()
+@click.option('--uri', default='mongodb://localhost:27017')
+@click.option('--database', default='irl_benchmark')
+@click.option('--sizes', type=int, multiple=True, default=(1000, 10000, 50000))
+@click.option('--repeat', type=int, default=50)
+def main(uri, database, sizes, repeat):
+    client = pymongo.MongoClient(uri)
+
+    controller = Controller(filestore=None, upload_dir=None)
+    controller.db = client[database]
+
+    print(f'{"documents":>10} {"indexes":>8} {"list_clusters [ms]":>20} {"_find_barycenter [ms]":>22}')
+
+    for size in sizes:
+        client.drop_database(database)
+        populate(controller.db, size)
+
+        for indexed in (False, True):
+            if indexed:
+                controller.create_indexes()
+
+            configID = f'config-{(size // 2 // 50) % 20}'
+            clusters = measure(lambda: controller.list_clusters('referent-7', configID), repeat)
+            barycenter = measure(lambda: controller._find_barycenter('referent-7', f'config-{size // 2 // 50}'), repeat)
+
+            print(f'{size:>10} {str(indexed):>8} {clusters:>20.2f} {barycenter:>22.2f}')
+
+    client.drop_database(database)
+
+
+if __name__ == '__main__':
+    main()
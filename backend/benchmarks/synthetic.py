@@ -0,0 +1,151 @@
+"""
+This module generates synthetic configurations for the benchmarks.
+
+A dataset has the layout read by `WholeBodyDataset`: one Kinect v1 pose of
+20 joints with x, y and z coordinates per row, indexed by GestureType,
+ParticipantID, TrialID and Timestamp. Every referent moves the arms along
+its own smooth periodic path, every participant has its own body size and
+every trial its own speed and noise, so that trials of the same referent
+are similar but not identical. The model is a randomly initialized
+VAEFully512R4 saved like a trained checkpoint.
+
+The files can also be written from the command line:
+
+    python benchmarks/synthetic.py --out uploads --referents 10 --participants 5 --trials 4 --frames 60
+"""
+import sys
+from pathlib import Path
+
+import click
+import numpy as np
+import pandas as pd
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from irl_model.model import VAEFully512R4  # noqa: E402
+
+
+# Joints in the column order of the datasets, see the skeleton of the controller's plotter.
+JOINTS = ['hip_center', 'spine', 'shoulder_center', 'head',
+          'shoulder_left', 'elbow_left', 'wrist_left', 'hand_left',
+          'shoulder_right', 'elbow_right', 'wrist_right', 'hand_right',
+          'hip_left', 'knee_left', 'ankle_left', 'foot_left',
+          'hip_right', 'knee_right', 'ankle_right', 'foot_right']
+
+# Rest pose in meters, x to the left of the camera, y up and z away from it.
+REST_POSE = np.array([
+    [0.00, 0.00, 2.50], [0.00, 0.25, 2.50], [0.00, 0.50, 2.50], [0.00, 0.70, 2.50],
+    [0.18, 0.45, 2.50], [0.25, 0.20, 2.50], [0.28, -0.02, 2.48], [0.29, -0.10, 2.47],
+    [-0.18, 0.45, 2.50], [-0.25, 0.20, 2.50], [-0.28, -0.02, 2.48], [-0.29, -0.10, 2.47],
+    [0.10, -0.05, 2.50], [0.12, -0.50, 2.52], [0.12, -0.90, 2.55], [0.12, -0.95, 2.45],
+    [-0.10, -0.05, 2.50], [-0.12, -0.50, 2.52], [-0.12, -0.90, 2.55], [-0.12, -0.95, 2.45],
+])
+
+# Fraction of the hand motion performed by each joint of the arms.
+ARM_WEIGHTS = {'shoulder': 0.05, 'elbow': 0.45, 'wrist': 0.9, 'hand': 1.0}
+
+# Time between two frames in milliseconds, the frame rate of the Kinect v1.
+FRAME_INTERVAL = 1000 / 30
+
+DATA_FILE = 'data.h5'
+MODEL_FILE = 'model.pth'
+
+
+def _referent_motion(rng):
+    """Draws the amplitudes, frequencies and phases of the hand paths of a referent."""
+    return {
+        'amplitude': rng.uniform(0.05, 0.4, size=(2, 3)),
+        'frequency': rng.integers(1, 4, size=(2, 3)),
+        'phase': rng.uniform(0, 2 * np.pi, size=(2, 3)),
+    }
+
+
+def _trial(motion, n_frames, scale, speed, noise, rng) -> np.ndarray:
+    """Returns the poses of one trial as an array of shape [n_frames, 20, 3]."""
+    t = np.linspace(0, speed, n_frames)[:, None, None]
+    hands = motion['amplitude'] * np.sin(2 * np.pi * motion['frequency'] * t + motion['phase'])
+
+    poses = np.repeat(REST_POSE[None] * scale, n_frames, axis=0)
+    for side, hand in (('left', hands[:, 0]), ('right', hands[:, 1])):
+        for joint, weight in ARM_WEIGHTS.items():
+            poses[:, JOINTS.index(f'{joint}_{side}')] += weight * hand
+
+    return poses + rng.normal(scale=noise, size=poses.shape)
+
+
+def make_dataset(n_referents=10, n_participants=5, n_trials=4, n_frames=60, seed=0) -> pd.DataFrame:
+    """Generates a dataset of synthetic trials.
+
+    Parameters
+    ----------
+    n_referents, n_participants, n_trials:
+        The number of referents, of participants performing every referent and of trials
+        of every participant and referent.
+    n_frames:
+        The mean number of frames of a trial. The lengths vary by up to 20 %.
+
+    Returns
+    -------
+    A dataframe with 60 columns and one row per frame.
+    """
+    rng = np.random.default_rng(seed)
+    motions = [_referent_motion(rng) for _ in range(n_referents)]
+    scales = rng.uniform(0.85, 1.15, size=n_participants)
+
+    poses, index = [], []
+    for r, motion in enumerate(motions):
+        for p, scale in enumerate(scales):
+            for trial in range(n_trials):
+                length = max(2, int(n_frames * rng.uniform(0.8, 1.2)))
+                poses.append(_trial(motion, length, scale, rng.uniform(0.8, 1.2), 0.005, rng))
+                index += [(f'Referent {r:03d}', p + 1, trial + 1, f * FRAME_INTERVAL) for f in range(length)]
+
+    columns = [f'{joint}_{axis}' for joint in JOINTS for axis in 'xyz']
+    index = pd.MultiIndex.from_tuples(index, names=['GestureType', 'ParticipantID', 'TrialID', 'Timestamp'])
+    return pd.DataFrame(np.concatenate(poses).reshape(-1, len(columns)), index=index, columns=columns)
+
+
+def make_model(seed=0) -> VAEFully512R4:
+    """Returns a randomly initialized model with the architecture and precision used by the backend."""
+    torch.manual_seed(seed)
+    return VAEFully512R4(inp_dim=60, z_dim=2).double().eval()
+
+
+def write_config(directory, seed=0, **sizes):
+    """Writes a synthetic dataset and model checkpoint into a directory.
+
+    Parameters
+    ----------
+    sizes:
+        The keyword arguments of :func make_dataset:.
+
+    Returns
+    -------
+    A tuple (dataset file name, model file name, number of frames).
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    dataset = make_dataset(seed=seed, **sizes)
+    dataset.to_hdf(directory / DATA_FILE, key='data')
+    torch.save({'model_state_dict': make_model(seed).state_dict()}, directory / MODEL_FILE)
+
+    return DATA_FILE, MODEL_FILE, len(dataset)
+
+
+@click.command()
+@click.option('--out', type=click.Path(file_okay=False), required=True)
+@click.option('--referents', type=int, default=10)
+@click.option('--participants', type=int, default=5)
+@click.option('--trials', type=int, default=4)
+@click.option('--frames', type=int, default=60)
+@click.option('--seed', type=int, default=0)
+def main(out, referents, participants, trials, frames, seed):
+    data, model, n_frames = write_config(out, seed=seed, n_referents=referents, n_participants=participants,
+                                         n_trials=trials, n_frames=frames)
+    print(f'Wrote {n_frames} frames to {Path(out, data)} and the model to {Path(out, model)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+This module provides the in-memory caches used by the controller.
+"""
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """A thread-safe mapping that evicts the least recently used entries.
+
+    The size of the cache is bounded by the number of entries it holds and
+    optionally by the total weight of the entries, e.g. their size in bytes.
+    Lookups with :func get: are counted as hits or misses.
+    """
+
+    def __init__(self, maxsize: int, maxweight=None, weigh=None):
+        """Initializes a new LRUCache instance.
+
+        Parameters
+        ----------
+        maxsize:
+            The maximum number of entries kept in the cache.
+        maxweight:
+            The maximum total weight of the entries. Entries heavier than this on their
+            own are not stored. The weight is not bounded if None.
+        weigh:
+            A function returning the weight of a value, required with `maxweight`.
+        """
+        self.maxsize = maxsize
+        self.maxweight = maxweight
+        self.weigh = weigh
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._weights = dict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Returns the value stored for key and marks it as recently used."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value) -> None:
+        """Stores a value and evicts the least recently used entries if the cache is full."""
+        weight = self.weigh(value) if self.maxweight is not None else 0
+        with self._lock:
+            self.weight -= self._weights.pop(key, 0)
+            self._entries.pop(key, None)
+            if self.maxweight is not None and weight > self.maxweight:
+                return
+
+            self._entries[key] = value
+            self._weights[key] = weight
+            self.weight += weight
+            while len(self._entries) > self.maxsize or (self.maxweight is not None and self.weight > self.maxweight):
+                evicted, _ = self._entries.popitem(last=False)
+                self.weight -= self._weights.pop(evicted)
+
+    def discard(self, predicate) -> int:
+        """Removes the entries whose key satisfies the predicate and returns their number."""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+                self.weight -= self._weights.pop(key, 0)
+            return len(keys)
+
+    def clear(self) -> None:
+        """Removes all entries. The hit and miss counters are kept."""
+        with self._lock:
+            self._entries.clear()
+            self._weights.clear()
+            self.weight = 0
+
+    def stats(self) -> dict:
+        """Returns the number of entries, their total weight and the hit and miss counters."""
+        with self._lock:
+            stats = {'size': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+            if self.maxweight is not None:
+                stats.update(weight=self.weight, maxweight=self.maxweight)
+            return stats
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
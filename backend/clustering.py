@@ -0,0 +1,180 @@
+"""
+This module implements DTW k-means clustering of latent sequences.
+
+The assignment step computes the DTW distances of all sequences to all
+centroids in parallel with dtaidistance, the update step refines each
+centroid with DTW barycenter averaging starting from its previous position.
+Several restarts are fitted independently and the one with the lowest
+inertia is kept.
+"""
+from typing import List, Optional
+
+import numpy as np
+
+from tslearn.barycenters import dtw_barycenter_averaging
+from tslearn.utils import to_time_series_dataset
+from dtaidistance.dtw_ndim import distance_matrix_fast
+
+
+DEFAULT_RESTARTS = 4
+DEFAULT_MAX_ITER = 50
+DEFAULT_TOL = 1e-6
+
+# Number of barycenter averaging iterations of each centroid update.
+DBA_MAX_ITER = 30
+
+
+def _as_series(sequences) -> List[np.ndarray]:
+    return [np.ascontiguousarray(s, dtype=np.double) for s in sequences]
+
+
+def _metric_params(window: Optional[int]) -> dict:
+    # dtaidistance allows shifts of up to window - 1 frames from the diagonal
+    if not window:
+        return None
+    return {'global_constraint': 'sakoe_chiba', 'sakoe_chiba_radius': max(window - 1, 0)}
+
+
+def centroid_distances(sequences: List[np.ndarray], centroids: List[np.ndarray], window=None) -> np.ndarray:
+    """Computes the DTW distance of every sequence to every centroid.
+
+    Returns
+    -------
+    An array of shape [n_sequences, n_centroids].
+    """
+    n, k = len(sequences), len(centroids)
+    dist = distance_matrix_fast(list(sequences) + list(centroids), window=window,
+                                block=((0, n), (n, n + k)), compact=True, parallel=True)
+    return np.asarray(dist).reshape(n, k)
+
+
+def kmeans_plusplus(sequences: List[np.ndarray], k: int, seed: int, window=None, centroids=None) -> List[np.ndarray]:
+    """Picks initial centroids among the sequences with k-means++ seeding.
+
+    Parameters
+    ----------
+    centroids:
+        Centroids that are kept, only the remaining ones are picked.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = list(centroids or [])
+
+    if not centroids:
+        centroids.append(sequences[rng.integers(len(sequences))])
+
+    while len(centroids) < k:
+        closest = centroid_distances(sequences, centroids, window).min(axis=1) ** 2
+        total = closest.sum()
+        p = closest / total if total > 0 else None
+        centroids.append(sequences[rng.choice(len(sequences), p=p)])
+
+    return [c.copy() for c in centroids]
+
+
+def fit(sequences: List[np.ndarray], init: List[np.ndarray], window=None,
+        max_iter=DEFAULT_MAX_ITER, tol=DEFAULT_TOL, progress=None) -> dict:
+    """Fits DTW k-means starting from the given centroids.
+
+    The iteration stops once the inertia decreases by less than `tol` or the
+    assignments do not change anymore.
+
+    Returns
+    -------
+    A dictionary with the `labels`, `centroids`, `inertia` and `n_iter` of the fit.
+    """
+    sequences = _as_series(sequences)
+    centroids = _as_series(init)
+    labels = None
+    inertia = np.inf
+
+    for it in range(1, max_iter + 1):
+        dist = centroid_distances(sequences, centroids, window)
+
+        # Reseed empty clusters with the sequences farthest from their centroid
+        new_labels = dist.argmin(axis=1)
+        for _ in range(len(centroids)):
+            empty = set(range(len(centroids))) - set(new_labels.tolist())
+            if not empty:
+                break
+            cls = min(empty)
+            farthest = dist[np.arange(len(sequences)), new_labels].argmax()
+            centroids[cls] = sequences[farthest].copy()
+            dist[:, cls] = centroid_distances(sequences, [centroids[cls]], window)[:, 0]
+            new_labels = dist.argmin(axis=1)
+
+        old_inertia = inertia
+        inertia = float(np.mean(dist[np.arange(len(sequences)), new_labels] ** 2))
+
+        if labels is not None and (np.array_equal(labels, new_labels) or abs(old_inertia - inertia) < tol):
+            labels = new_labels
+            break
+        labels = new_labels
+
+        for cls in range(len(centroids)):
+            members = [sequences[i] for i in np.flatnonzero(labels == cls)]
+            if not members:
+                continue
+            centroids[cls] = np.ascontiguousarray(dtw_barycenter_averaging(
+                to_time_series_dataset(members), init_barycenter=centroids[cls],
+                max_iter=DBA_MAX_ITER, metric_params=_metric_params(window)), dtype=np.double)
+
+        if progress is not None:
+            progress(it / max_iter)
+
+    return dict(labels=labels, centroids=centroids, inertia=inertia, n_iter=it)
+
+
+def fit_restart(sequences: List[np.ndarray], k: int, init: List[np.ndarray], restart: int, window=None,
+                max_iter=DEFAULT_MAX_ITER, tol=DEFAULT_TOL, progress=None) -> dict:
+    """Fits one restart of DTW k-means.
+
+    The first restart starts from the given centroids. The other restarts keep
+    the first of them and pick the remaining ones with k-means++ seeding.
+
+    Parameters
+    ----------
+    k:
+        The number of clusters.
+    init:
+        The initial centroids; missing ones are picked with k-means++ seeding.
+    restart:
+        The index of the restart, which also seeds the random number generator.
+    """
+    sequences = _as_series(sequences)
+    init = _as_series(init)[:k]
+
+    if restart > 0:
+        init = init[:1]
+    init = kmeans_plusplus(sequences, k, seed=restart, window=window, centroids=init)
+
+    return fit(sequences, init, window=window, max_iter=max_iter, tol=tol, progress=progress)
+
+
+def best_run(runs: List[dict]) -> dict:
+    """Returns the run with the lowest inertia."""
+    return min(runs, key=lambda run: run['inertia'])
+
+
+def model_dict(run: dict, window=None, max_iter=DEFAULT_MAX_ITER, tol=DEFAULT_TOL, restarts=1) -> dict:
+    """Converts a fitted run into the representation stored in `trained_cluster_models`.
+
+    The layout follows the one of tslearn's TimeSeriesKMeans, so that models fitted
+    before and after the introduction of this module are read the same way. The
+    centroids and labels are kept as arrays, which are encoded by the array store.
+    """
+    return {
+        'hyper_params': {
+            'n_clusters': len(run['centroids']),
+            'metric': 'dtw',
+            'window': window,
+            'max_iter': max_iter,
+            'tol': tol,
+            'n_init': restarts,
+        },
+        'model_params': {
+            'cluster_centers_': list(run['centroids']),
+            'labels_': run['labels'],
+            'inertia_': run['inertia'],
+            'n_iter_': run['n_iter'],
+        },
+    }
@@ -4,11 +4,15 @@ related to embedding into latent space.
 """
 import json
 import torch
+import hashlib
 import datetime
+import threading
 from pathlib import Path
 from typing import List
-from itertools import product, count
+from itertools import product
+from concurrent.futures import wait, FIRST_COMPLETED
 
+import gridfs
 import pymongo
 from pymongo.errors import PyMongoError
 from bson.objectid import ObjectId
@@ -21,14 +25,83 @@ from irl_model.model import VAEFully512R4
 from irl_data import WholeBodyDataset
 from irl_plotter import WholeBodyPlotter
 
-from tslearn.barycenters import dtw_barycenter_averaging
-from tslearn.clustering import TimeSeriesKMeans
-from tslearn.utils import to_time_series_dataset
-
-from dtaidistance.dtw_ndim import distance_fast, warping_paths
+from registry import ConfigRegistry, ConfigState
+from cache import LRUCache
+import array_store
+from jobs import JobScheduler
+from inference import InferenceBatcher
+import analytics
+import clustering
+import density
+import jobs
+import lattice
+import metrics
+import nn_search
+import paths
+import precision
+import serialization
+import spatial
+import tiles
+
+from dtaidistance.dtw_ndim import warping_paths
 from dtaidistance.dtw import best_path
 
 
+# Default memory budget of all resident configurations in bytes.
+DEFAULT_MEMORY_BUDGET = 4 * 1024 ** 3
+
+# Maximum number of rendered skeleton grid tiles kept in memory.
+GRID_TILE_CACHE_SIZE = 4096
+
+# Maximum number of decoded poses kept in memory.
+DECODE_CACHE_SIZE = 65536
+
+# Default size in pixels of the viewport trajectories are decimated for.
+DEFAULT_VIEWPORT_SIZE = (1024, 1024)
+
+# Default maximum distance in pixels of a removed frame from a decimated trajectory.
+DEFAULT_PIXEL_TOLERANCE = 1.0
+
+# Maximum number of referent density pyramids kept in memory.
+DENSITY_CACHE_SIZE = 64
+
+# Maximum number of referent frame indexes kept in memory.
+FRAME_INDEX_CACHE_SIZE = 64
+
+# Default resolution to which latent codes are quantized before decoding.
+DEFAULT_DECODE_RESOLUTION = 1e-3
+
+# Decoding modes of the decode routes: passing the codes through the decoder, or
+# interpolating them from the decoded lattice.
+EXACT = 'exact'
+LATTICE = 'lattice'
+
+# Compound indexes of the collections, matching the filters of the queries below.
+INDEXES = {
+    'config': [[('name', pymongo.ASCENDING)]],
+    'barycenters': [[('configID', pymongo.ASCENDING), ('Referent', pymongo.ASCENDING)]],
+    'd2b': [[('configID', pymongo.ASCENDING), ('referent', pymongo.ASCENDING)]],
+    'cluster_status': [
+        [('id', pymongo.ASCENDING)],
+        [('configID', pymongo.ASCENDING), ('referent', pymongo.ASCENDING), ('status', pymongo.ASCENDING)],
+    ],
+}
+
+# Fields of the config documents read by the controller.
+CONFIG_PROJECTION = {'_id': False, 'name': True, 'model': True, 'data': True, 'precision': True}
+
+# Fields of the barycenter documents read by the controller.
+BARYCENTER_PROJECTION = {'_id': False, 'Referent': True, 'configID': True, 'data': True}
+
+# Fields of the d2b documents read by the controller.
+D2B_PROJECTION = {'referent': True, 'configID': True, 'dist': True, 'median': True, 'mean': True, 'var': True,
+                  'quantiles': True}
+
+# Sakoe-Chiba window and psi relaxation of the distances to the barycenter.
+D2B_WINDOW = 25
+D2B_PSI = 2
+
+
 class Controller:
     """This class encapsulates methods to embed data using a pretrained model.
 
@@ -36,221 +109,569 @@ class Controller:
     a frontend client for visualization.
     """
 
-    def __init__(self, filestore, upload_dir):
+    def __init__(self, filestore, upload_dir, memory_budget=DEFAULT_MEMORY_BUDGET, scheduler=None,
+                 warmup_barycenters=False, decode_resolution=DEFAULT_DECODE_RESOLUTION, inference=None,
+                 lattice_size=None, default_precision=precision.DEFAULT_PRECISION):
         """Initializes a new Controller instance.
 
         Parameters
         ----------
-        model:
-            A pytorch model used to embed the data.
+        filestore:
+            The upload set storing the model and data files of new configurations.
+        upload_dir:
+            The directory containing the uploaded files.
+        memory_budget:
+            The maximum number of bytes used by the resident configurations.
+        scheduler:
+            The JobScheduler running clustering, barycenter and d2b computations.
+        warmup_barycenters:
+            Compute the barycenters of all referents in the background when a
+            configuration is initialized. Barycenter requests never block then.
+        decode_resolution:
+            The latent codes decoded for hovering are quantized to multiples of this
+            value, so that decoded poses can be reused. Caching is disabled if None.
+        inference:
+            The InferenceBatcher running the decoder calls of concurrent requests as batches.
+        lattice_size:
+            The number of points along each axis of the lattice decoded when a configuration
+            is loaded, see :mod lattice:. No lattice is decoded if None, the default, as the
+            lattice adds `lattice_size ** 2` decoded codes to every load of a configuration.
+        default_precision:
+            The inference precision of configurations that do not set their own, see
+            :mod precision:.
         """
-        self.model = None
-        self._active_dataset = None
-        self.plotter = None
+        self.configs = ConfigRegistry(self._load_config, memory_budget, on_evict=self._release_config)
+        self.jobs = scheduler or JobScheduler()
+        self.inference = inference or InferenceBatcher()
+        self.warmup = warmup_barycenters
+        self._barycenter_jobs = dict()
+        self._barycenter_lock = threading.Lock()
+        self._warmup_queues = dict()
+        self._warmup_lock = threading.Lock()
+        self._grid_tiles = LRUCache(GRID_TILE_CACHE_SIZE)
+        self.decode_resolution = decode_resolution
+        self.lattice_size = lattice_size
+        self.default_precision = default_precision
+        self._decodes = LRUCache(DECODE_CACHE_SIZE)
+        self._densities = LRUCache(DENSITY_CACHE_SIZE)
+        self._frame_indexes = LRUCache(FRAME_INDEX_CACHE_SIZE)
+        self.plotter = WholeBodyPlotter(skeleton=dict(
+            head=3, shoulder_center=2, spine=1, hip_center=0, 
+            shoulder_left=4, elbow_left=5, wrist_left=6, hand_left=7,
+            shoulder_right=8, elbow_right=9, wrist_right=10, hand_right=11,
+            hip_left=12, knee_left=13, ankle_left=14, foot_left=15,
+            hip_right=16, knee_right=17, ankle_right=18, foot_right=19
+        ))
         self.domain_range = (-1.0, 1.0)
         self.filestore = filestore
         self.upload_dir = upload_dir
-        self.db = pymongo.MongoClient()['irl']
+        self.db = pymongo.MongoClient(event_listeners=[metrics.MongoListener()])['irl']
+        self.fs = gridfs.GridFS(self.db)
+
+    def create_indexes(self) -> None:
+        """Creates the indexes of all collections if they do not exist yet."""
+        for collection, indexes in INDEXES.items():
+            for keys in indexes:
+                self.db[collection].create_index(keys)
 
     def _groupby(self, dataframe):
         return dataframe.groupby(['ParticipantID', 'GestureType', 'TrialID'])
 
     def init_app(self, _id) -> None:
-        doc = self.db['config'].find_one({'name': _id})
+        """Makes the configuration resident, so that subsequent requests are served from memory."""
+        self.configs.get(_id)
+
+        if self.warmup:
+            self.warmup_barycenters(_id)
+
+    def _load_config(self, _id) -> ConfigState:
+        doc = self.db['config'].find_one({'name': _id}, CONFIG_PROJECTION)
         print('Init app', doc, _id)
-        self.plotter = WholeBodyPlotter(skeleton=dict(
-            head=3, shoulder_center=2, spine=1, hip_center=0, 
-            shoulder_left=4, elbow_left=5, wrist_left=6, hand_left=7,
-            shoulder_right=8, elbow_right=9, wrist_right=10, hand_right=11,
-            hip_left=12, knee_left=13, ankle_left=14, foot_left=15,
-            hip_right=16, knee_right=17, ankle_right=18, foot_right=19
-        ))
 
         if doc:
             dataset_path = Path(self.upload_dir, doc['data'])
             dataset = WholeBodyDataset(dataset_path).load()
-            self._active_dataset = dataset
-
-            ckpt_path = Path(self.upload_dir, doc['model'])
-            ckpt = torch.load(ckpt_path, map_location='cpu')
-            model = VAEFully512R4(inp_dim=60, z_dim=2)
-            model.load_state_dict(ckpt['model_state_dict'])
-            model.eval()
-            self.model = model
+
+            model = precision.convert(self._load_model(doc), self._precision(doc))
+
+            state = ConfigState(_id, model, dataset)
+            if self.lattice_size:
+                state.lattice = lattice.build(lambda z: self.inference.decode(model, z), state.latent_mean,
+                                              self.lattice_size)
+                state.nbytes += state.lattice.nbytes
+
+            return state
         else:
             raise Exception("Can not load configuration", _id)
 
-    def calculate_reconstruction(self, data: np.ndarray) -> str:
+    def _release_config(self, configID) -> None:
+        """Removes the cached results derived from an evicted configuration.
+
+        The decoded poses, grid tiles, density pyramids and frame indexes are keyed by the
+        name of their configuration first.
+        """
+        for cache in (self._decodes, self._grid_tiles, self._densities, self._frame_indexes):
+            cache.discard(lambda key: key[0] == configID)
+
+    def config_version(self, configID) -> str:
+        """Returns a hash of everything the responses computed from a configuration depend on.
+
+        The version is derived from the model and data files and the precision stored in the
+        config document and from the lattice and decode settings of the server, so it is the
+        same across reloads, restarts and worker processes and only changes with the
+        configuration, see :mod http_cache:. The configuration itself is not loaded.
+        """
+        doc = self.db['config'].find_one({'name': configID}, CONFIG_PROJECTION) if configID is not None else None
+        if doc is None:
+            return ''
+
+        key = [doc['model'], doc['data'], self._precision(doc), self.lattice_size, self.decode_resolution]
+        return hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
+
+    def _load_model(self, doc) -> VAEFully512R4:
+        """Loads the model of a configuration in the float64 precision it was trained in."""
+        ckpt = torch.load(Path(self.upload_dir, doc['model']), map_location='cpu')
+        model = VAEFully512R4(inp_dim=60, z_dim=2).double()
+        model.load_state_dict(ckpt['model_state_dict'])
+        return model.eval()
+
+    def _precision(self, doc) -> str:
+        return doc.get('precision') or self.default_precision
+
+    def set_precision(self, configID, value) -> str:
+        """Changes the inference precision of a configuration.
+
+        The configuration is evicted together with its cached results, so that the next request
+        loads it in the new precision.
+        """
+        if value not in precision.PRECISIONS:
+            return json.dumps({'error': {'msg': f'Unknown precision: {value}'}})
+
+        res = self.db['config'].update_one({'name': configID}, {'$set': {'precision': value}})
+        if res.matched_count == 0:
+            return json.dumps({'error': {'msg': f'Could not find configuration: {configID}'}})
+
+        self.configs.evict(configID)
+        return json.dumps({'msg': 'Success', 'precision': value})
+
+    def get_precision_report(self, configID) -> str:
+        """Compares the latent codes and reconstructions of all precisions against the float64 model.
+
+        The comparison runs on a sample of the dataset of the configuration, see
+        :func precision.accuracy_report:.
+        """
+        doc = self.db['config'].find_one({'name': configID}, CONFIG_PROJECTION)
+        if doc is None:
+            return json.dumps({'error': {'msg': f'Could not find configuration: {configID}'}})
+
+        report = precision.accuracy_report(self._load_model(doc), self.configs.get(configID).dataset.values)
+        return json.dumps({'precision': self._precision(doc), **report})
+
+    def _filter_referents(self, state, referents):
+        """Selects the frames of the given referents together with their cached latent means.
+
+        Returns
+        -------
+        A tuple (mask, frames, latent) where mask is the boolean row mask over the dataset.
+        """
+        mask = state.dataset.index.get_level_values('GestureType').isin(referents)
+        return mask, state.dataset[mask], state.latent_mean[mask]
+
+    def _referent_sequences(self, state, referent):
+        """Returns the trial positions of a referent and the latent sequence of each trial."""
+        trials = state.trials.referent_trials(referent)
+        return trials, state.trials.split(state.trial_latents, trials)
+
+    def calculate_reconstruction(self, data: np.ndarray, configID, mode=EXACT, binary=False) -> str:
         """Decodes the latent embedding and reconstructs the original dimensions.
 
+        Latent codes close to codes that were decoded before are served from the
+        decode cache, see :func _decode:.
+
         Parameters
         ----------
         data:
             A numpy array containing the values in latent dimensioins.
+        configID:
+            The name of the configuration whose model decodes the data.
+        mode:
+            Either `exact` or `lattice`. The lattice mode interpolates the poses from the
+            decoded lattice of the configuration, if it has one.
+        binary:
+            Return the binary payload format of :mod serialization: instead of json.
 
         Returns
         -------
             A json array rerpresenting the paths for drawing the skeleton.
         """
-        with torch.no_grad():
-            tensor = torch.tensor(data).float()
-            decoded_data = self.model.decode(tensor)
-            decoded_data = decoded_data.numpy()
+        if mode not in (EXACT, LATTICE):
+            return json.dumps({'error': {'msg': f'Unknown decoding mode: {mode}'}})
+
+        grid = self._decode_lattice(configID, mode)
+        decoded_data = self._decode(data, configID, grid)
+        meta = self._decode_meta(grid)
+
+        if binary:
+            return serialization.dumps_frames(decoded_data, meta)
+
+        with metrics.phase(metrics.SERIALIZATION):
+            values = serialization.frame_records(decoded_data)
+            return json.dumps({'data': values, **meta})
+
+    def calculate_reconstruction_batch(self, queries: List[np.ndarray], configID, samples=None, mode=EXACT,
+                                       binary=False) -> str:
+        """Decodes several latent codes or polylines with a single forward pass.
+
+        Parameters
+        ----------
+        queries:
+            A list of arrays of shape [n_points, 2], each holding a latent code or the
+            vertices of a polyline.
+        configID:
+            The name of the configuration whose model decodes the data.
+        samples:
+            Resample every polyline to this number of points spaced evenly along its
+            arc length before decoding. The points are decoded as given if None.
+        mode:
+            Either `exact` or `lattice`, see :func calculate_reconstruction:.
+        binary:
+            Return the binary payload format of :mod serialization: instead of json.
+
+        Returns
+        -------
+            A json object with the decoded poses and the decoded latent codes of each query.
+            The binary payload contains the arrays `frames` and `latent` of all queries and
+            `offsets` with the first frame of each query.
+        """
+        if mode not in (EXACT, LATTICE):
+            return json.dumps({'error': {'msg': f'Unknown decoding mode: {mode}'}})
+
+        queries = [np.asarray(q, dtype=np.double).reshape(-1, 2) for q in queries]
+        if samples is not None:
+            queries = [paths.resample_polyline(q, samples) for q in queries]
+
+        offsets = np.concatenate([[0], np.cumsum([len(q) for q in queries], dtype=int)])
+        latent = np.concatenate(queries or [np.empty((0, 2))])
+
+        grid = self._decode_lattice(configID, mode)
+        decoded_data = self._decode(latent, configID, grid)
+        meta = self._decode_meta(grid)
+
+        if binary:
+            arrays = {
+                'frames': decoded_data.reshape(len(latent), decoded_data.shape[1] // 3, 3).astype(serialization.FLOAT_DTYPE),
+                'latent': latent.astype(serialization.FLOAT_DTYPE),
+                'offsets': offsets.astype(serialization.INDEX_DTYPE),
+            }
+            return serialization.dumps_binary(arrays, meta)
+
+        with metrics.phase(metrics.SERIALIZATION):
+            values = [{'latent': latent[start:stop].tolist(), 'data': serialization.frame_records(decoded_data[start:stop])}
+                      for start, stop in zip(offsets[:-1], offsets[1:])]
+            return json.dumps({'data': values, **meta})
+
+    def _decode_lattice(self, configID, mode):
+        """Returns the lattice interpolating the poses in the given mode, or None for exact decoding."""
+        if mode != LATTICE:
+            return None
+        return self.configs.get(configID).lattice
+
+    def _decode_meta(self, grid) -> dict:
+        if grid is None:
+            return {'type': 'reconstructed', 'mode': EXACT}
+        return {'type': 'reconstructed', 'mode': LATTICE, 'max_error': grid.max_error}
+
+    def _decode(self, latent: np.ndarray, configID, grid=None) -> np.ndarray:
+        """Decodes latent codes, reusing the poses of codes that were decoded before.
+
+        The codes are quantized to `decode_resolution`, so that all codes within the
+        same cell share the pose decoded at the cell center. Only the cells missing
+        from the decode cache are passed through the decoder, in a single batch.
+
+        Parameters
+        ----------
+        grid:
+            A lattice from which the poses of the codes inside of it are interpolated
+            instead. The codes outside of the lattice are decoded.
+
+        Returns
+        -------
+        An array of shape [n_codes, n_features].
+        """
+        latent = np.asarray(latent, dtype=np.double).reshape(-1, 2)
+        if len(latent) == 0:
+            return np.empty((0, 0), dtype=np.float32)
+
+        if grid is not None:
+            inside = grid.contains(latent)
+            if inside.all():
+                return grid.interpolate(latent)
+
+            decoded = np.empty((len(latent), grid.poses.shape[-1]), dtype=grid.poses.dtype)
+            decoded[inside] = grid.interpolate(latent[inside])
+            decoded[~inside] = self._decode(latent[~inside], configID)
+            return decoded
+
+        model = self.configs.get(configID).model
+        if not self.decode_resolution:
+            return self.inference.decode(model, latent)
+
+        cells = np.round(latent / self.decode_resolution).astype(np.int64)
+        keys = [(configID, cx, cy) for cx, cy in cells.tolist()]
+        decoded = [self._decodes.get(key) for key in keys]
+
+        missing = list(dict.fromkeys(key for key, pose in zip(keys, decoded) if pose is None))
+        if missing:
+            centers = np.array([key[1:] for key in missing]) * self.decode_resolution
+            poses = self.inference.decode(model, centers)
+
+            # Copies keep the cached rows from holding on to the whole batch
+            computed = {key: pose.copy() for key, pose in zip(missing, poses)}
+            for key, pose in computed.items():
+                self._decodes.put(key, pose)
+            decoded = [computed[key] if pose is None else pose for key, pose in zip(keys, decoded)]
+
+        return np.stack(decoded)
+
+    def get_lattice_status(self, configID) -> str:
+        """Returns the shape, the bounds and the interpolation error of the decoded lattice of a configuration."""
+        grid = self.configs.get(configID).lattice
+        if grid is None:
+            return json.dumps({'error': {'msg': f'No decoded lattice for: {configID}'}})
+        return json.dumps(grid.status())
+
+    def get_inference_status(self) -> str:
+        """Returns the throughput and latency counters of the inference batcher."""
+        return json.dumps(self.inference.stats())
+
+    def collect_metrics(self) -> List[metrics.Family]:
+        """Returns the cache, configuration, inference and job metrics for :func metrics.Registry.register:."""
+        caches = {'decode': self._decodes, 'grid_tiles': self._grid_tiles, 'density': self._densities,
+                  'frame_index': self._frame_indexes}
+        hits = metrics.Family('irl_cache_hits_total', 'counter', 'Lookups answered from a cache.')
+        misses = metrics.Family('irl_cache_misses_total', 'counter', 'Lookups missing a cache.')
+        ratio = metrics.Family('irl_cache_hit_ratio', 'gauge', 'Fraction of the lookups answered from a cache.')
+        size = metrics.Family('irl_cache_entries', 'gauge', 'Entries held by a cache.')
+        for name, cache in caches.items():
+            stats = cache.stats()
+            lookups = stats['hits'] + stats['misses']
+            hits.add(stats['hits'], cache=name)
+            misses.add(stats['misses'], cache=name)
+            ratio.add(stats['hits'] / lookups if lookups else None, cache=name)
+            size.add(stats['size'], cache=name)
+
+        configs = metrics.Family('irl_resident_configs', 'gauge', 'Configurations kept in memory.')
+        configs.add(len(self.configs.resident()))
+        config_bytes = metrics.Family('irl_resident_config_bytes', 'gauge', 'Estimated memory used by the resident '
+                                      'configurations.')
+        config_bytes.add(self.configs.memory_usage())
+
+        batches = self.inference.stats()
+        inference = [
+            metrics.Family('irl_inference_calls_total', 'counter', 'Encoder and decoder calls.').add(batches['calls']),
+            metrics.Family('irl_inference_batches_total', 'counter', 'Batched forward passes.').add(batches['batches']),
+            metrics.Family('irl_inference_rows_total', 'counter', 'Rows passed through the models.').add(batches['rows']),
+        ]
 
-        values = [frame.reshape(-1, 3) for frame in decoded_data]
-        values = [{
-            'x': arr[:, 0].tolist(),
-            'y': arr[:, 1].tolist(),
-            'z': arr[:, 2].tolist()
-        } for arr in values]
+        scheduled = self.jobs.stats()
+        job_stats = metrics.Family('irl_jobs', 'gauge', 'Background jobs by state.')
+        job_stats.add(scheduled['running'], state='running').add(scheduled['queued'], state='queued')
+        capacity = metrics.Family('irl_job_capacity', 'gauge', 'Jobs that may be running or queued at once.')
+        capacity.add(scheduled['max_workers'] + scheduled['max_queued'])
 
-        return json.dumps({'data': values, 'type': 'reconstructed'})
+        return [hits, misses, ratio, size, configs, config_bytes, *inference, job_stats, capacity]
 
+    def get_decode_cache_status(self) -> str:
+        """Returns the size and the hit and miss counters of the decode cache."""
+        return json.dumps({**self._decodes.stats(), 'resolution': self.decode_resolution})
 
-    def get_skeleton(self, query) -> np.ndarray:
+    def get_skeleton(self, query, configID, binary=False) -> np.ndarray:
         """Retrieves the original skeleton data given the index.
 
         Parameters
         ----------
         query:
             A query object.
+        configID:
+            The name of the configuration whose dataset contains the skeleton.
+        binary:
+            Return the binary payload format of :mod serialization: instead of json.
 
         Returns
         -------
             A json array rerpresenting the paths for drawing the skeleton.
         """
-        res = dict(data=[])
-
-        if query is None:
-            return json.dumps(res)
+        state = self.configs.get(configID)
+        values = state.dataset.values[:0]
 
         if isinstance(query, int):
-            values = self._active_dataset.iloc[query, :].values
+            values = state.dataset.values[query:query + 1]
 
-        else:
-            values = self._active_dataset[
-                self._active_dataset.index.get_level_values('GestureType').isin([query['GestureType']]) &
-                self._active_dataset.index.get_level_values('ParticipantID').isin([query['ParticipantID']]) &
-                self._active_dataset.index.get_level_values('TrialID').isin([query['TrialID']])
-            ]
-        
-        values = [frame.reshape(-1, 3) for frame in values]
-        values = [{
-            'x': arr[:, 0].tolist(),
-            'y': arr[:, 1].tolist(),
-            'z': arr[:, 2].tolist()
-        } for arr in values]
-        return json.dumps({'data': values, 'type': 'original'})
-
-    def calculate_skeleton_grid(self, xrange, yrange, num=11):
+        elif query is not None:
+            trial = state.trials.find_trial(query['GestureType'], query['ParticipantID'], query['TrialID'])
+            if trial is not None:
+                values = state.trials.frames[state.trials.trial_slice(trial)]
+
+        if binary:
+            return serialization.dumps_frames(values, {'type': 'original'})
+
+        if len(values) == 0:
+            return json.dumps(dict(data=[]))
+
+        with metrics.phase(metrics.SERIALIZATION):
+            values = serialization.frame_records(values)
+            return json.dumps({'data': values, 'type': 'original'})
+
+    def calculate_skeleton_grid(self, xrange, yrange, configID, num=11):
         """Calculates a grid of reconstructed latent samples.
 
         The grid of reconstructed latent samples gives the user a quick overview
         over the latent space. For this, a point grid is calculated over the plotting area
         representing `areas` of reconstructed values.
 
+        The grid cells are quantized to the tiles defined in :mod tiles:. Rendered tiles are
+        cached per configuration and zoom level, so only tiles that have not been visited
+        before are decoded.
+
         Parameters
         ----------
+        configID:
+            The name of the configuration whose model decodes the grid.
         num:
-            The density of the grid.
+            The approximate number of grid cells along each axis.
 
         Returns
         -------
         A list containing the data values to be plotted using the plotly framework.
         """
-        # Draw grid background
         xsize = np.abs(xrange[1] - xrange[0])
         ysize = np.abs(yrange[1] - yrange[0])
 
-        # number of reconstructed gestures in one row
-        x_grid, y_grid = np.meshgrid(
-            np.linspace(xrange[0], xrange[1], num + 1),
-            np.linspace(yrange[0], yrange[1], num + 1))
+        if xsize == 0 or ysize == 0:
+            return json.dumps([])
+
+        zoom_x, zoom_y = tiles.zoom_level(xsize, num), tiles.zoom_level(ysize, num)
+        cells_x, cells_y = tiles.visible_cells(xrange, zoom_x), tiles.visible_cells(yrange, zoom_y)
 
-        grid = np.zeros((num, num, 3))
-        grid[:, :, 0] += x_grid[:1, :-1]
-        grid[:, :, 1] += y_grid[:-1, :-1]
+        keys = [(configID, zoom_x, zoom_y, tx, ty)
+                for ty in tiles.visible_tiles(cells_y) for tx in tiles.visible_tiles(cells_x)]
+        # Look up every tile once, as other requests may evict tiles from the cache meanwhile
+        found = {key: self._grid_tiles.get(key) for key in keys}
+        missing = [key for key, tile in found.items() if tile is None]
+        if missing:
+            found.update(zip(missing, self._render_grid_tiles(self.configs.get(configID), missing)))
+
+        # The skeleton paths of each cell are cached as serialized json
+        res = []
+        with metrics.phase(metrics.SERIALIZATION):
+            for cy, cx in product(cells_y, cells_x):
+                tile = found[(configID, zoom_x, zoom_y, cx // tiles.TILE_SIZE, cy // tiles.TILE_SIZE)]
+                res.append(f'{{"id": {len(res)}, "skeleton": {tile[(cx, cy)]}}}')
 
-        # center each grid cell horizontally
-        grid[:, :, 0:1] += (xsize/num) * 0.5
-        grid[:, :, 1:2] += (ysize/num) * 0.5
+            return '[' + ', '.join(res) + ']'
 
-        with torch.no_grad():
-            latent_tensor = torch.tensor(grid[:, :, :2].reshape(-1, 2)).float()
-            decoded_data = self.model.decode(latent_tensor).numpy()
+    def _render_grid_tiles(self, state, keys):
+        """Decodes and renders the skeleton paths of the given grid tiles.
+
+        Every rendered tile is stored in the tile cache.
+
+        Returns
+        -------
+        A list with one dictionary per tile, mapping the cell indices to the json serialized
+        skeleton paths.
+        """
+        tile_cells, centers = zip(*[tiles.cell_centers(tx, ty, zx, zy) for _, zx, zy, tx, ty in keys])
+        centers = np.stack(centers)
+
+        decoded_data = self.inference.decode(state.model, centers.reshape(-1, 2))
 
         # scale data to fit within one grid cell
-        decoded_data = decoded_data.reshape(num, num, -1, 3)
+        decoded_data = decoded_data.reshape(centers.shape[0], centers.shape[1], -1, 3)
         decoded_data = decoded_data - np.amin(decoded_data, axis=2, keepdims=True)
-        max_dim = np.amax(decoded_data, axis=2, keepdims=True)
-        min_dim = np.amin(decoded_data, axis=2, keepdims=True)
-
-        ranges = np.abs(max_dim - min_dim)
-        
-        x_scale = np.max(ranges[:, :, :, 0]) / (xsize / num)
-        y_scale = np.max(ranges[:, :, :, 1]) / (ysize / num)
 
-        decoded_data[:, :, :, 0] /= x_scale * 1.2
-        decoded_data[:, :, :, 1] /= y_scale * 1.2
+        cell_sizes = np.array([[tiles.cell_size(zx), tiles.cell_size(zy)] for _, zx, zy, _, _ in keys])
+        decoded_data[..., :2] /= (state.pose_extent[:2] / cell_sizes * 1.2)[:, np.newaxis, np.newaxis]
 
         # Center the calculated cuboid centroid of the skeleton within the grid cell
         centroids = decoded_data.sum(axis=2) / decoded_data.shape[2]
-        decoded_data += np.expand_dims(grid - centroids, axis=2)
+        decoded_data[..., :2] += np.expand_dims(centers - centroids[..., :2], axis=2)
 
-        res = []
-        idx = count()
-        for i, j in product(range(num), range(num)):
-            skeleton = decoded_data[i, j]
-            # skeleton[i, j, :, 0] = np.expand_dims(grid[i, j, 0], axis = 2) - skeleton[i, j, :, 0]
+        n_tiles, n_cells, n_joints, _ = decoded_data.shape
+        points, offsets = self.plotter.get_skeleton_paths_batch(decoded_data.reshape(-1, n_joints, 3))
+        points = points.reshape(n_tiles, n_cells, -1, 3)
 
+        # Mirror the skeletons horizontally around the cell center
+        points[..., 0] = 2 * centers[:, :, np.newaxis, 0] - points[..., 0]
 
-            skeleton_paths = []
-            for path in self.plotter.get_skeleton_paths(skeleton):
-                path[:, 0] = path[:, 0] - 2 * (path[:, 0] - grid[i, j, 0])
-    
-                skeleton_paths.append(
-                    {
-                        'z1_dim': path[:, 0].tolist(),
-                        'z2_dim': path[:, 1].tolist()
-                    }
-                )
+        xs, ys = points[..., 0].tolist(), points[..., 1].tolist()
+        bounds = list(zip(offsets[:-1], offsets[1:]))
+
+        res = []
+        for key, cells, tile_xs, tile_ys in zip(keys, tile_cells, xs, ys):
+            with metrics.phase(metrics.SERIALIZATION):
+                tile = {cell: json.dumps([{'z1_dim': x[a:b], 'z2_dim': y[a:b]} for a, b in bounds])
+                        for cell, x, y in zip(cells, tile_xs, tile_ys)}
 
-            skeleton_data = dict(id=next(idx), skeleton=skeleton_paths)
-            res.append(skeleton_data)
+            self._grid_tiles.put(key, tile)
+            res.append(tile)
 
-        return json.dumps(res)
+        return res
 
-    def get_referents(self) -> str:
+    def get_referents(self, configID) -> str:
         """Retrieves a list of unique gesture types contained in the active dataset.
 
         Returns
         -------
         A json string representing a list of gesture types
         """
-        gesture_types = self._active_dataset.index.get_level_values('GestureType').unique()
+        gesture_types = self.configs.get(configID).dataset.index.get_level_values('GestureType').unique()
         return pd.DataFrame(gesture_types, columns=["GestureType"]).to_json(orient="table")
 
-    def get_latent_trial_values(self, gesture_type: List[str]) -> str:
+    def get_latent_trial_values(self, gesture_type: List[str], configID, viewport=None,
+                                tolerance=DEFAULT_PIXEL_TOLERANCE, binary=False) -> str:
         """Retrieves individual static poses for the given gesture type.
 
         Parameters
         ----------
         gesture_type:
             The identifier of the gesture type
+        configID:
+            The name of the configuration.
+        viewport:
+            A dictionary with the `xrange` and `yrange` of the viewport and optionally its
+            `width` and `height` in pixels. If given, each trajectory is clipped to the
+            viewport and simplified to the frames needed to draw it within `tolerance`
+            pixels, see :func paths.decimate:. A trajectory that leaves the viewport and
+            enters it again is split by a break, a frame whose coordinates and `Index` are
+            null. All frames are returned if None or if the viewport has no area.
+        tolerance:
+            The maximum distance in pixels of a removed frame from the drawn trajectory.
+        binary:
+            Return the binary payload format of :mod serialization: instead of json.
 
         Returns
         -------
         A json string representing the various trials.
         """
+        state = self.configs.get(configID)
 
-        filter_idx = self._active_dataset.index.get_level_values('GestureType').isin(gesture_type)
-        gesture_df = self._active_dataset[filter_idx]
+        if binary:
+            return self._dump_latent_trial_values(state, gesture_type, viewport, tolerance)
 
-        with torch.no_grad():
-            tensor = torch.from_numpy(gesture_df.values).float()
-            mean, _ = self.model.encode(tensor)
-        
-        df = pd.DataFrame(mean.numpy(), columns=["z1", "z2"])
+        if viewport is not None:
+            ranges, positions, offsets = self._trial_frames(state, gesture_type, viewport, tolerance)
+            trials = np.concatenate([np.arange(t.start, t.stop) for t in ranges] or [np.arange(0)])
+            gesture_df = pd.DataFrame(index=state.trials.trial_index(np.repeat(trials, np.diff(offsets))))
+            mean, rows = self._trial_frame_values(state, positions)
+
+            # Breaks are serialized as null, so that Plotly does not connect the parts
+            df = pd.DataFrame(mean, columns=["z1", "z2"], index=pd.array(rows, dtype='Int64'))
+            df.index = df.index.where(positions >= 0, pd.NA)
+        else:
+            filter_idx, gesture_df, mean = self._filter_referents(state, gesture_type)
+            df = pd.DataFrame(mean, columns=["z1", "z2"], index=np.flatnonzero(filter_idx))
+
+        # Index refers to the row position within the active dataset
         df.index.name = "Index"
 
         df['GestureType'] = gesture_df.index.get_level_values('GestureType')
@@ -258,88 +679,455 @@ class Controller:
         df['TrialID'] = gesture_df.index.get_level_values('TrialID')
         df = df.reset_index()
 
-        return df.groupby(['GestureType', 'ParticipantID', 'TrialID']).agg(list).to_json(orient="table")
+        with metrics.phase(metrics.SERIALIZATION):
+            return df.groupby(['GestureType', 'ParticipantID', 'TrialID']).agg(list).to_json(orient="table")
 
-    def get_raw_gesture(self, rid, pid, tid):
-        res = self._active_dataset[
-            (self._active_dataset.index.get_level_values('GestureType').isin([rid])
-            & self._active_dataset.index.get_level_values('ParticipantID').isin([pid])
-            & self._active_dataset.index.get_level_values('TrialID').isin([tid]))
-        ]
+    def _trial_frames(self, state, gesture_type: List[str], viewport=None, tolerance=DEFAULT_PIXEL_TOLERANCE):
+        """Selects the frames of all trials of the given gesture types.
 
-        if res.shape[0] != 1:
-            arr = res.values
-            frames = [frame.reshape(-1, 3) for frame in arr]
-            frames = [{'x': f[:, 0].tolist(), 'y': f[:, 1].tolist(), 'z': f[:, 2].tolist()} for f in frames]
-    
-            return json.dumps({'referent': rid, 'data': frames})
+        Parameters
+        ----------
+        viewport, tolerance:
+            Decimate the trajectories for the viewport, see :func get_latent_trial_values:.
+
+        Returns
+        -------
+        A tuple (ranges, positions, offsets) with the trial ranges of the gesture types in
+        store order, the store positions of the selected frames and the first selected
+        frame of each trial. With a viewport, a position of -1 separates the parts of a
+        trial that are drawn within the viewport, see :func paths.decimate:.
+        """
+        ranges = [state.trials.referent_trials(g) for g in set(gesture_type)]
+        ranges = sorted([trials for trials in ranges if trials], key=lambda trials: trials.start)
+
+        positions = np.concatenate([np.arange(state.trials.offsets[t.start], state.trials.offsets[t.stop])
+                                    for t in ranges] or [np.arange(0)])
+        lengths = np.concatenate([np.diff(state.trials.offsets[t.start:t.stop + 1]) for t in ranges] or [[]])
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(int)
+
+        if viewport is not None:
+            size = (viewport.get('width') or DEFAULT_VIEWPORT_SIZE[0], viewport.get('height') or DEFAULT_VIEWPORT_SIZE[1])
+            kept, parts = paths.decimate(state.trial_latents[positions], viewport['xrange'], viewport['yrange'], size,
+                                         tolerance, offsets, return_parts=True)
+            offsets = np.searchsorted(kept, offsets)
+
+            # Insert a break wherever a trial leaves the viewport and enters it again
+            breaks = np.setdiff1d(parts, offsets)
+            positions = np.insert(positions[kept], breaks, -1)
+            offsets = offsets + np.searchsorted(breaks, offsets)
+
+        return ranges, positions, offsets
+
+    def _trial_frame_values(self, state, positions: np.ndarray):
+        """Returns the latent coordinates and dataset rows of the frames at the given store positions.
+
+        Breaks, i.e. positions of -1, have NaN coordinates and a row of -1.
+        """
+        breaks = positions < 0
+        latent = np.where(breaks[:, None], np.nan, state.trial_latents[positions].reshape(-1, 2))
+        rows = np.where(breaks, -1, state.trials.rows[positions])
+        return latent, rows
+
+    def _dump_latent_trial_values(self, state, gesture_type: List[str], viewport=None,
+                                  tolerance=DEFAULT_PIXEL_TOLERANCE) -> bytes:
+        """Serializes the latent trajectories of the given gesture types into a binary payload.
+
+        The payload contains the arrays `latent` with the latent coordinates of all frames,
+        `index` with the row position of each frame within the active dataset and `offsets`
+        with the first frame of each trial. The metadata lists the GestureType, ParticipantID
+        and TrialID of each trial. With a viewport, the parts of a trial are separated by a
+        break with NaN coordinates and an index of -1.
+        """
+        ranges, positions, offsets = self._trial_frames(state, gesture_type, viewport, tolerance)
+        trial_keys = [list(key) for t in ranges for key in state.trials.trial_index(t).tolist()]
+        latent, rows = self._trial_frame_values(state, positions)
+
+        arrays = {
+            'latent': latent,
+            'index': rows,
+            'offsets': offsets,
+        }
+        arrays['latent'] = arrays['latent'].astype(serialization.FLOAT_DTYPE)
+        arrays['index'] = arrays['index'].astype(serialization.INDEX_DTYPE)
+        arrays['offsets'] = arrays['offsets'].astype(serialization.INDEX_DTYPE)
+
+        meta = {'columns': ['z1', 'z2'], 'trials': trial_keys}
+        return serialization.dumps_binary(arrays, meta)
+
+    def get_density(self, gesture_type: List[str], xrange, yrange, configID, bins=density.DEFAULT_VIEWPORT_BINS,
+                    binary=False):
+        """Computes the density rasters of the latent frames of the given referents within a viewport.
+
+        The rasters are cut from the density pyramid of each referent, see :mod density:, at
+        the level showing about `bins` bins along the longer side of the viewport. All
+        pyramids of a configuration cover the same bounding box, so the rasters of all
+        referents share their bins.
+
+        Parameters
+        ----------
+        gesture_type:
+            The referents whose densities are computed.
+        xrange, yrange:
+            The ranges of the viewport.
+        bins:
+            The approximate number of bins along the longer side of the viewport.
+        binary:
+            Return the binary payload format of :mod serialization: instead of json.
+
+        Returns
+        -------
+        A json object with the level, the lower left corner `x0`, `y0` and the size `dx`, `dy`
+        of the bins and the raster of each referent as an array of shape [n_bins_y, n_bins_x].
+        The binary payload contains one array `density_<i>` per referent.
+        """
+        state = self.configs.get(configID)
+        referents = [r for r in dict.fromkeys(gesture_type) if state.trials.referent_trials(r)]
+        pyramids = [self._density_pyramid(state, r) for r in referents]
+
+        meta, rasters = {'level': None, 'referents': referents}, []
+        if pyramids:
+            level = pyramids[0].level_for(xrange, yrange, bins)
+            window = pyramids[0].window(xrange, yrange, level)
+            rasters = [p.raster(level, window['rows'], window['cols']) for p in pyramids]
+            meta.update(level=level, x0=window['x0'], y0=window['y0'], dx=window['dx'], dy=window['dy'])
+
+        if binary:
+            arrays = {f'density_{i}': r.astype(serialization.FLOAT_DTYPE) for i, r in enumerate(rasters)}
+            return serialization.dumps_binary(arrays, meta)
+
+        with metrics.phase(metrics.SERIALIZATION):
+            data = [{'referent': r, 'values': raster.tolist()} for r, raster in zip(referents, rasters)]
+            return json.dumps({**meta, 'data': data})
+
+    def _density_pyramid(self, state, referent) -> density.DensityPyramid:
+        """Returns the density pyramid of the latent frames of a referent and builds it if necessary."""
+        key = (state.name, referent)
+        pyramid = self._densities.get(key)
+
+        if pyramid is None:
+            trials = state.trials.referent_trials(referent)
+            frames = state.trial_latents[state.trials.offsets[trials.start]:state.trials.offsets[trials.stop]]
+            pyramid = density.build(frames, density.bounding_box(state.latent_mean))
+            self._densities.put(key, pyramid)
+
+        return pyramid
+
+    def get_nearest_frames(self, point, configID, gesture_type: List[str] = None, k=1, binary=False):
+        """Finds the k latent frames closest to a point, e.g. to pick the frame under the cursor.
+
+        Parameters
+        ----------
+        point:
+            The latent coordinates [z1, z2] of the point.
+        configID:
+            The name of the configuration.
+        gesture_type:
+            The referents whose frames are searched. All referents are searched if None.
+        k:
+            The number of frames to return.
+        binary:
+            Return the binary payload format of :mod serialization: instead of json.
+
+        Returns
+        -------
+        The frames sorted by their distance to the point, see :meth _dump_frames:.
+        """
+        state = self.configs.get(configID)
+        results = [index.nearest(point, k) for index in self._frame_indexes_for(state, gesture_type)]
+        return self._dump_frames(state, *spatial.merge(results, k), binary=binary)
+
+    def get_frames_within_radius(self, point, radius, configID, gesture_type: List[str] = None, binary=False):
+        """Finds the latent frames within a euclidean distance of a point.
+
+        Parameters
+        ----------
+        point:
+            The latent coordinates [z1, z2] of the point.
+        radius:
+            The maximum distance of a frame to the point.
+        gesture_type:
+            The referents whose frames are searched. All referents are searched if None.
+
+        Returns
+        -------
+        The frames sorted by their distance to the point, see :meth _dump_frames:.
+        """
+        state = self.configs.get(configID)
+        results = [index.within_radius(point, radius) for index in self._frame_indexes_for(state, gesture_type)]
+        return self._dump_frames(state, *spatial.merge(results), binary=binary)
+
+    def get_frames_within_polygon(self, polygon, configID, gesture_type: List[str] = None, binary=False):
+        """Finds the latent frames inside a polygon, e.g. a lasso selection.
+
+        Parameters
+        ----------
+        polygon:
+            The latent coordinates of the vertices of the polygon as a list of [z1, z2] pairs.
+        gesture_type:
+            The referents whose frames are searched. All referents are searched if None.
+
+        Returns
+        -------
+        The frames grouped by trial in store order, see :meth _dump_frames:.
+        """
+        state = self.configs.get(configID)
+        positions = [index.within_polygon(polygon) for index in self._frame_indexes_for(state, gesture_type)]
+        return self._dump_frames(state, np.sort(np.concatenate(positions or [np.arange(0)])), binary=binary)
+
+    def _frame_indexes_for(self, state, gesture_type: List[str] = None) -> List[spatial.FrameIndex]:
+        """Returns the frame index of each given referent and builds the missing ones."""
+        referents = state.trials.referents.tolist() if gesture_type is None else dict.fromkeys(gesture_type)
+        indexes = []
+
+        for referent in referents:
+            if not state.trials.referent_trials(referent):
+                continue
+
+            key = (state.name, referent)
+            index = self._frame_indexes.get(key)
+            if index is None:
+                frames = state.trials.referent_slice(referent)
+                index = spatial.FrameIndex(state.trial_latents[frames], start=frames.start)
+                self._frame_indexes.put(key, index)
+            indexes.append(index)
+
+        return indexes
+
+    def _dump_frames(self, state, positions: np.ndarray, distances: np.ndarray = None, binary=False):
+        """Serializes the frames at the given store positions.
+
+        Returns
+        -------
+        A json string with one record per frame, holding the GestureType, ParticipantID and
+        TrialID of its trial, its position `Frame` within the trial, its row position
+        `Index` within the active dataset, its latent coordinates and, for point queries,
+        its `Distance` to the point. The binary payload contains the arrays `trial` with
+        the position of the trial of each frame in the `trials` list of the metadata,
+        `frame`, `index`, `latent` and `distance`.
+        """
+        trials = np.searchsorted(state.trials.offsets, positions, side='right') - 1
+        frames = positions - state.trials.offsets[trials]
+        unique, inverse = np.unique(trials, return_inverse=True)
+        keys = state.trials.trial_index(unique)
+
+        if binary:
+            arrays = {
+                'trial': inverse.astype(serialization.INDEX_DTYPE),
+                'frame': frames.astype(serialization.INDEX_DTYPE),
+                'index': state.trials.rows[positions].astype(serialization.INDEX_DTYPE),
+                'latent': state.trial_latents[positions].reshape(-1, 2).astype(serialization.FLOAT_DTYPE),
+            }
+            if distances is not None:
+                arrays['distance'] = distances.astype(serialization.FLOAT_DTYPE)
+            meta = {'columns': ['z1', 'z2'], 'trials': [list(key) for key in keys.tolist()]}
+            return serialization.dumps_binary(arrays, meta)
+
+        with metrics.phase(metrics.SERIALIZATION):
+            res = pd.DataFrame(state.trial_latents[positions].reshape(-1, 2), columns=['z1', 'z2'],
+                               index=keys[inverse])
+            res['Frame'] = frames
+            res['Index'] = state.trials.rows[positions]
+            if distances is not None:
+                res['Distance'] = distances
+            return res.reset_index().to_json(orient='records')
+
+    def get_raw_gesture(self, rid, pid, tid, configID, binary=False):
+        state = self.configs.get(configID)
+        trial = state.trials.find_trial(rid, pid, tid)
+
+        if trial is not None:
+            arr = state.trials.frames[state.trials.trial_slice(trial)]
+
+            if binary:
+                return serialization.dumps_frames(arr, {'referent': rid})
+
+            with metrics.phase(metrics.SERIALIZATION):
+                frames = serialization.frame_records(arr)
+                return json.dumps({'referent': rid, 'data': frames})
         
         return json.dumps({'error': { 'msg': f'Could not find data matching: Referent {rid} Participant {pid} Trial {tid}'}})
 
     
     def _find_barycenter(self, key, configID):
-            return self.db['barycenters'].find_one({'Referent': key, 'configID': configID})
+            return self.db['barycenters'].find_one({'Referent': key, 'configID': configID}, BARYCENTER_PROJECTION)
 
 
-    def _caluclate_barycenter(self, key):
-        idx = self._active_dataset.index.get_level_values('GestureType').isin([key])
-        filtered = self._active_dataset[idx]
+    def _caluclate_barycenter(self, key, configID):
+        job = self._submit_barycenter(key, configID)
+        with metrics.phase(metrics.DTW):
+            return job.result()
 
-        with torch.no_grad():
-            tensor = torch.from_numpy(filtered.values).float()
-            encoded, _ = self.model.encode(tensor)
+    def _submit_barycenter(self, referent, configID, on_done=None):
+        """Submits the barycenter computation of a referent, which is stored once it finished.
 
-        tss = pd.DataFrame(encoded, index=filtered.index)
-        tss = tss.groupby(['GestureType', 'ParticipantID', 'TrialID']).apply(lambda g: g.values)
-        
-        barycenters = (tss.groupby('GestureType')
-            .apply(to_time_series_dataset)
-            .apply(dtw_barycenter_averaging, verbose=True)
-        )
+        Returns
+        -------
+        The job computing the barycenter. Pending jobs for the same referent are reused.
+        """
+        _, tss = self._referent_sequences(self.configs.get(configID), referent)
+        key = (configID, referent)
+
+        def done(job):
+            try:
+                if job.status == jobs.FINISHED:
+                    self._store_barycenter(referent, configID, job.future.result())
+            except Exception as err:
+                job.fail(err)
+            finally:
+                # Failed jobs are kept, so that their error is reported until they are resubmitted
+                with self._barycenter_lock:
+                    if job.status != jobs.ERROR and self._barycenter_jobs.get(key) is job:
+                        del self._barycenter_jobs[key]
+                if on_done is not None:
+                    on_done(job)
+
+        job = self.jobs.submit(analytics.barycenter, tss, key=('barycenter', configID, referent), on_done=done)
+        with self._barycenter_lock:
+            if not job.done or job.status == jobs.ERROR:
+                self._barycenter_jobs[key] = job
+        return job
+
+    def _store_barycenter(self, referent, configID, bary):
+        data = array_store.encode(np.asarray(bary, dtype=np.double), self.fs)
+        res = self.db['barycenters'].update_one(
+            {'Referent': referent, 'configID': configID}, {'$setOnInsert': {'data': data}}, upsert=True)
+
+        # Another writer stored the barycenter first, so the GridFS file written for this one is not referenced
+        if res.upserted_id is None:
+            array_store.delete(data, self.fs)
+
+    def warmup_barycenters(self, configID) -> None:
+        """Computes the missing barycenters of all referents of a configuration in the background.
+
+        At most one barycenter per worker is submitted at a time, so that the warmup
+        does not fill the job queue used by interactive requests.
+        """
+        state = self.configs.get(configID)
+        stored = {d['Referent'] for d in self.db['barycenters'].find({'configID': configID}, {'Referent': True})}
+
+        with self._warmup_lock:
+            self._warmup_queues[configID] = [r for r in state.trials.referents if r not in stored]
+
+        for _ in range(self.jobs.max_workers):
+            self._warmup_next(configID)
+
+    def _warmup_next(self, configID):
+        while True:
+            with self._warmup_lock:
+                queue = self._warmup_queues.get(configID)
+                if not queue:
+                    return
+                referent = queue.pop(0)
+
+            pending = self._barycenter_jobs.get((configID, referent))
+            if pending is not None and not pending.done:
+                continue
+
+            try:
+                self._submit_barycenter(referent, configID, on_done=lambda job: self._warmup_next(configID))
+            except jobs.QueueFullError:
+                # The remaining barycenters are computed on demand
+                with self._warmup_lock:
+                    self._warmup_queues[configID] = []
+            return
+
+    def get_barycenter_status(self, configID) -> str:
+        """Reports the progress of the barycenter computations of a configuration.
+
+        Returns
+        -------
+        A json string with the number of referents, the number of stored barycenters and
+        the status and progress of the barycenters that are not stored yet.
+        """
+        referents = self.configs.get(configID).trials.referents
+        stored = {d['Referent'] for d in self.db['barycenters'].find({'configID': configID}, {'Referent': True})}
 
-        return barycenters.values[0]
+        with self._warmup_lock:
+            queued = set(self._warmup_queues.get(configID, []))
+
+        pending = []
+        for referent in referents:
+            if referent in stored:
+                continue
+            job = self._barycenter_jobs.get((configID, referent))
+            if job is not None:
+                pending.append(self._barycenter_job_status(referent, configID, job))
+            elif referent in queued:
+                pending.append({'Referent': referent, 'configID': configID, 'status': jobs.QUEUED, 'progress': 0.0})
+
+        finished = sum(1 for r in referents if r in stored)
+        running = any(p['status'] in (jobs.QUEUED, jobs.RUNNING) for p in pending)
+
+        return json.dumps({
+            'configID': configID,
+            'status': jobs.RUNNING if running else jobs.FINISHED,
+            'total': len(referents),
+            'finished': finished,
+            'progress': finished / len(referents) if len(referents) else 1.0,
+            'pending': pending
+        })
+
+    def _barycenter_job_status(self, referent, configID, job):
+        status = {'Referent': referent, 'configID': configID, 'status': job.status, 'progress': job.progress}
+        if job.status == jobs.ERROR:
+            status['msg'] = str(job.exception())
+        elif job.status == jobs.FINISHED:
+            # The barycenter is about to be stored by the completion callback
+            status['status'] = jobs.RUNNING
+        return status
 
     def get_barycenters(self, gesture_types, configID) -> str:
         """Get the barycenter for each gesture type in @gesture_types
-        
+
+        If the barycenters are computed in the background, barycenters that are not
+        available yet are listed in `pending` instead of blocking the request.
+
         Returns
         -------
         A json string representing the barycenters for the given gesture types.
         """
-        res = dict([(key, None) for key in gesture_types])
+        res = []
+        pending = []
 
-        for k, v in res.items():
+        for k in gesture_types:
             doc = self._find_barycenter(k, configID)
-            
+
             if not doc:
-                bary = self._caluclate_barycenter(k)
-                doc = {'configID': configID, 'Referent': k, 'data': bary.tolist()}
-                self.db['barycenters'].insert_one(doc)
+                if self.warmup:
+                    job = self._barycenter_jobs.get((configID, k))
+                    if job is None or job.status in (jobs.ERROR, jobs.CANCELLED):
+                        job = self._submit_barycenter(k, configID)
+                    pending.append(self._barycenter_job_status(k, configID, job))
+                    continue
 
-            bary = np.array(doc['data'])
+                bary = self._caluclate_barycenter(k, configID)
+                doc = {'configID': configID, 'Referent': k, 'data': bary}
 
-            doc['_id'] = str(doc['_id'])
-            res[k] = dict(
+            bary = array_store.decode(doc['data'], self.fs)
+
+            res.append(dict(
                 Referent=doc['Referent'],
                 configID=doc['configID'],
                 z1=bary[:, 0].tolist(),
                 z2=bary[:, 1].tolist()
-            )
-            
-        return json.dumps({'data': list(res.values())})
+            ))
 
-    def get_barycenter_reconstruction(self, referent, configID):
-        doc = self.db['barycenters'].find_one({'Referent': referent}, {'_id': False})
+        with metrics.phase(metrics.SERIALIZATION):
+            return json.dumps({'data': res, 'pending': pending})
+
+    def get_barycenter_reconstruction(self, referent, configID, binary=False):
+        doc = self.db['barycenters'].find_one({'Referent': referent, 'configID': configID}, {'_id': False, 'data': True})
 
         if doc:
-            with torch.no_grad():
-                arr = np.array(doc['data'])
-                tensor = torch.from_numpy(arr).float()
-                rec = self.model.decode(tensor).numpy()
-
-            frames = [frame.reshape(-1, 3) for frame in rec]
-            frames = [{'x': f[:, 0].tolist(), 'y': f[:, 1].tolist(), 'z': f[:, 2].tolist()} for f in frames]
-            return json.dumps({'referent': referent, 'data': frames})
+            arr = array_store.decode(doc['data'], self.fs)
+            rec = self.inference.decode(self.configs.get(configID).model, arr)
+
+            if binary:
+                return serialization.dumps_frames(rec, {'referent': referent})
+
+            with metrics.phase(metrics.SERIALIZATION):
+                frames = serialization.frame_records(rec)
+                return json.dumps({'referent': referent, 'data': frames})
         else:
             return json.dumps({'error': {'msg': f'Could not find barycenter for: {referent} {configID}'}})
 
@@ -349,14 +1137,15 @@ class Controller:
         return json.dumps(doc) 
 
     def get_cluster(self, uuid):
-        # doc = self.db['trained_cluster_models'].find_one({'_id': str(uuid)}, {'_id': False})
-        doc = self.db['trained_cluster_models'].find_one({'_id': str(uuid)}, {'_id': False})
+        doc = self.db['trained_cluster_models'].find_one({'_id': str(uuid)}, {
+            '_id': False, 'referent': True, 'config.hyper_params.n_clusters': True,
+            'config.model_params.cluster_centers_': True, 'config.predictions': True, 'config.centroid_names': True})
 
 
         centers = None
         if doc:
             k = doc['config']['hyper_params']['n_clusters']
-            centers = [np.array(c) for c in doc['config']['model_params']['cluster_centers_']]
+            centers = [array_store.decode(c, self.fs) for c in doc['config']['model_params']['cluster_centers_']]
             centers = [{
                 'GestureType': doc['referent'],
                 'z1': c[:, 0].tolist(),
@@ -372,13 +1161,17 @@ class Controller:
         return json.dumps({
             'K': k,
             'centroids': centers,
-            'predictions': doc['config']['predictions'],
+            'predictions': array_store.decode_columns(doc['config']['predictions'], self.fs),
             'uid': str(uuid),
             'centroid_names': centroid_names
         })
     
-    def list_clusters(self, rid):
-        docs = self.db['cluster_status'].find({'referent': rid, 'status': {'$ne': 'ERROR'}}, {'_i': False})
+    def list_clusters(self, rid, configID):
+        # Clusterings started before the configuration was stored with them are listed for every configuration
+        docs = self.db['cluster_status'].find(
+            {'referent': rid, '$or': [{'configID': configID}, {'configID': {'$exists': False}}],
+             'status': {'$nin': [jobs.ERROR, jobs.CANCELLED]}},
+            {'_id': False, 'referent': True, 'init_keys': True, 'K': True, 'id': True, 'timestamp': True})
         docs = [{
             'referent': d['referent'],
             'init_keys': d['init_keys'],
@@ -389,70 +1182,190 @@ class Controller:
         return json.dumps(docs)
 
     def update_config(self, config):
-        centroids = [list(zip(c['z1'], c['z2'])) for c in config['centroids']]
+        centroids = [array_store.encode(np.stack([c['z1'], c['z2']], axis=1), self.fs) for c in config['centroids']]
+        predictions = array_store.encode_columns(config['predictions'], self.fs)
+        previous = self.db['trained_cluster_models'].find_one(
+            {'_id': str(config['uid'])}, {'config.model_params.cluster_centers_': True, 'config.predictions': True})
         doc = self.db['trained_cluster_models'].update_one({'_id': str(config['uid'])}, 
             {'$set': {
                 "config.hyper_params.n_clusters": config['K'],
                 "config.model_params.cluster_centers_": centroids,
-                "config.predictions": config['predictions'],
+                "config.predictions": predictions,
                 "config.centroid_names": config['centroid_names']
             }})
 
+        # Without a matching model the new arrays are referenced by no document
+        if doc.matched_count == 0:
+            for value in centroids + [predictions]:
+                array_store.delete(value, self.fs)
+            return json.dumps({'error': {'msg': f'Could not find clustering model: {config["uid"]}'}})
+
+        if previous:
+            for value in previous['config']['model_params']['cluster_centers_'] + [previous['config']['predictions']]:
+                array_store.delete(value, self.fs)
+
         return json.dumps({'msg': 'Success'})
 
-    def run_clustering(self, uid, referent, k, init, centroid_names):
+    def run_clustering(self, uid, referent, k, init, centroid_names, configID,
+                       restarts=clustering.DEFAULT_RESTARTS, window=None,
+                       max_iter=clustering.DEFAULT_MAX_ITER, tol=clustering.DEFAULT_TOL, warm_start=None):
+        """Submits a DTW k-means clustering of the trials of a referent to the job scheduler.
+
+        Every restart is a separate job, so that the restarts are fitted in parallel. Once
+        all restarts are done, the one with the lowest inertia is written into
+        `trained_cluster_models`. The progress is written into `cluster_status`.
+
+        Parameters
+        ----------
+        init:
+            The initial centroids, each a dictionary with the coordinates `z1` and `z2`.
+        restarts:
+            The number of restarts. The first one starts from `init`, the others keep only its
+            first centroid and pick the remaining ones with k-means++ seeding, see
+            :func clustering.fit_restart:. Ignored with `warm_start`.
+        window:
+            The Sakoe-Chiba window of the DTW computations.
+        max_iter, tol:
+            The maximum number of iterations and the minimal decrease of the inertia.
+        warm_start:
+            The id of a trained model whose centroids replace `init`. A single restart is
+            fitted from them, as further restarts would discard most of the warm centroids.
+
+        Raises
+        ------
+        QueueFullError if the job scheduler does not admit further jobs.
+        """
+        state = self.configs.get(configID)
+        trials, sequences = self._referent_sequences(state, referent)
+        index = state.trials.trial_index(trials)
+
+        centroids = [np.stack([i['z1'], i['z2']], axis=1) for i in init]
+        if warm_start is not None:
+            centroids = self._warm_start_centroids(warm_start, k, centroids)
+            restarts = 1
+
+        self.db['cluster_status'].insert_one({
+            'id': uid,
+            'referent': referent,
+            'configID': configID,
+            'init_keys': init,
+            'K': k,
+            'centroid_names': centroid_names,
+            'restarts': restarts,
+            'warm_start': warm_start,
+            'timestamp': datetime.datetime.utcnow(),
+            'status': jobs.QUEUED,
+            'progress': 0.0
+        })
+
+        done = [None] * restarts
+        progress = [0.0] * restarts
+        lock = threading.Lock()
+
+        def set_status(status, **fields):
+            fields.update(status=status, timestamp=datetime.datetime.utcnow())
+            self.db['cluster_status'].update_one({'id': uid}, {'$set': fields})
+
+        def on_progress(i, job):
+            with lock:
+                progress[i] = job.progress
+                value = sum(progress) / restarts
+            self.db['cluster_status'].update_one({'id': uid}, {'$set': {'status': jobs.RUNNING, 'progress': value}})
+
+        def on_done(i, job):
+            with lock:
+                done[i] = job
+                if any(j is None for j in done):
+                    return
+
+            finished = [j.future.result() for j in done if j.status == jobs.FINISHED]
+            if not finished:
+                errors = [str(j.future.exception()) for j in done if j.status == jobs.ERROR]
+                if errors:
+                    set_status(jobs.ERROR, msg=errors[0])
+                else:
+                    set_status(jobs.CANCELLED)
+                return
+
+            json_data = None
+            try:
+                run = clustering.best_run(finished)
+                pred_df = pd.DataFrame(run['labels'], columns=['cls_asign'], index=index).reset_index()
+
+                json_data = clustering.model_dict(run, window=window, max_iter=max_iter, tol=tol, restarts=len(finished))
+                json_data['hyper_params']['init'] = init
+                json_data['predictions'] = array_store.encode_columns(pred_df.to_dict(orient='records'), self.fs)
+                json_data['model_params']['cluster_centers_'] = [array_store.encode(c, self.fs) for c in run['centroids']]
+                json_data['model_params']['labels_'] = array_store.encode(run['labels'], self.fs)
+                json_data['timestamp'] = datetime.datetime.utcnow()
+                json_data['hyper_params']['init_keys'] = init
+                json_data['hyper_params']['warm_start'] = warm_start
+                json_data['centroid_names'] = centroid_names
+
+                self.db['trained_cluster_models'].insert_one({'_id': uid, 'referent': referent, 'configID': configID, 'config': json_data})
+            except Exception as err:
+                # Remove the arrays already written to GridFS, no document references them
+                if json_data is not None:
+                    params = json_data['model_params']
+                    for value in params.get('cluster_centers_', []) + [params.get('labels_'), json_data.get('predictions')]:
+                        array_store.delete(value, self.fs)
+                set_status(jobs.ERROR, msg=str(err))
+                return
+
+            set_status(jobs.FINISHED, progress=1.0, inertia=run['inertia'], n_iter=run['n_iter'])
+
+        submitted = []
         try:
-            
-            self.db['cluster_status'].insert_one({
-                'id': uid,
-                'referent': referent,
-                'init_keys': init,
-                'K': k,
-                'centroid_names': centroid_names,
-                'timestamp': datetime.datetime.utcnow(),
-                'status': 'RUNNING'
-            })
-
-            data = self._active_dataset[self._active_dataset.index.get_level_values('GestureType').isin([referent])]
-
-            with torch.no_grad():
-                tensor = torch.from_numpy(np.stack(data.values)).float()
-                encoded, _ = self.model.encode(tensor)
-
-            tss_df = pd.DataFrame(encoded, columns=["z1", "z2"], index=data.index)
-            tss_df = tss_df.groupby(['GestureType', 'ParticipantID', 'TrialID']).apply(lambda g: g.values)
-            tss = pd.Series(to_time_series_dataset(tss_df.values).tolist(), index=tss_df.index)            
-            tss = np.stack(tss.values)
-
-            init_samples = to_time_series_dataset([list(zip(i['z1'], i['z2'])) for i in init])
-            padded_init = np.full((init_samples.shape[0], tss.shape[1], tss.shape[2]), np.nan)
-
-            padded_init[:, :init_samples.shape[1]] = init_samples
-
-
-            kmeans = TimeSeriesKMeans(n_clusters=k, init=init_samples, metric="dtw", verbose=1)
-            pred = kmeans.fit_predict(tss)
-            pred_df = pd.DataFrame(pred, columns=['cls_asign'], index=tss_df.index).reset_index()
-
-            json_data = kmeans._to_dict(output="json").copy()
-            json_data['hyper_params']['init'] = init
-            json_data['predictions'] = pred_df.to_dict(orient='records')
-            json_data['timestamp'] = datetime.datetime.utcnow()
-            json_data['hyper_params']['init_keys'] = init
-            json_data['centroid_names'] = centroid_names
-
-            oid = self.db['trained_cluster_models'].insert_one({'_id': uid, 'referent': referent, 'config': json_data})
-            self.db['cluster_status'].update_one({'id': uid}, {'$set': {'status': "FINISHED", 'timestamp': datetime.datetime.utcnow()}})
-        except Exception as err:
-            self.db['cluster_status'].update_one({'id': uid}, {'$set': {'status': "ERROR", 'msg': str(err) , 'timestamp': datetime.datetime.utcnow()}})
-            raise Exception(err)
-        
+            for i in range(restarts):
+                submitted.append(self.jobs.submit(
+                    clustering.fit_restart, sequences, k, centroids, i, window=window, max_iter=max_iter, tol=tol,
+                    job_id=f'{uid}/{i}',
+                    on_progress=lambda job, i=i: on_progress(i, job),
+                    on_done=lambda job, i=i: on_done(i, job)))
+        except jobs.QueueFullError as err:
+            set_status(jobs.ERROR, msg=str(err))
+            for job in submitted:
+                self.jobs.cancel(job.id)
+            raise
+
+    def _warm_start_centroids(self, model_id, k, init):
+        """Returns the centroids of a trained model adjusted to `k` clusters.
+
+        If the model has more than `k` centroids, those of the largest clusters are kept.
+        If it has fewer, the remaining centroids are taken from `init`.
+        """
+        doc = self.db['trained_cluster_models'].find_one(
+            {'_id': str(model_id)}, {'config.model_params.cluster_centers_': True, 'config.predictions': True})
+        if not doc:
+            return init
+
+        centers = [array_store.decode(c, self.fs) for c in doc['config']['model_params']['cluster_centers_']]
+        if len(centers) > k:
+            predictions = array_store.decode_columns(doc['config']['predictions'], self.fs)
+            sizes = np.bincount([p['cls_asign'] for p in predictions], minlength=len(centers))
+            keep = np.sort(np.argsort(-sizes, kind='stable')[:k])
+            return [centers[i] for i in keep]
+
+        return centers + init[len(centers):k]
+
+    def cancel_clustering(self, uid):
+        """Cancels the queued and running restarts of a clustering job."""
+        doc = self.db['cluster_status'].find_one({'id': str(uid)}, {'restarts': True})
+        restarts = doc.get('restarts', 1) if doc else 0
+        cancelled = [self.jobs.cancel(f'{uid}/{i}') for i in range(restarts)]
+        return json.dumps({'id': str(uid), 'cancelled': any(cancelled)})
+
+    def new_config(self, name, model, data, inference_precision=None):
+        if inference_precision is not None and inference_precision not in precision.PRECISIONS:
+            return json.dumps({'error': f'Unknown precision: {inference_precision}'})
 
-    def new_config(self, name, model, data):
         model_file = self.filestore.save(model, name)
         data_file = self.filestore.save(data, name)
         try: 
-            objId = self.db['config'].insert_one({'name': name, 'model': model_file, 'data': data_file})
+            doc = {'name': name, 'model': model_file, 'data': data_file}
+            if inference_precision is not None:
+                doc['precision'] = inference_precision
+            objId = self.db['config'].insert_one(doc)
             return json.dumps({'id': str(objId.inserted_id)})
         except PyMongoError as err:
             print(err)
@@ -460,7 +1373,7 @@ class Controller:
 
     def list_config(self):
         try: 
-            cursor = list(self.db['config'].find())
+            cursor = list(self.db['config'].find({}, {'name': True, 'model': True, 'data': True, 'precision': True}))
 
             for item in cursor:
                 item['_id'] = str(item['_id'])
@@ -471,59 +1384,166 @@ class Controller:
             return json.dumps({'error': str(err)})
 
     def get_mean_d2b(self, referent, configID):
-        doc = self.db['d2b'].find_one({'referent': referent, 'configID': configID})
-
-        if not doc:
-            data = self._active_dataset[self._active_dataset.index.get_level_values('GestureType').isin([referent])]
-            
-            with torch.no_grad():
-                tensor = torch.tensor(data.values).float()
-                mean, var = self.model.encode(tensor)
+        doc = self.db['d2b'].find_one({'referent': referent, 'configID': configID}, D2B_PROJECTION)
 
-            latent = pd.DataFrame(mean.numpy(), index=data.index, dtype=np.double)
-            latent = latent.groupby(['GestureType', 'ParticipantID', 'TrialID']).apply(lambda g: g.values)
+        if doc:
+            doc = self._with_statistics(doc)
+        else:
+            _, latent = self._referent_sequences(self.configs.get(configID), referent)
 
             doc = self._find_barycenter(referent, configID)
 
             if doc:
-                barycenter = np.array(doc['data'])
+                barycenter = array_store.decode(doc['data'], self.fs)
             else:
-                barycenter = self._caluclate_barycenter(referent)
+                barycenter = self._caluclate_barycenter(referent, configID)
 
-            values = list(map(lambda d: distance_fast(d, barycenter, window=25, psi=2), latent.values))
+            job = self.jobs.submit(analytics.distances_to_barycenter, latent, barycenter, window=D2B_WINDOW, psi=D2B_PSI,
+                                   key=('d2b', configID, referent))
+            with metrics.phase(metrics.DTW):
+                values = job.result()
             # values = [d * 1.0 / len(best_path(paths)) for d, paths in values]
-            
-            doc = {
-                'referent': referent,
-                'configID': configID,
-                'dist': values,
-                'median': np.mean(values),
-                'mean': np.mean(values),
-                'var': np.var(values),
-            }
-            self.db['d2b'].insert_one(doc)
+
+            doc = self._insert_d2b(referent, configID, values)
 
         doc['_id'] = str(doc['_id'])
 
-        return json.dumps(doc)
-    
+        with metrics.phase(metrics.SERIALIZATION):
+            return json.dumps(doc)
 
-    def get_nn(self, rid, z1, z2):
-        data = self._active_dataset[
-            self._active_dataset.index.get_level_values('GestureType').isin([rid])
-        ]
+    def get_all_d2b(self, configID):
+        """Computes the distances to the barycenter for all referents of a configuration.
+
+        The missing referents are split over one job per worker, each computing the
+        missing barycenters and the distances of its referents. The results of every job
+        are stored as soon as it finished, so that they are kept if another job or the
+        storing of another referent fails.
+
+        Returns
+        -------
+        A json string with one d2b document per referent.
+
+        Raises
+        ------
+        QueueFullError if the job scheduler does not admit all jobs. The jobs submitted
+        before are cancelled. Otherwise the first error raised by a job, after the results
+        of all other jobs were stored.
+        """
+        state = self.configs.get(configID)
+        docs = {d['referent']: self._with_statistics(d) for d in self.db['d2b'].find({'configID': configID}, D2B_PROJECTION)}
+        missing = [r for r in state.trials.referents if r not in docs]
+
+        if missing:
+            barycenters = {d['Referent']: array_store.decode(d['data'], self.fs)
+                           for d in self.db['barycenters'].find({'configID': configID, 'Referent': {'$in': missing}}, BARYCENTER_PROJECTION)}
+            items = [(r, self._referent_sequences(state, r)[1], barycenters.get(r)) for r in missing]
+
+            n_jobs = min(self.jobs.max_workers, len(items))
+            submitted = []
+            try:
+                for i in range(n_jobs):
+                    submitted.append(self.jobs.submit(analytics.referent_distances, items[i::n_jobs],
+                                                      window=D2B_WINDOW, psi=D2B_PSI))
+            except jobs.QueueFullError:
+                for job in submitted:
+                    self.jobs.cancel(job.id)
+                raise
+
+            error = None
+            pending = {job.future: job for job in submitted}
+            while pending:
+                with metrics.phase(metrics.DTW):
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+                for future in finished:
+                    try:
+                        results = pending.pop(future).result()
+                    except Exception as err:
+                        error, results = error or err, []
+
+                    for referent, bary, values in results:
+                        try:
+                            if referent not in barycenters:
+                                self._store_barycenter(referent, configID, bary)
+                            docs[referent] = self._insert_d2b(referent, configID, values)
+                        except Exception as err:
+                            error = error or err
+
+            if error is not None:
+                raise error
+
+        res = [docs[r] for r in state.trials.referents]
+        for doc in res:
+            doc['_id'] = str(doc['_id'])
+
+        with metrics.phase(metrics.SERIALIZATION):
+            return json.dumps({'data': res})
+
+    def _insert_d2b(self, referent, configID, values):
+        """Stores the distances to the barycenter with their statistics.
+
+        Returns
+        -------
+        The stored document with the distances as a list.
+        """
+        doc = {'referent': referent, 'configID': configID}
+        doc.update(analytics.summary_statistics(values))
+
+        res = self.db['d2b'].insert_one(dict(doc, dist=array_store.encode(np.asarray(values, dtype=np.double), self.fs)))
+        doc.update(_id=res.inserted_id, dist=list(values))
+        return doc
+
+    def _with_statistics(self, doc):
+        """Decodes the distances of a stored document.
+
+        Documents stored before the quantiles were added, whose median was the mean,
+        are updated.
+        """
+        doc['dist'] = array_store.decode(doc['dist'], self.fs).tolist()
+        if 'quantiles' not in doc:
+            stats = analytics.summary_statistics(doc['dist'])
+            self.db['d2b'].update_one({'_id': doc['_id']}, {'$set': stats})
+            doc.update(stats)
+        return doc
+
+    def get_nn(self, rid, z1, z2, configID, k=None, window=None, all_referents=False):
+        """Ranks the trials by their DTW distance to a latent trajectory.
+
+        Parameters
+        ----------
+        rid:
+            The referent whose trials are searched.
+        z1, z2:
+            The coordinates of the query trajectory.
+        configID:
+            The name of the configuration whose trials are searched.
+        k:
+            The number of nearest trials to return. All trials are ranked if None.
+        window:
+            The Sakoe-Chiba window of the DTW computation.
+        all_referents:
+            Search the trials of all referents instead of only those of `rid`.
+
+        Returns
+        -------
+        A json string with one record per trial, sorted by the DTW distance.
+        """
+        state = self.configs.get(configID)
+
+        if all_referents:
+            trials = range(len(state.trials))
+        else:
+            trials = state.trials.referent_trials(rid)
+
+        offsets = state.trials.offsets[trials.start:trials.stop + 1]
+        frames = state.trial_latents[offsets[0]:offsets[-1]]
 
-        with torch.no_grad():
-            tensor = torch.from_numpy(data.values).float()
-            mean, var = self.model.encode(tensor)
-        
         arr = np.stack([z1, z2]).transpose()
-        latent = pd.DataFrame(mean.numpy(), index=data.index, dtype=np.double)
-        latent = latent.groupby(['GestureType', 'ParticipantID', 'TrialID']).apply(lambda g: g.values)
+        with metrics.phase(metrics.DTW):
+            indices, values = nn_search.top_k(arr, frames, offsets - offsets[:1], k=k, window=window)
 
-        values = list(map(lambda d: distance_fast(d, arr), latent.values))
-        res = pd.DataFrame(values, index=latent.index, columns=["DTW"])
-        res['Index'] = list(range(res.shape[0]))
+        res = pd.DataFrame(values, index=state.trials.trial_index(trials)[indices], columns=["DTW"])
+        res['Index'] = indices
         res.set_index('Index', append=True, inplace=True)
-        res = res.sort_values(by="DTW").reset_index()
-        return res.to_json(orient='records', index=True)
\ No newline at end of file
+        with metrics.phase(metrics.SERIALIZATION):
+            return res.reset_index().to_json(orient='records')
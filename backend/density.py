@@ -0,0 +1,138 @@
+"""
+This module builds multi-resolution density rasters of latent points.
+
+The finest level of a pyramid bins the points into `BASE_BINS` x `BASE_BINS`
+bins over the bounding box of the embedding. Every coarser level halves the
+number of bins along each axis by summing 2 x 2 blocks. All levels are
+smoothed with a Gaussian kernel of `KERNEL_SIGMA` bins, which approximates a
+kernel density estimate whose bandwidth follows the zoom level.
+
+Rasters are arrays of shape [n_bins_y, n_bins_x], so that rows correspond to
+the y axis like in the heatmap and contour traces of plotly.
+"""
+from typing import Tuple
+
+import numpy as np
+
+
+# Number of bins along each axis of the finest level.
+BASE_BINS = 512
+
+# Standard deviation of the smoothing kernel in bins.
+KERNEL_SIGMA = 1.0
+
+# Default number of bins along each axis of a viewport.
+DEFAULT_VIEWPORT_BINS = 128
+
+# Margin added on each side of the bounding box, relative to its extent.
+BOUNDS_MARGIN = 0.05
+
+
+def bounding_box(points: np.ndarray, margin=BOUNDS_MARGIN):
+    """Returns the ranges ((x_min, x_max), (y_min, y_max)) of the points extended by the relative margin."""
+    points = np.asarray(points).reshape(-1, 2)
+    lo, hi = points.min(axis=0), points.max(axis=0)
+    pad = np.maximum(hi - lo, 1e-6) * margin
+    return tuple((float(a), float(b)) for a, b in zip(lo - pad, hi + pad))
+
+
+def _smooth(counts: np.ndarray, sigma: float) -> np.ndarray:
+    """Convolves a raster with a separable Gaussian kernel, treating the outside as empty."""
+    radius = int(np.ceil(3 * sigma))
+    if sigma <= 0 or radius == 0:
+        return counts
+
+    kernel = np.exp(-0.5 * (np.arange(-radius, radius + 1) / sigma) ** 2)
+    kernel /= kernel.sum()
+
+    for axis in (0, 1):
+        padded = np.pad(counts, [(radius, radius) if a == axis else (0, 0) for a in (0, 1)])
+        n = counts.shape[axis]
+        counts = sum(w * np.take(padded, np.arange(i, i + n), axis=axis) for i, w in enumerate(kernel))
+
+    return counts
+
+
+class DensityPyramid:
+    """This class holds the smoothed bin counts of a set of latent points at several resolutions."""
+
+    def __init__(self, levels, bounds, n_points):
+        """Initializes a new DensityPyramid instance.
+
+        Parameters
+        ----------
+        levels:
+            The smoothed bin counts of each level, finest first.
+        bounds:
+            The ranges ((x_min, x_max), (y_min, y_max)) covered by the rasters.
+        n_points:
+            The number of binned points.
+        """
+        self.levels = levels
+        self.bounds = bounds
+        self.n_points = n_points
+
+    @property
+    def nbytes(self) -> int:
+        return sum(level.nbytes for level in self.levels)
+
+    def bin_size(self, level: int) -> Tuple[float, float]:
+        ny, nx = self.levels[level].shape
+        (x0, x1), (y0, y1) = self.bounds
+        return (x1 - x0) / nx, (y1 - y0) / ny
+
+    def level_for(self, xrange, yrange, bins=DEFAULT_VIEWPORT_BINS) -> int:
+        """Returns the level showing about `bins` bins along the longer side of the viewport."""
+        dx, dy = self.bin_size(0)
+        ratio = max(abs(xrange[1] - xrange[0]) / dx, abs(yrange[1] - yrange[0]) / dy) / bins
+        level = int(np.round(np.log2(ratio))) if ratio > 0 else 0
+        return int(np.clip(level, 0, len(self.levels) - 1))
+
+    def window(self, xrange, yrange, level: int) -> dict:
+        """Returns the bins of a level intersecting the viewport.
+
+        Returns
+        -------
+        A dictionary with the slices `rows` and `cols` into the raster of the level, the
+        lower left corner `x0`, `y0` of the first bin and the bin size `dx`, `dy`.
+        """
+        dx, dy = self.bin_size(level)
+        ny, nx = self.levels[level].shape
+        (bx, _), (by, _) = self.bounds
+
+        cols = slice(*np.clip([np.floor((min(xrange) - bx) / dx), np.ceil((max(xrange) - bx) / dx)], 0, nx).astype(int))
+        rows = slice(*np.clip([np.floor((min(yrange) - by) / dy), np.ceil((max(yrange) - by) / dy)], 0, ny).astype(int))
+
+        return dict(rows=rows, cols=cols, x0=bx + cols.start * dx, y0=by + rows.start * dy, dx=dx, dy=dy)
+
+    def raster(self, level: int, rows: slice, cols: slice) -> np.ndarray:
+        """Returns the probability density of the points in the given bins of a level."""
+        dx, dy = self.bin_size(level)
+        return self.levels[level][rows, cols] / max(self.n_points * dx * dy, np.finfo(np.float32).tiny)
+
+
+def build(points: np.ndarray, bounds, base_bins=BASE_BINS, sigma=KERNEL_SIGMA) -> DensityPyramid:
+    """Builds the density pyramid of latent points.
+
+    Parameters
+    ----------
+    points:
+        An array of shape [n_points, 2].
+    bounds:
+        The ranges ((x_min, x_max), (y_min, y_max)) covered by the rasters. Points
+        outside of them are ignored.
+    base_bins:
+        The number of bins along each axis of the finest level, a power of two.
+    """
+    points = np.asarray(points, dtype=np.double).reshape(-1, 2)
+    (x0, x1), (y0, y1) = bounds
+    counts, _, _ = np.histogram2d(points[:, 1], points[:, 0], bins=base_bins, range=[[y0, y1], [x0, x1]])
+
+    levels = []
+    while True:
+        levels.append(_smooth(counts, sigma).astype(np.float32))
+        if min(counts.shape) < 2:
+            break
+        counts = counts.reshape(counts.shape[0] // 2, 2, counts.shape[1] // 2, 2).sum(axis=(1, 3))
+
+    return DensityPyramid(levels, bounds, len(points))
@@ -0,0 +1,165 @@
+"""
+This module serves responses that are fixed for a given configuration with
+validators, compression and a server side cache.
+
+The ETag of a response is a hash of the route, the request parameters, the
+negotiated format and the version of the configuration, which is derived
+from its config document and only changes with it, e.g. with its precision.
+A request whose `If-None-Match` lists the ETag of a response served before
+is answered with 304 without computing the response. Otherwise the response
+is served from the cache or computed, compressed once and cached under its
+ETag, so that hits skip both the computation and the serialization. Error
+responses, i.e. other statuses than 200 and json bodies with an `error`
+entry, are sent without an ETag and are not cached, as they may change
+without a change of the configuration, e.g. once a barycenter is stored.
+
+Bodies of at least `COMPRESSION_THRESHOLD` bytes are sent gzip compressed,
+or brotli compressed if the optional brotli package is installed, to the
+clients accepting it.
+"""
+import gzip
+import hashlib
+import json
+from functools import wraps
+from typing import Callable, Optional
+
+from flask import Response, make_response, request
+
+from cache import LRUCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Default maximum number of responses kept in the cache.
+DEFAULT_RESPONSE_CACHE_SIZE = 256
+
+# Default maximum number of bytes of all encodings of the cached responses.
+DEFAULT_RESPONSE_CACHE_BYTES = 256 * 1024 ** 2
+
+# Maximum number of ETags of served responses that are validated with 304.
+DEFAULT_VALIDATOR_CACHE_SIZE = 4096
+
+# Minimal size in bytes of the bodies that are compressed.
+COMPRESSION_THRESHOLD = 1024
+
+# Prefix of the json error bodies returned by the controller.
+ERROR_PREFIX = b'{"error"'
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class CachedResponse:
+    """This class holds the body of a response in every content encoding."""
+
+    def __init__(self, body: bytes, mimetype: str, threshold=COMPRESSION_THRESHOLD):
+        self.mimetype = mimetype
+        self.encodings = {'identity': body}
+
+        if len(body) >= threshold:
+            self.encodings['gzip'] = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+            if brotli is not None:
+                self.encodings['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(body) for body in self.encodings.values())
+
+    def encoding_for(self, accepted) -> str:
+        """Returns the smallest encoding accepted by the client."""
+        candidates = [e for e in self.encodings if e == 'identity' or e in accepted]
+        return min(candidates, key=lambda e: len(self.encodings[e]))
+
+
+class ResponseCache:
+    """This class decorates routes, so that their responses are validated, compressed and cached."""
+
+    def __init__(self, version: Callable[[str], str], maxsize=DEFAULT_RESPONSE_CACHE_SIZE,
+                 maxbytes=DEFAULT_RESPONSE_CACHE_BYTES, threshold=COMPRESSION_THRESHOLD):
+        """Initializes a new ResponseCache instance.
+
+        Parameters
+        ----------
+        version:
+            A function returning the current version of the configuration with the given name.
+        maxsize:
+            The maximum number of responses kept in memory. Responses are only validated and
+            compressed, but not cached, if 0.
+        maxbytes:
+            The maximum number of bytes of all encodings of the cached responses. Responses
+            exceeding it on their own are not cached. Nothing is cached if 0.
+        threshold:
+            The minimal size in bytes of the bodies that are compressed.
+        """
+        self.version = version
+        self.threshold = threshold
+        self._responses = LRUCache(maxsize, maxbytes, lambda entry: entry.nbytes) if maxsize and maxbytes else None
+        self._served = LRUCache(DEFAULT_VALIDATOR_CACHE_SIZE)
+
+    def etag(self, formats=()) -> str:
+        """Computes the ETag of the current request."""
+        params = request.get_json(silent=True) if request.method == 'POST' else request.args.to_dict()
+        params = params if isinstance(params, dict) else {}
+        accepted = request.accept_mimetypes.best_match(formats) if formats else None
+
+        key = json.dumps([request.path, params, accepted, self.version(params.get('configID'))], sort_keys=True)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def cached(self, formats=(), when: Optional[Callable[[bytes], bool]] = None):
+        """Decorates a route whose response only depends on its parameters and configuration.
+
+        Parameters
+        ----------
+        formats:
+            The mimetypes the route negotiates, see :func app.negotiate_format:.
+        when:
+            A function deciding from the body of a response whether it is final and may be
+            cached, e.g. because no results are pending.
+        """
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kw):
+                etag = self.etag(formats)
+                if etag in request.if_none_match and self._served.get(etag):
+                    return self._respond(Response(status=304), etag)
+
+                entry = self._responses.get(etag) if self._responses is not None else None
+                if entry is None:
+                    res = make_response(f(*args, **kw))
+                    if res.status_code != 200:
+                        return res
+
+                    body = res.get_data()
+                    if body.startswith(ERROR_PREFIX) or (when is not None and not when(body)):
+                        return res
+
+                    entry = CachedResponse(body, res.mimetype, self.threshold)
+                    if self._responses is not None:
+                        self._responses.put(etag, entry)
+
+                encoding = entry.encoding_for(request.accept_encodings)
+                res = Response(entry.encodings[encoding], mimetype=entry.mimetype)
+                if encoding != 'identity':
+                    res.headers['Content-Encoding'] = encoding
+                self._served.put(etag, True)
+                return self._respond(res, etag)
+            return wrapper
+        return decorator
+
+    def clear(self) -> None:
+        self._served.clear()
+        if self._responses is not None:
+            self._responses.clear()
+
+    def stats(self) -> Optional[dict]:
+        return self._responses.stats() if self._responses is not None else None
+
+    @staticmethod
+    def _respond(res: Response, etag: str) -> Response:
+        res.set_etag(etag)
+        res.headers['Cache-Control'] = 'no-cache'
+        res.vary.update(('Accept', 'Accept-Encoding'))
+        return res
@@ -0,0 +1,185 @@
+"""
+This module batches concurrent model inference calls.
+
+Every call of the encoder or decoder on a small tensor pays a fixed
+overhead, which dominates the cost of hover decoding. The InferenceBatcher
+collects the calls arriving within a short time window, concatenates their
+inputs, runs one forward pass per model and method and hands every caller
+its slice of the output.
+"""
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import List
+
+import numpy as np
+import torch
+
+import metrics
+from precision import input_dtype
+
+
+# Default time in seconds a batch waits for further calls after its first one. Calls
+# arriving while a forward pass runs are batched even without waiting.
+DEFAULT_BATCH_WINDOW = 0.0
+
+# Default maximum number of input rows of a batch.
+DEFAULT_MAX_BATCH_SIZE = 1024
+
+
+class _Call:
+    def __init__(self, model, method, inputs):
+        self.model = model
+        self.method = method
+        self.inputs = inputs
+        self.future = Future()
+        self.submitted = time.perf_counter()
+
+
+class InferenceBatcher:
+    """This class runs the encode and decode calls of concurrent requests as batched forward passes.
+
+    The calls are executed by a background thread, which is started on the first call.
+    """
+
+    def __init__(self, window=DEFAULT_BATCH_WINDOW, max_batch_size=DEFAULT_MAX_BATCH_SIZE):
+        """Initializes a new InferenceBatcher instance.
+
+        Parameters
+        ----------
+        window:
+            The time in seconds a batch waits for further calls after its first call.
+            Only calls that are already waiting are batched if 0.
+        max_batch_size:
+            The number of input rows after which a batch is run without waiting for the
+            end of the window. A single call with more rows is run on its own.
+        """
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._calls = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._stats = dict(calls=0, batches=0, rows=0, latency=0.0, wait=0.0, busy=0.0)
+
+    def decode(self, model, latent: np.ndarray) -> np.ndarray:
+        """Decodes latent codes of shape [n_codes, z_dim] into an array of shape [n_codes, n_features]."""
+        return self.run(model, 'decode', latent)
+
+    def encode(self, model, values: np.ndarray):
+        """Encodes frames of shape [n_frames, n_features].
+
+        Returns
+        -------
+        A tuple of arrays (mean, logvar) with one row per frame.
+        """
+        return self.run(model, 'encode', values)
+
+    def run(self, model, method: str, inputs: np.ndarray):
+        """Calls `model.<method>` on the inputs as part of a batch and waits for the result.
+
+        Returns
+        -------
+        The rows of the output belonging to the inputs, as an array or a tuple of arrays if
+        the method returns several tensors.
+        """
+        inputs = np.asarray(inputs)
+        if len(inputs) == 0:
+            return self._forward(model, method, inputs)
+
+        call = _Call(model, method, inputs)
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._work, daemon=True)
+                self._worker.start()
+        self._calls.put(call)
+
+        return call.future.result()
+
+    def stats(self) -> dict:
+        """Returns the throughput and latency counters of all batches run so far.
+
+        The latency of a call is measured from its submission until its result is available,
+        its wait from its submission until its batch starts.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+
+        calls, batches = max(stats['calls'], 1), max(stats['batches'], 1)
+        return {
+            'window': self.window,
+            'max_batch_size': self.max_batch_size,
+            'calls': stats['calls'],
+            'batches': stats['batches'],
+            'rows': stats['rows'],
+            'mean_batch_calls': stats['calls'] / batches,
+            'mean_batch_rows': stats['rows'] / batches,
+            'mean_latency_ms': stats['latency'] / calls * 1000,
+            'mean_wait_ms': stats['wait'] / calls * 1000,
+            'rows_per_second': stats['rows'] / stats['busy'] if stats['busy'] > 0 else None,
+        }
+
+    def _collect(self) -> List[_Call]:
+        """Waits for the next call and collects the calls arriving within the window."""
+        calls = [self._calls.get()]
+        rows = len(calls[0].inputs)
+        deadline = time.perf_counter() + self.window
+
+        while rows < self.max_batch_size:
+            try:
+                timeout = deadline - time.perf_counter()
+                call = self._calls.get(timeout=timeout) if timeout > 0 else self._calls.get_nowait()
+            except queue.Empty:
+                break
+            calls.append(call)
+            rows += len(call.inputs)
+
+        return calls
+
+    def _work(self):
+        while True:
+            calls = self._collect()
+            started = time.perf_counter()
+
+            groups = dict()
+            for call in calls:
+                groups.setdefault((id(call.model), call.method), []).append(call)
+
+            for group in groups.values():
+                self._run_group(group)
+
+            finished = time.perf_counter()
+            with self._lock:
+                self._stats['calls'] += len(calls)
+                self._stats['batches'] += len(groups)
+                self._stats['rows'] += sum(len(call.inputs) for call in calls)
+                self._stats['wait'] += sum(started - call.submitted for call in calls)
+                self._stats['latency'] += sum(finished - call.submitted for call in calls)
+                self._stats['busy'] += finished - started
+
+    def _run_group(self, calls: List[_Call]):
+        """Runs the calls of the same model and method as one forward pass."""
+        try:
+            outputs = self._forward(calls[0].model, calls[0].method, np.concatenate([call.inputs for call in calls]))
+        except Exception as err:
+            for call in calls:
+                call.future.set_exception(err)
+            return
+
+        start = 0
+        for call in calls:
+            stop = start + len(call.inputs)
+            if isinstance(outputs, tuple):
+                call.future.set_result(tuple(out[start:stop] for out in outputs))
+            else:
+                call.future.set_result(outputs[start:stop])
+            start = stop
+
+    @staticmethod
+    def _forward(model, method, inputs: np.ndarray):
+        with torch.no_grad(), metrics.phase(metrics.INFERENCE):
+            outputs = getattr(model, method)(torch.from_numpy(inputs).to(input_dtype(model)))
+
+        if isinstance(outputs, (tuple, list)):
+            return tuple(out.numpy() for out in outputs)
+        return outputs.numpy()
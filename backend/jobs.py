@@ -0,0 +1,259 @@
+"""
+This module schedules long running analytics jobs on a bounded pool of
+worker processes.
+
+Running the jobs in separate processes keeps the DTW computations from
+competing for the GIL with the request handlers. Jobs report their progress
+through a queue shared with the workers, which is drained by a listener
+thread in the server process.
+"""
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+from typing import Callable, Dict, Hashable
+from uuid import uuid4
+
+
+QUEUED = 'QUEUED'
+RUNNING = 'RUNNING'
+FINISHED = 'FINISHED'
+ERROR = 'ERROR'
+CANCELLED = 'CANCELLED'
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the scheduler is at its admission limit."""
+
+    def __init__(self, limit):
+        super().__init__(f'The job queue is full ({limit} jobs). Try again later.')
+        self.limit = limit
+
+
+class Job:
+    """This class tracks the state of a submitted job."""
+
+    def __init__(self, job_id, key=None):
+        self.id = job_id
+        self.key = key
+        self.status = QUEUED
+        self.progress = 0.0
+        self.future = None
+        self.error = None
+        self.progress_callbacks = []
+        self.done_callbacks = []
+
+    def add_callbacks(self, on_progress=None, on_done=None) -> None:
+        if on_progress is not None:
+            self.progress_callbacks.append(on_progress)
+        if on_done is not None:
+            self.done_callbacks.append(on_done)
+
+    @property
+    def done(self) -> bool:
+        return self.status in (FINISHED, ERROR, CANCELLED)
+
+    def fail(self, err: BaseException) -> None:
+        """Marks a finished job as failed, e.g. because its result could not be stored."""
+        self.status = ERROR
+        self.error = err
+
+    def exception(self):
+        """Returns the exception raised by the job or recorded by :meth fail:, or None."""
+        if self.error is not None:
+            return self.error
+        if self.future is None or not self.future.done() or self.future.cancelled():
+            return None
+        return self.future.exception()
+
+    def result(self, timeout=None):
+        """Waits for the job and returns its result.
+
+        Raises
+        ------
+        CancelledError if the job was cancelled, otherwise the exception raised by the job.
+        """
+        res = self.future.result(timeout)
+        if self.status == CANCELLED:
+            raise CancelledError()
+        return res
+
+
+def _run(job_id, progress_queue, fn, args, kwargs):
+    """Executes a job in a worker process and forwards its progress reports."""
+    def progress(value):
+        progress_queue.put((job_id, float(value)))
+
+    progress(0.0)
+    return fn(*args, progress=progress, **kwargs)
+
+
+class JobScheduler:
+    """This class runs jobs on a process pool with a bounded number of pending jobs.
+
+    The worker processes are started with the `spawn` method on the first submission.
+    Jobs submitted with a key are deduplicated: while a job with the same key is
+    pending, submitting returns the pending job with the callbacks of the submission
+    added to it.
+    """
+
+    def __init__(self, max_workers=2, max_queued=16):
+        """Initializes a new JobScheduler instance.
+
+        Parameters
+        ----------
+        max_workers:
+            The number of worker processes.
+        max_queued:
+            The number of jobs that may wait for a free worker. Submissions beyond
+            `max_workers + max_queued` pending jobs raise a QueueFullError.
+        """
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self._jobs: Dict[str, Job] = dict()
+        self._keys: Dict[Hashable, Job] = dict()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._manager = None
+        self._progress = None
+        self._listener = None
+
+    def _start(self):
+        ctx = multiprocessing.get_context('spawn')
+        self._manager = ctx.Manager()
+        self._progress = self._manager.Queue()
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx)
+        self._listener = threading.Thread(target=self._listen, daemon=True)
+        self._listener.start()
+
+    def submit(self, fn: Callable, *args, job_id=None, key=None, on_progress=None, on_done=None, **kwargs) -> Job:
+        """Submits a job to the worker pool.
+
+        Parameters
+        ----------
+        fn:
+            A picklable function accepting a `progress` keyword argument.
+        job_id:
+            The identifier of the job. A random one is generated if None.
+        key:
+            Deduplicates jobs computing the same result.
+        on_progress:
+            Called with the job whenever its progress changes.
+        on_done:
+            Called with the job once it finished, failed or was cancelled.
+
+        Returns
+        -------
+        The submitted job, or the pending job with the same key.
+        """
+        with self._lock:
+            if key is not None and key in self._keys:
+                job = self._keys[key]
+                job.add_callbacks(on_progress, on_done)
+                return job
+
+            # Cancelled jobs still occupy their worker until they return
+            pending = sum(1 for job in self._jobs.values() if not job.future.done())
+            if pending >= self.max_workers + self.max_queued:
+                raise QueueFullError(self.max_workers + self.max_queued)
+
+            if self._executor is None:
+                self._start()
+
+            job = Job(job_id or str(uuid4()), key)
+            job.add_callbacks(on_progress, on_done)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._keys[key] = job
+
+            job.future = self._executor.submit(_run, job.id, self._progress, fn, args, kwargs)
+
+        job.future.add_done_callback(lambda _: self._finish(job))
+        return job
+
+    def get(self, job_id) -> Job:
+        """Returns the job with the given identifier or None."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id) -> bool:
+        """Cancels a job.
+
+        Queued jobs are removed from the queue. A running job can not be interrupted
+        without terminating its worker, so it runs to completion and its result is
+        discarded.
+
+        Returns
+        -------
+        False if the job does not exist or is already done.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return False
+            job.status = CANCELLED
+            if job.key is not None and self._keys.get(job.key) is job:
+                del self._keys[job.key]
+
+        job.future.cancel()
+        return True
+
+    def stats(self) -> dict:
+        """Returns the number of running and queued jobs and the capacity of the scheduler.
+
+        Jobs are reported as running once they sent their first progress update.
+        """
+        with self._lock:
+            pending = [job for job in self._jobs.values() if not job.future.done()]
+            running = sum(1 for job in pending if job.status == RUNNING)
+
+        return {
+            'max_workers': self.max_workers,
+            'max_queued': self.max_queued,
+            'running': running,
+            'queued': len(pending) - running,
+        }
+
+    def shutdown(self):
+        """Stops the worker processes after the running jobs finished."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._progress.put(None)
+            self._manager.shutdown()
+            self._executor = None
+
+    def _finish(self, job):
+        with self._lock:
+            if job.status != CANCELLED:
+                if job.future.cancelled():
+                    job.status = CANCELLED
+                elif job.future.exception() is not None:
+                    job.status = ERROR
+                else:
+                    job.status = FINISHED
+                    job.progress = 1.0
+            if job.key is not None and self._keys.get(job.key) is job:
+                del self._keys[job.key]
+            # Only the ids of pending jobs are kept; finished jobs are reported by their callbacks
+            self._jobs.pop(job.id, None)
+            callbacks = list(job.done_callbacks)
+
+        for callback in callbacks:
+            callback(job)
+
+    def _listen(self):
+        while True:
+            msg = self._progress.get()
+            if msg is None:
+                return
+
+            job_id, value = msg
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job.done:
+                    continue
+                job.status = RUNNING
+                job.progress = value
+                callbacks = list(job.progress_callbacks)
+
+            for callback in callbacks:
+                callback(job)
@@ -0,0 +1,121 @@
+"""
+This module approximates the decoder by a lattice of decoded poses.
+
+The lattice covers the bounding box of an embedding with `size` x `size`
+evenly spaced latent codes whose poses are decoded once. The pose of any
+latent code inside the box is then the bilinear interpolation of the poses
+at the four surrounding lattice points, which replaces a forward pass of the
+decoder by a few array operations.
+"""
+from typing import Callable
+
+import numpy as np
+
+
+# Number of latent codes passed through the decoder at once when building a lattice.
+DECODE_CHUNK_SIZE = 8192
+
+# Margin added on each side of the bounding box, relative to its extent.
+BOUNDS_MARGIN = 0.05
+
+
+class Lattice:
+    """This class holds the decoded poses of a regular grid of latent codes."""
+
+    def __init__(self, xs: np.ndarray, ys: np.ndarray, poses: np.ndarray):
+        """Initializes a new Lattice instance.
+
+        Parameters
+        ----------
+        xs, ys:
+            The coordinates of the lattice points along each latent axis.
+        poses:
+            A contiguous array of shape [len(xs), len(ys), n_features] with the decoded poses.
+        """
+        self.xs = xs
+        self.ys = ys
+        self.poses = poses
+        self.max_error = None
+        self.mean_error = None
+
+    @property
+    def nbytes(self) -> int:
+        return self.poses.nbytes + self.xs.nbytes + self.ys.nbytes
+
+    def contains(self, latent: np.ndarray) -> np.ndarray:
+        """Returns a boolean mask of the latent codes inside the lattice."""
+        latent = np.asarray(latent).reshape(-1, 2)
+        return ((latent[:, 0] >= self.xs[0]) & (latent[:, 0] <= self.xs[-1]) &
+                (latent[:, 1] >= self.ys[0]) & (latent[:, 1] <= self.ys[-1]))
+
+    def interpolate(self, latent: np.ndarray) -> np.ndarray:
+        """Interpolates the poses of latent codes bilinearly from the lattice.
+
+        Codes outside of the lattice are clamped to its boundary.
+
+        Returns
+        -------
+        An array of shape [n_codes, n_features].
+        """
+        latent = np.asarray(latent, dtype=np.double).reshape(-1, 2)
+
+        fx = np.clip((latent[:, 0] - self.xs[0]) / (self.xs[1] - self.xs[0]), 0, len(self.xs) - 1)
+        fy = np.clip((latent[:, 1] - self.ys[0]) / (self.ys[1] - self.ys[0]), 0, len(self.ys) - 1)
+        ix = np.minimum(fx.astype(np.intp), len(self.xs) - 2)
+        iy = np.minimum(fy.astype(np.intp), len(self.ys) - 2)
+        tx = (fx - ix)[:, None]
+        ty = (fy - iy)[:, None]
+
+        poses = self.poses
+        return ((1 - tx) * (1 - ty) * poses[ix, iy] + tx * (1 - ty) * poses[ix + 1, iy] +
+                (1 - tx) * ty * poses[ix, iy + 1] + tx * ty * poses[ix + 1, iy + 1]).astype(poses.dtype)
+
+    def status(self) -> dict:
+        return {
+            'shape': list(self.poses.shape),
+            'bounds': [[float(self.xs[0]), float(self.xs[-1])], [float(self.ys[0]), float(self.ys[-1])]],
+            'max_error': self.max_error,
+            'mean_error': self.mean_error,
+        }
+
+
+def _decode_chunked(decode: Callable[[np.ndarray], np.ndarray], latent: np.ndarray) -> np.ndarray:
+    return np.concatenate([decode(latent[start:start + DECODE_CHUNK_SIZE])
+                           for start in range(0, len(latent), DECODE_CHUNK_SIZE)])
+
+
+def build(decode: Callable[[np.ndarray], np.ndarray], latent: np.ndarray, size: int) -> Lattice:
+    """Decodes a lattice over the bounding box of the given latent codes.
+
+    The interpolation error is estimated at the centers of all lattice cells, where the
+    bilinear interpolation is farthest from the decoded lattice points.
+
+    Parameters
+    ----------
+    decode:
+        A function decoding an array of latent codes of shape [n_codes, 2].
+    latent:
+        The latent codes of the embedding, whose bounding box is covered.
+    size:
+        The number of lattice points along each axis, at least 2.
+
+    Returns
+    -------
+    The lattice with its maximum and mean absolute interpolation error.
+    """
+    lo, hi = latent.min(axis=0), latent.max(axis=0)
+    margin = np.maximum(hi - lo, 1e-6) * BOUNDS_MARGIN
+    lo, hi = lo - margin, hi + margin
+
+    xs, ys = np.linspace(lo[0], hi[0], size), np.linspace(lo[1], hi[1], size)
+    grid = np.stack(np.meshgrid(xs, ys, indexing='ij'), axis=-1).reshape(-1, 2)
+    poses = _decode_chunked(decode, grid)
+    lattice = Lattice(xs, ys, np.ascontiguousarray(poses.reshape(size, size, -1)))
+
+    cx, cy = (xs[:-1] + xs[1:]) / 2, (ys[:-1] + ys[1:]) / 2
+    centers = np.stack(np.meshgrid(cx, cy, indexing='ij'), axis=-1).reshape(-1, 2)
+    errors = np.abs(lattice.interpolate(centers) - _decode_chunked(decode, centers))
+    lattice.max_error = float(errors.max())
+    lattice.mean_error = float(errors.mean())
+
+    return lattice
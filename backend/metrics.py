@@ -0,0 +1,200 @@
+"""
+This module collects timings and counters of the server and renders them
+in the Prometheus text exposition format.
+
+Histograms are updated in place with a few additions under a lock, so that
+instrumentation costs little more than reading the clock. Gauges such as
+cache sizes are not tracked at all, but read by collector functions when
+the metrics are scraped.
+
+The time spent in the phases of a request, i.e. model inference, DTW, Mongo
+and serialization, is recorded in the process wide `PHASES` histogram with
+:func phase:.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Iterable, List
+
+from pymongo import monitoring
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds in seconds of the latency histogram buckets.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+INFERENCE = 'inference'
+DTW = 'dtw'
+MONGO = 'mongo'
+SERIALIZATION = 'serialization'
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for v in labels.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(labels.keys(), escaped)) + '}'
+
+
+class Family:
+    """This class holds the samples of one metric, as rendered on a scrape."""
+
+    def __init__(self, name, kind, documentation):
+        """Initializes a new Family instance.
+
+        Parameters
+        ----------
+        name:
+            The name of the metric.
+        kind:
+            The Prometheus type of the metric, e.g. 'counter', 'gauge' or 'histogram'.
+        documentation:
+            The help text of the metric.
+        """
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        self.samples = []
+
+    def add(self, value, suffix='', **labels) -> 'Family':
+        """Adds a sample of the metric. Samples with a value of None are skipped."""
+        if value is not None:
+            self.samples.append((self.name + suffix, labels, value))
+        return self
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines += [f'{name}{_format_labels(labels)} {_format_value(value)}' for name, labels, value in self.samples]
+        return '\n'.join(lines)
+
+
+class Histogram:
+    """This class counts observations in cumulative buckets, separately for each combination of labels."""
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        """Initializes a new Histogram instance.
+
+        Parameters
+        ----------
+        labels:
+            The names of the labels whose values are passed to :meth observe:.
+        buckets:
+            The sorted upper bounds of the buckets. A bucket for +Inf is added.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = dict()
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        """Records an observation with the given label values, in the order of `labels`."""
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        """Observes the time in seconds spent in the with block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def collect(self) -> Family:
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+
+        family = Family(self.name, 'histogram', self.documentation)
+        for key, counts, total in sorted(series):
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                family.add(cumulative, '_bucket', **labels, le=_format_value(bound))
+            family.add(total, '_sum', **labels)
+            family.add(cumulative, '_count', **labels)
+        return family
+
+
+class Registry:
+    """This class renders the histograms and the families returned by the registered collectors."""
+
+    def __init__(self):
+        self._histograms = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        """Creates a histogram that is rendered with the registry."""
+        return self.add(Histogram(name, documentation, labels, buckets))
+
+    def add(self, histogram: Histogram) -> Histogram:
+        """Adds an existing histogram to the registry."""
+        with self._lock:
+            self._histograms.append(histogram)
+        return histogram
+
+    def register(self, collector: Callable[[], Iterable[Family]]) -> None:
+        """Registers a function returning families of samples, which is called on every scrape."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def collect(self) -> List[Family]:
+        with self._lock:
+            histograms, collectors = list(self._histograms), list(self._collectors)
+        return [h.collect() for h in histograms] + [family for collector in collectors for family in collector()]
+
+    def render(self) -> str:
+        """Returns all metrics in the Prometheus text exposition format."""
+        return '\n'.join(family.render() for family in self.collect()) + '\n'
+
+
+PHASES = Histogram('irl_phase_seconds', 'Time spent in the phases of request handling.', ['phase'])
+
+
+def phase(name):
+    """Returns a context manager recording the time spent in the with block as the given phase."""
+    return PHASES.time(name)
+
+
+def timed(name):
+    """Decorates a function, so that the time spent in it is recorded as the given phase."""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kw):
+            with PHASES.time(name):
+                return f(*args, **kw)
+        return wrapper
+    return decorator
+
+
+class MongoListener(monitoring.CommandListener):
+    """This class records the round trip time of every Mongo command as the Mongo phase.
+
+    Pass an instance in the `event_listeners` of the MongoClient.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        PHASES.observe(event.duration_micros / 1e6, MONGO)
+
+    def failed(self, event):
+        PHASES.observe(event.duration_micros / 1e6, MONGO)
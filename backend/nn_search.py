@@ -0,0 +1,177 @@
+"""
+This module provides a top-k nearest neighbour search over latent
+trajectories using dynamic time warping (DTW).
+
+Candidates are ranked by cheap lower bounds (LB_Kim and LB_Keogh) first, so the
+full DTW distance only has to be computed for candidates that can still enter
+the top-k result. The remaining DTW computations run in parallel batches.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+from dtaidistance.dtw_ndim import distance_matrix_fast
+
+
+# Number of candidates whose DTW distance is computed in one parallel batch.
+DTW_BATCH_SIZE = 64
+
+
+def _lengths(offsets: np.ndarray) -> np.ndarray:
+    return np.diff(offsets)
+
+
+def lb_kim(query: np.ndarray, frames: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Computes the LB_Kim lower bound of the DTW distance between the query and each candidate.
+
+    Every warping path contains the pair of first and the pair of last points, so the
+    distance of these pairs bounds the DTW distance from below.
+
+    Parameters
+    ----------
+    query:
+        An array of shape [n, ndim].
+    frames:
+        The concatenated candidate sequences of shape [N, ndim].
+    offsets:
+        An array of length n_candidates + 1 holding the first frame of each candidate.
+
+    Returns
+    -------
+    An array with one lower bound per candidate.
+    """
+    first = np.sum((frames[offsets[:-1]] - query[0]) ** 2, axis=1)
+    last = np.sum((frames[offsets[1:] - 1] - query[-1]) ** 2, axis=1)
+
+    # The first and last pair coincide if both sequences only have one point
+    single = (_lengths(offsets) == 1) & (len(query) == 1)
+    return np.sqrt(np.where(single, first, first + last))
+
+
+def query_envelope(query: np.ndarray, length: int, window: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Computes the lower and upper envelope of the query for candidates of the given length.
+
+    The envelope at position `j` is the minimum and maximum of all query points the
+    j-th candidate point can be aligned to within the Sakoe-Chiba band used by
+    `dtaidistance`.
+
+    Returns
+    -------
+    A tuple (lower, upper) of arrays of shape [length, ndim].
+    """
+    n, m = len(query), length
+
+    if not window or window >= max(n, m):
+        lower = np.broadcast_to(query.min(axis=0), (m, query.shape[1]))
+        upper = np.broadcast_to(query.max(axis=0), (m, query.shape[1]))
+        return lower, upper
+
+    # Query rows i that can be aligned to column j: j - before <= i <= j + after
+    before = max(0, m - n) + window - 1
+    after = max(0, n - m) + window - 1
+    pad_right = max(0, m - 1 + after - (n - 1))
+    width = before + after + 1
+
+    padding = [(before, pad_right), (0, 0)]
+    lower_src = np.pad(query, padding, constant_values=np.inf)
+    upper_src = np.pad(query, padding, constant_values=-np.inf)
+
+    lower = np.lib.stride_tricks.sliding_window_view(lower_src, width, axis=0)[:m].min(axis=2)
+    upper = np.lib.stride_tricks.sliding_window_view(upper_src, width, axis=0)[:m].max(axis=2)
+    return lower, upper
+
+
+def lb_keogh(query: np.ndarray, frames: np.ndarray, offsets: np.ndarray, window: Optional[int] = None) -> np.ndarray:
+    """Computes the LB_Keogh lower bound of the DTW distance between the query and each candidate.
+
+    Every candidate point is aligned to at least one query point within its band, so its
+    distance to the query envelope of that band bounds its contribution from below.
+    Envelopes are computed once per distinct candidate length.
+
+    Parameters
+    ----------
+    See :func lb_kim:. `window` is the Sakoe-Chiba window passed to the DTW computation.
+
+    Returns
+    -------
+    An array with one lower bound per candidate.
+    """
+    lengths = _lengths(offsets)
+    unique_lengths, length_ids = np.unique(lengths, return_inverse=True)
+
+    lower = np.full((len(unique_lengths), unique_lengths[-1], query.shape[1]), np.nan)
+    upper = np.full_like(lower, np.nan)
+    for i, length in enumerate(unique_lengths):
+        lower[i, :length], upper[i, :length] = query_envelope(query, length, window)
+
+    # Position of each frame within its candidate and the envelope it is compared to
+    frame_env = np.repeat(length_ids, lengths)
+    frame_pos = np.arange(len(frames)) - np.repeat(offsets[:-1], lengths)
+
+    below = lower[frame_env, frame_pos] - frames
+    above = frames - upper[frame_env, frame_pos]
+    excess = np.maximum(np.maximum(below, above), 0.0)
+
+    return np.sqrt(np.add.reduceat(np.sum(excess ** 2, axis=1), offsets[:-1]))
+
+
+def top_k(query: np.ndarray, frames: np.ndarray, offsets: np.ndarray,
+          k: Optional[int] = None, window: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Finds the k candidates with the smallest DTW distance to the query.
+
+    Parameters
+    ----------
+    query:
+        An array of shape [n, ndim].
+    frames:
+        The concatenated candidate sequences of shape [N, ndim], e.g. a slice of the
+        cached latents of a :class TrialStore:.
+    offsets:
+        An array of length n_candidates + 1 holding the first frame of each candidate.
+    k:
+        The number of neighbours to return. All candidates are ranked if None.
+    window:
+        The Sakoe-Chiba window of the DTW computation.
+
+    Returns
+    -------
+    A tuple (indices, distances) of the nearest candidates, sorted by distance.
+    """
+    query = np.ascontiguousarray(query, dtype=np.double)
+    frames = np.ascontiguousarray(frames, dtype=np.double)
+    n_candidates = len(offsets) - 1
+
+    if n_candidates == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    k = n_candidates if k is None else min(k, n_candidates)
+    bounds = np.maximum(lb_kim(query, frames, offsets), lb_keogh(query, frames, offsets, window))
+    order = np.argsort(bounds, kind='stable')
+
+    indices = np.empty(0, dtype=np.int64)
+    distances = np.empty(0)
+    threshold = np.inf
+    batch_size = max(k, DTW_BATCH_SIZE)
+
+    for start in range(0, n_candidates, batch_size):
+        batch = order[start:start + batch_size]
+
+        # Candidates are sorted by their lower bound, none of the remaining ones can improve
+        if bounds[batch[0]] > threshold:
+            break
+
+        batch = batch[bounds[batch] <= threshold]
+        series = [query] + [frames[offsets[i]:offsets[i + 1]] for i in batch]
+        batch_dist = np.asarray(distance_matrix_fast(
+            series, window=window, max_dist=None if np.isinf(threshold) else threshold,
+            block=((0, 1), (1, len(series))), compact=True, parallel=True))
+
+        indices = np.concatenate([indices, batch])
+        distances = np.concatenate([distances, batch_dist])
+
+        best = np.argsort(distances, kind='stable')[:k]
+        indices, distances = indices[best], distances[best]
+
+        if len(distances) == k:
+            threshold = distances[-1]
+
+    return indices, distances
@@ -0,0 +1,182 @@
+"""
+This module contains geometric operations on polylines in the latent
+space, such as hover paths and interpolation strips.
+"""
+import numpy as np
+
+
+def resample_polyline(points: np.ndarray, num: int) -> np.ndarray:
+    """Resamples a polyline to `num` points spaced evenly along its arc length.
+
+    Parameters
+    ----------
+    points:
+        An array of shape [n_points, n_dims] with the vertices of the polyline.
+    num:
+        The number of points of the resampled polyline.
+
+    Returns
+    -------
+    An array of shape [num, n_dims]. The first and last point coincide with the
+    ones of the polyline if num > 1.
+    """
+    points = np.asarray(points, dtype=np.double)
+    if len(points) == 0 or num < 1:
+        return points[:0]
+
+    arc = np.concatenate([[0.0], np.cumsum(np.linalg.norm(np.diff(points, axis=0), axis=1))])
+    if arc[-1] == 0:
+        return np.repeat(points[:1], num, axis=0)
+
+    targets = np.linspace(0.0, arc[-1], num)
+    return np.stack([np.interp(targets, arc, points[:, dim]) for dim in range(points.shape[1])], axis=1)
+
+
+def _ranges(starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+    """Concatenates the index ranges [start, stop) of several intervals."""
+    lengths = stops - starts
+    return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+
+def simplify(points: np.ndarray, tolerance: float, offsets=None) -> np.ndarray:
+    """Simplifies polylines with the Ramer-Douglas-Peucker algorithm.
+
+    The segments of all polylines are split level by level, so that every level is one
+    vectorized pass over the remaining vertices.
+
+    Parameters
+    ----------
+    points:
+        An array of shape [n_points, 2] with the vertices of all polylines.
+    tolerance:
+        The maximum distance of a removed vertex from the simplified polyline.
+    offsets:
+        An array of length n_polylines + 1 holding the first vertex of each polyline. The
+        points form a single polyline if None.
+
+    Returns
+    -------
+    The sorted indices of the kept vertices, always including the first and the last one
+    of each polyline.
+    """
+    points = np.asarray(points, dtype=np.double).reshape(-1, 2)
+    offsets = np.asarray([0, len(points)] if offsets is None else offsets, dtype=np.intp)
+    offsets = offsets[np.concatenate([[True], np.diff(offsets) > 0])]
+    if tolerance <= 0:
+        return np.arange(len(points))
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[offsets[:-1]] = keep[offsets[1:] - 1] = True
+    starts, ends = offsets[:-1], offsets[1:] - 1
+
+    while True:
+        inner = ends - starts > 1
+        starts, ends = starts[inner], ends[inner]
+        if len(starts) == 0:
+            break
+
+        # Distances of the inner vertices of each segment to the line between its ends
+        lengths = ends - starts - 1
+        segment = np.repeat(np.arange(len(starts)), lengths)
+        index = _ranges(starts + 1, ends)
+        a = points[starts][segment]
+        ab = points[ends][segment] - a
+        rel = points[index] - a
+        norm = np.einsum('ij,ij->i', ab, ab)
+        t = np.clip(np.einsum('ij,ij->i', rel, ab) / np.where(norm > 0, norm, 1), 0, 1)
+        dist = np.linalg.norm(rel - t[:, None] * ab, axis=1)
+
+        # The farthest vertex of each segment, the first one on ties
+        first = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        farthest = np.maximum.reduceat(dist, first)
+        candidates = np.flatnonzero(dist == farthest[segment])
+        _, pick = np.unique(segment[candidates], return_index=True)
+        mid = index[candidates[pick]]
+
+        split = farthest > tolerance
+        keep[mid[split]] = True
+        starts, ends = np.concatenate([starts[split], mid[split]]), np.concatenate([mid[split], ends[split]])
+
+    return np.flatnonzero(keep)
+
+
+def visible(points: np.ndarray, xrange, yrange, offsets=None) -> np.ndarray:
+    """Returns a mask of the vertices of polylines that are drawn within a viewport.
+
+    A vertex is drawn if it lies inside the viewport or is connected to a vertex inside
+    of it, so that the segments entering and leaving the viewport are kept.
+
+    Parameters
+    ----------
+    offsets:
+        An array of length n_polylines + 1 holding the first vertex of each polyline. The
+        points form a single polyline if None.
+    """
+    points = np.asarray(points).reshape(-1, 2)
+    inside = ((points[:, 0] >= min(xrange)) & (points[:, 0] <= max(xrange)) &
+              (points[:, 1] >= min(yrange)) & (points[:, 1] <= max(yrange)))
+
+    # Vertices are only connected to the neighbours within the same polyline
+    connected = np.ones(max(len(points) - 1, 0), dtype=bool)
+    if offsets is not None:
+        boundaries = np.asarray(offsets[1:-1], dtype=np.intp)
+        connected[boundaries[(boundaries > 0) & (boundaries < len(points))] - 1] = False
+
+    mask = inside.copy()
+    mask[1:] |= inside[:-1] & connected
+    mask[:-1] |= inside[1:] & connected
+    return mask
+
+
+def decimate(points: np.ndarray, xrange, yrange, size, tolerance=1.0, offsets=None, return_parts=False):
+    """Selects the vertices of polylines needed to draw them within a viewport.
+
+    The polylines are clipped to the viewport and every visible part is simplified in pixel
+    coordinates, so that the number of vertices depends on the screen resolution instead
+    of the sampling rate. The first vertex of every polyline is always kept. All vertices
+    are kept if the viewport has no area.
+
+    Parameters
+    ----------
+    xrange, yrange:
+        The ranges of the viewport.
+    size:
+        The width and height of the viewport in pixels.
+    tolerance:
+        The maximum distance in pixels of a removed vertex from the drawn polyline.
+    offsets:
+        An array of length n_polylines + 1 holding the first vertex of each polyline. The
+        points form a single polyline if None.
+    return_parts:
+        Also return the parts of the kept vertices that are drawn as connected lines.
+
+    Returns
+    -------
+    The sorted indices of the kept vertices and, with `return_parts`, an array holding the
+    first kept vertex of each part, followed by the number of kept vertices. The parts are
+    split at the polyline boundaries and wherever a polyline leaves the viewport.
+    """
+    points = np.asarray(points, dtype=np.double).reshape(-1, 2)
+    offsets = np.asarray([0, len(points)] if offsets is None else offsets, dtype=np.intp)
+    extent = np.array([abs(xrange[1] - xrange[0]), abs(yrange[1] - yrange[0])], dtype=np.double)
+    if len(points) == 0 or not extent.all():
+        kept = np.arange(len(points))
+        return (kept, np.unique(np.clip(offsets, 0, len(points)))) if return_parts else kept
+
+    pixels = (points - [min(xrange), min(yrange)]) * (np.asarray(size, dtype=np.double) / extent)
+
+    # The visible parts are the runs of drawn vertices, split at the polyline boundaries
+    mask = visible(points, xrange, yrange, offsets)
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    runs = np.union1d(np.flatnonzero(edges), offsets[(offsets > 0) & (offsets < len(points))])
+    runs = np.concatenate([[0], runs, [len(points)]])
+
+    runs = np.unique(runs)
+
+    kept = simplify(pixels, tolerance, runs)
+    kept = np.union1d(kept[mask[kept]], offsets[:-1][np.diff(offsets) > 0])
+    if not return_parts:
+        return kept
+
+    # A part starts at the first kept vertex of every run
+    return kept, np.unique(np.searchsorted(kept, runs))
@@ -0,0 +1,101 @@
+"""
+This module converts models to the inference precision of a configuration
+and measures the accuracy lost by the conversion.
+
+Models are trained in float64. Inference can run in float64, in float32 or
+with the weights of all Linear layers dynamically quantized to int8, which
+trades a small reconstruction error for a multiple of the CPU throughput.
+"""
+import copy
+import time
+
+import numpy as np
+import torch
+
+
+FLOAT64 = 'float64'
+FLOAT32 = 'float32'
+INT8 = 'int8'
+
+PRECISIONS = (FLOAT64, FLOAT32, INT8)
+
+DEFAULT_PRECISION = FLOAT32
+
+# Maximum number of dataset rows the accuracy report is computed on.
+REPORT_SAMPLE_SIZE = 8192
+
+
+def convert(model: torch.nn.Module, precision: str) -> torch.nn.Module:
+    """Returns a copy of the model converted to the given precision, in eval mode."""
+    if precision not in PRECISIONS:
+        raise ValueError(f'Unknown precision: {precision}')
+
+    model = copy.deepcopy(model).eval()
+    if precision == FLOAT64:
+        return model.double()
+    if precision == FLOAT32:
+        return model.float()
+    return torch.quantization.quantize_dynamic(model.float(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def input_dtype(model: torch.nn.Module) -> torch.dtype:
+    """Returns the dtype of the tensors passed to the model.
+
+    Dynamically quantized models have no floating point parameters and take float32 inputs.
+    """
+    param = next(model.parameters(), None)
+    if param is None or not param.is_floating_point():
+        return torch.float32
+    return param.dtype
+
+
+def _encode_decode(model, values: np.ndarray):
+    with torch.no_grad():
+        mean, _ = model.encode(torch.from_numpy(values).to(input_dtype(model)))
+        rec = model.decode(mean)
+    return mean.double().numpy(), rec.double().numpy()
+
+
+def accuracy_report(reference: torch.nn.Module, values: np.ndarray, precisions=PRECISIONS,
+                    sample_size=REPORT_SAMPLE_SIZE, seed=0) -> dict:
+    """Compares the latent codes and reconstructions of the converted models against a reference.
+
+    Parameters
+    ----------
+    reference:
+        The float64 model.
+    values:
+        The dataset of the configuration with one pose per row.
+    sample_size:
+        The number of randomly selected rows the models are compared on.
+
+    Returns
+    -------
+    A dictionary with the maximum and mean absolute latent and reconstruction error and the
+    encode and decode throughput in rows per second of every precision.
+    """
+    reference = convert(reference, FLOAT64)
+    values = np.asarray(values, dtype=np.double)
+    if len(values) > sample_size:
+        values = values[np.sort(np.random.default_rng(seed).choice(len(values), sample_size, replace=False))]
+
+    ref_latent, ref_rec = _encode_decode(reference, values)
+
+    report = {'samples': len(values), 'precisions': dict()}
+    for precision in precisions:
+        model = convert(reference, precision)
+
+        start = time.perf_counter()
+        latent, rec = _encode_decode(model, values)
+        elapsed = time.perf_counter() - start
+
+        latent_error, rec_error = np.abs(latent - ref_latent), np.abs(rec - ref_rec)
+        report['precisions'][precision] = {
+            'latent_max_error': float(latent_error.max(initial=0)),
+            'latent_mean_error': float(latent_error.mean()) if latent_error.size else 0.0,
+            'reconstruction_max_error': float(rec_error.max(initial=0)),
+            'reconstruction_mean_error': float(rec_error.mean()) if rec_error.size else 0.0,
+            'rows_per_second': len(values) / elapsed if elapsed > 0 else None,
+        }
+
+    return report
@@ -0,0 +1,111 @@
+"""
+This module profiles single requests with a sampling profiler.
+
+A Sampler runs a background thread that periodically records the call stack
+of the thread handling the request. The samples are aggregated into collapsed
+stacks, one line `outer;inner;innermost count` per distinct stack, which is
+the input format of flamegraph.pl, speedscope and inferno.
+
+The stacks of other threads, e.g. the forward passes run by the
+InferenceBatcher, are not sampled. Time the request spends waiting for them
+shows up in the frame waiting for the result.
+"""
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from uuid import uuid4
+
+
+# Request header and query parameter asking for a profile of the request.
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PARAM = 'profile'
+
+# Response header holding the identifier of the stored profile.
+PROFILE_ID_HEADER = 'X-Profile-Id'
+
+# Default time in seconds between two samples. The interpreter switches threads only
+# every `sys.getswitchinterval()` seconds while the request thread holds the GIL, so
+# the effective interval can be longer.
+DEFAULT_INTERVAL = 0.001
+
+PROFILE_SUFFIX = '.collapsed'
+
+
+def _label(code) -> str:
+    return f'{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})'
+
+
+class Sampler:
+    """This class samples the call stack of one thread until it is stopped."""
+
+    def __init__(self, thread_id=None, interval=DEFAULT_INTERVAL):
+        """Initializes a new Sampler instance.
+
+        Parameters
+        ----------
+        thread_id:
+            The identifier of the sampled thread. Defaults to the calling thread.
+        interval:
+            The time in seconds between two samples.
+        """
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self.duration = 0.0
+        self._stopped = threading.Event()
+        self._thread = None
+        self._started = None
+
+    def start(self) -> 'Sampler':
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        """Stops sampling and returns the number of samples of every collapsed stack."""
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+            self.duration = time.perf_counter() - self._started
+        return self.stacks
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+
+def collapsed(stacks: Counter) -> str:
+    """Formats stack counts as collapsed stacks, one `stack count` line each."""
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+
+def save(stacks: Counter, directory) -> str:
+    """Writes collapsed stacks into a new file of the directory.
+
+    Returns
+    -------
+    The identifier of the profile, see :func path:.
+    """
+    profile_id = uuid4().hex
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / (profile_id + PROFILE_SUFFIX)).write_text(collapsed(stacks))
+    return profile_id
+
+
+def path(directory, profile_id):
+    """Returns the file of a stored profile, or None if the identifier is invalid or unknown."""
+    if len(profile_id) != 32 or any(c not in '0123456789abcdef' for c in profile_id):
+        return None
+    file = Path(directory, profile_id + PROFILE_SUFFIX)
+    return file if file.is_file() else None
@@ -0,0 +1,169 @@
+"""
+This module keeps the models and datasets of several configurations
+resident in memory.
+"""
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+import torch
+import numpy as np
+
+import metrics
+from precision import input_dtype
+from trial_store import TrialStore
+
+
+# Number of frames passed through the encoder at once when building the latent cache.
+ENCODE_CHUNK_SIZE = 8192
+
+
+class ConfigState:
+    """This class holds the model, the dataset and all derived data of one configuration."""
+
+    def __init__(self, name, model, dataset):
+        """Initializes a new ConfigState instance and encodes the dataset.
+
+        Parameters
+        ----------
+        name:
+            The name of the configuration.
+        model:
+            The pytorch model of the configuration, already in eval mode.
+        dataset:
+            A dataframe containing one pose per row.
+        """
+        self.name = name
+        self.model = model
+        self.dataset = dataset
+
+        self.latent_mean, self.latent_logvar = self._encode_dataset()
+        self.trials = TrialStore.from_dataframe(dataset)
+        self.trial_latents = self.trials.take(self.latent_mean)
+        self.pose_extent = np.ptp(self.trials.frames.reshape(len(dataset), -1, 3), axis=1).max(axis=0)
+        self.nbytes = self._memory_usage()
+
+        # The decoded lattice used for interpolated decoding, set by the controller
+        self.lattice = None
+
+    def _encode_dataset(self):
+        """Encodes every frame of the dataset into the latent space.
+
+        The frames are passed through the encoder in chunks of `ENCODE_CHUNK_SIZE` to
+        bound the memory used by intermediate activations.
+
+        Returns
+        -------
+        A tuple of contiguous arrays (mean, logvar) with one row per row of the dataset.
+        """
+        values = self.dataset.values
+        mean = np.empty((values.shape[0], self.model.z_dim), dtype=np.double)
+        logvar = np.empty_like(mean)
+
+        with torch.no_grad(), metrics.phase(metrics.INFERENCE):
+            for start in range(0, values.shape[0], ENCODE_CHUNK_SIZE):
+                end = start + ENCODE_CHUNK_SIZE
+                tensor = torch.from_numpy(np.ascontiguousarray(values[start:end])).to(input_dtype(self.model))
+                chunk_mean, chunk_logvar = self.model.encode(tensor)
+                mean[start:end] = chunk_mean.numpy()
+                logvar[start:end] = chunk_logvar.numpy()
+
+        return mean, logvar
+
+    def _memory_usage(self) -> int:
+        """Returns the approximate number of bytes used by the configuration."""
+        arrays = [self.latent_mean, self.latent_logvar, self.trial_latents,
+                  self.trials.frames, self.trials.rows, self.trials.offsets]
+        params = sum(p.numel() * p.element_size() for p in self.model.parameters())
+        return int(self.dataset.memory_usage(index=True, deep=False).sum()) + sum(a.nbytes for a in arrays) + params
+
+
+class ConfigRegistry:
+    """This class keeps several configurations resident up to a memory budget.
+
+    Configurations are loaded on first access. When the resident configurations exceed
+    the memory budget, the least recently used ones are evicted. The most recently
+    used configuration is never evicted, even if it exceeds the budget on its own.
+    Data derived from a configuration outside of its ConfigState, e.g. cached results,
+    is released by the `on_evict` callback.
+    """
+
+    def __init__(self, loader: Callable[[str], ConfigState], memory_budget: int,
+                 on_evict: Optional[Callable[[str], None]] = None):
+        """Initializes a new ConfigRegistry instance.
+
+        Parameters
+        ----------
+        loader:
+            A function loading the configuration with the given name.
+        memory_budget:
+            The maximum number of bytes used by all resident configurations.
+        on_evict:
+            Called with the name of every evicted configuration.
+        """
+        self.loader = loader
+        self.memory_budget = memory_budget
+        self.on_evict = on_evict
+        self._resident = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = dict()
+
+    def get(self, name) -> ConfigState:
+        """Returns the configuration with the given name and loads it if necessary."""
+        with self._lock:
+            if name in self._resident:
+                self._resident.move_to_end(name)
+                return self._resident[name]
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # Concurrent requests for the same configuration wait for a single load
+        with load_lock:
+            with self._lock:
+                if name in self._resident:
+                    self._resident.move_to_end(name)
+                    return self._resident[name]
+
+            state = self.loader(name)
+
+            with self._lock:
+                self._resident[name] = state
+                evicted = self._evict()
+                self._load_locks.pop(name, None)
+
+        for evicted_name in evicted:
+            self._released(evicted_name)
+        return state
+
+    def evict(self, name) -> None:
+        """Removes the configuration with the given name from memory."""
+        with self._lock:
+            self._resident.pop(name, None)
+        self._released(name)
+
+    def resident(self):
+        """Returns the names of all resident configurations, least recently used first."""
+        with self._lock:
+            return list(self._resident.keys())
+
+    def memory_usage(self) -> int:
+        """Returns the estimated number of bytes used by all resident configurations."""
+        with self._lock:
+            return sum(state.nbytes for state in self._resident.values())
+
+    def __contains__(self, name):
+        with self._lock:
+            return name in self._resident
+
+    def _released(self, name):
+        if self.on_evict is not None:
+            self.on_evict(name)
+
+    def _evict(self) -> List[str]:
+        """Evicts the least recently used configurations exceeding the budget and returns their names."""
+        evicted = []
+        total = sum(state.nbytes for state in self._resident.values())
+        while total > self.memory_budget and len(self._resident) > 1:
+            name, state = self._resident.popitem(last=False)
+            total -= state.nbytes
+            evicted.append(name)
+        return evicted
@@ -0,0 +1,130 @@
+"""
+This module provides a compact binary encoding for frame and
+trajectory payloads.
+
+A payload consists of
+
+    MAGIC (4 bytes) | header length (uint32, little endian) | header | buffers
+
+The header is a utf-8 encoded json object with the entries `meta`, holding
+the payload specific metadata, and `arrays`, describing each buffer by
+name, dtype, shape and byte offset relative to the start of the buffers.
+The header is padded with spaces and every buffer with zeros to a multiple of
+`ALIGNMENT` bytes, so that clients can create typed array views without copying.
+"""
+import json
+import struct
+from typing import Dict, List
+
+import numpy as np
+
+import metrics
+
+
+FRAMES_MIMETYPE = 'application/vnd.gesturemap.frames'
+
+MAGIC = b'GMAP'
+
+ALIGNMENT = 8
+
+# Wire dtypes used for the different kinds of arrays.
+FLOAT_DTYPE = np.dtype('<f4')
+INDEX_DTYPE = np.dtype('<i4')
+
+
+def _padding(length: int) -> int:
+    return -length % ALIGNMENT
+
+
+@metrics.timed(metrics.SERIALIZATION)
+def dumps_binary(arrays: Dict[str, np.ndarray], meta: dict = None) -> bytes:
+    """Serializes the given arrays into a binary payload.
+
+    The array buffers are written as they are, so the arrays should already have
+    one of the wire dtypes.
+
+    Parameters
+    ----------
+    arrays:
+        A mapping from array names to numpy arrays.
+    meta:
+        Json serializable metadata describing the payload.
+
+    Returns
+    -------
+    The binary payload.
+    """
+    arrays = {name: np.ascontiguousarray(arr) for name, arr in arrays.items()}
+
+    descriptions = []
+    offset = 0
+    for name, arr in arrays.items():
+        descriptions.append(dict(name=name, dtype=arr.dtype.str, shape=list(arr.shape), offset=offset, nbytes=arr.nbytes))
+        offset += arr.nbytes + _padding(arr.nbytes)
+
+    header = json.dumps({'meta': meta or {}, 'arrays': descriptions}).encode('utf-8')
+    header += b' ' * _padding(len(MAGIC) + 4 + len(header))
+
+    chunks = [MAGIC, struct.pack('<I', len(header)), header]
+    for arr in arrays.values():
+        chunks.append(arr.reshape(-1).view(np.uint8))
+        chunks.append(b'\0' * _padding(arr.nbytes))
+
+    return b''.join(chunks)
+
+
+def loads_binary(payload: bytes):
+    """Deserializes a binary payload created by :func dumps_binary:.
+
+    Returns
+    -------
+    A tuple (arrays, meta) where arrays maps the array names to read-only numpy arrays.
+    """
+    if payload[:len(MAGIC)] != MAGIC:
+        raise ValueError('Not a binary frame payload')
+
+    header_length, = struct.unpack_from('<I', payload, len(MAGIC))
+    start = len(MAGIC) + 4 + header_length
+    header = json.loads(payload[len(MAGIC) + 4:start].decode('utf-8'))
+
+    arrays = {}
+    for desc in header['arrays']:
+        dtype = np.dtype(desc['dtype'])
+        count = desc['nbytes'] // dtype.itemsize
+        arrays[desc['name']] = np.frombuffer(payload, dtype=dtype, count=count, offset=start + desc['offset']).reshape(desc['shape'])
+
+    return arrays, header['meta']
+
+
+def dumps_frames(frames: np.ndarray, meta: dict = None) -> bytes:
+    """Serializes a sequence of poses into a binary payload.
+
+    Parameters
+    ----------
+    frames:
+        An array of shape [n_frames, n_features] or [n_frames, n_joints, 3].
+    meta:
+        Json serializable metadata, e.g. the referent of the frames.
+    """
+    frames = np.asarray(frames)
+    if frames.ndim == 2:
+        frames = frames.reshape(frames.shape[0], frames.shape[1] // 3, 3)
+    frames = frames.astype(FLOAT_DTYPE, copy=False)
+    return dumps_binary({'frames': frames}, meta)
+
+
+def frame_records(frames: np.ndarray) -> List[dict]:
+    """Converts a sequence of poses into the json records of the default payload format.
+
+    Parameters
+    ----------
+    frames:
+        An array of shape [n_frames, n_features] or [n_frames, n_joints, 3].
+
+    Returns
+    -------
+    A list with one dictionary per frame holding the x, y and z coordinates of all joints.
+    """
+    frames = np.asarray(frames)
+    coords = frames.reshape(frames.shape[0], -1, 3).transpose(0, 2, 1).tolist()
+    return [{'x': x, 'y': y, 'z': z} for x, y, z in coords]
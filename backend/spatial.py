@@ -0,0 +1,124 @@
+"""
+This module indexes latent frames for spatial queries.
+
+A FrameIndex holds a KD-tree over the latent coordinates of a contiguous
+range of frames in store order, e.g. all frames of one referent, and answers
+nearest neighbour, radius and polygon queries with the store positions of
+the matching frames.
+"""
+from typing import List, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+# Number of points in the leaves of the KD-tree.
+LEAF_SIZE = 32
+
+
+def contains(polygon: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """Returns a boolean mask of the points inside a polygon, using the even-odd rule.
+
+    Parameters
+    ----------
+    polygon:
+        An array of shape [n_vertices, 2]. The polygon is closed implicitly.
+    points:
+        An array of shape [n_points, 2].
+    """
+    polygon = np.asarray(polygon, dtype=np.double).reshape(-1, 2)
+    points = np.asarray(points, dtype=np.double).reshape(-1, 2)
+    x, y = points[:, 0], points[:, 1]
+
+    inside = np.zeros(len(points), dtype=bool)
+    for (x0, y0), (x1, y1) in zip(polygon, np.roll(polygon, -1, axis=0)):
+        # Toggle the points whose horizontal ray to the right crosses the edge
+        crosses = (y0 > y) != (y1 > y)
+        if y1 != y0:
+            crosses &= x < x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+        inside ^= crosses
+
+    return inside
+
+
+class FrameIndex:
+    """This class holds a KD-tree over the latent coordinates of a range of frames."""
+
+    def __init__(self, points: np.ndarray, start=0):
+        """Initializes a new FrameIndex instance.
+
+        Parameters
+        ----------
+        points:
+            An array of shape [n_frames, 2] with the latent coordinates of the frames.
+        start:
+            The store position of the first frame, which is added to all returned positions.
+        """
+        self.points = np.ascontiguousarray(points, dtype=np.double).reshape(-1, 2)
+        self.start = start
+        self.tree = cKDTree(self.points, leafsize=LEAF_SIZE) if len(self.points) else None
+
+    def __len__(self):
+        return len(self.points)
+
+    def nearest(self, point, k=1) -> Tuple[np.ndarray, np.ndarray]:
+        """Finds the k frames closest to a latent point.
+
+        Returns
+        -------
+        A tuple (positions, distances) of the store positions of the frames and their
+        euclidean distances to the point, sorted by distance.
+        """
+        k = min(k, len(self))
+        if k < 1:
+            return np.arange(0), np.zeros(0)
+
+        distances, indices = self.tree.query(np.asarray(point, dtype=np.double), k=k)
+        return np.atleast_1d(indices) + self.start, np.atleast_1d(distances)
+
+    def within_radius(self, point, radius: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Finds the frames within a euclidean distance of a latent point.
+
+        Returns
+        -------
+        A tuple (positions, distances) of the store positions of the frames and their
+        distances to the point, sorted by distance.
+        """
+        if len(self) == 0:
+            return np.arange(0), np.zeros(0)
+
+        point = np.asarray(point, dtype=np.double)
+        indices = np.asarray(self.tree.query_ball_point(point, radius), dtype=np.intp)
+        distances = np.linalg.norm(self.points[indices] - point, axis=1)
+        order = np.argsort(distances, kind='stable')
+        return indices[order] + self.start, distances[order]
+
+    def within_polygon(self, polygon) -> np.ndarray:
+        """Finds the frames inside a polygon, e.g. a lasso selection.
+
+        The candidates are the frames within the square around the bounding box of the
+        polygon, which are then tested with :func contains:.
+
+        Returns
+        -------
+        The sorted store positions of the frames.
+        """
+        polygon = np.asarray(polygon, dtype=np.double).reshape(-1, 2)
+        if len(self) == 0 or len(polygon) < 3:
+            return np.arange(0)
+
+        lo, hi = polygon.min(axis=0), polygon.max(axis=0)
+        candidates = np.sort(np.asarray(self.tree.query_ball_point((lo + hi) / 2, (hi - lo).max() / 2, p=np.inf),
+                                        dtype=np.intp))
+        return candidates[contains(polygon, self.points[candidates])] + self.start
+
+
+def merge(results: List[Tuple[np.ndarray, np.ndarray]], k=None) -> Tuple[np.ndarray, np.ndarray]:
+    """Merges the (positions, distances) results of several indexes, sorted by distance.
+
+    Only the k closest frames are kept if k is given.
+    """
+    positions = np.concatenate([p for p, _ in results] or [np.arange(0)])
+    distances = np.concatenate([d for _, d in results] or [np.zeros(0)])
+    order = np.argsort(distances, kind='stable')[:k]
+    return positions[order], distances[order]
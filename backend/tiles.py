@@ -0,0 +1,56 @@
+"""
+This module defines the quantized tiling of the latent space used to
+cache the skeleton grid.
+
+The latent space is divided into square cells whose size is a power of two.
+The exponent is the zoom level of an axis. Cells are grouped into tiles of
+`TILE_SIZE` x `TILE_SIZE` cells, so that a viewport is covered by a few tiles
+that are shared between all viewports with the same zoom level.
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+
+# Number of grid cells along each axis of a tile.
+TILE_SIZE = 4
+
+
+def zoom_level(extent: float, num: int) -> int:
+    """Returns the zoom level whose cell size is closest to showing `num` cells over `extent`."""
+    return int(np.round(np.log2(extent / num)))
+
+
+def cell_size(zoom: int) -> float:
+    return 2.0 ** zoom
+
+
+def visible_cells(value_range, zoom: int) -> range:
+    """Returns the indices of all cells intersecting the given range along one axis."""
+    lo, hi = min(value_range), max(value_range)
+    size = cell_size(zoom)
+    return range(int(np.floor(lo / size)), int(np.ceil(hi / size)))
+
+
+def visible_tiles(cells: range) -> range:
+    """Returns the indices of all tiles containing the given cells along one axis."""
+    return range(cells.start // TILE_SIZE, (cells.stop - 1) // TILE_SIZE + 1)
+
+
+def tile_cells(tile: int) -> range:
+    """Returns the indices of the cells of a tile along one axis."""
+    return range(tile * TILE_SIZE, (tile + 1) * TILE_SIZE)
+
+
+def cell_centers(tile_x: int, tile_y: int, zoom_x: int, zoom_y: int) -> Tuple[List[Tuple[int, int]], np.ndarray]:
+    """Computes the latent coordinates of the cell centers of a tile.
+
+    Returns
+    -------
+    A tuple (cells, centers) where cells is a list of (cell_x, cell_y) indices and
+    centers is an array of shape [TILE_SIZE * TILE_SIZE, 2] with the matching centers.
+    """
+    cells = [(cx, cy) for cy in tile_cells(tile_y) for cx in tile_cells(tile_x)]
+    indices = np.array(cells, dtype=np.double)
+    centers = (indices + 0.5) * np.array([cell_size(zoom_x), cell_size(zoom_y)])
+    return cells, centers
@@ -0,0 +1,139 @@
+"""
+This module provides a ragged storage of the trials contained in
+a gesture dataset.
+"""
+from typing import List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+
+TRIAL_LEVELS = ['GestureType', 'ParticipantID', 'TrialID']
+
+
+class TrialStore:
+    """This class stores the frames of all trials of a dataset in one contiguous array.
+
+    Frames are ordered by referent, participant and trial, so that the frames of a
+    trial and the trials of a referent each occupy a contiguous range. The frames
+    of trial `t` are `frames[offsets[t]:offsets[t + 1]]` and the trials of referent
+    `r` are `referent_offsets[r]` up to `referent_offsets[r + 1]`.
+    """
+
+    def __init__(self, frames, offsets, rows, referent_codes, participant_codes, trial_codes,
+                 referents, participants, trials):
+        """Initializes a new TrialStore instance.
+
+        Use :meth from_dataframe: to build a store from a dataset.
+
+        Parameters
+        ----------
+        frames:
+            A contiguous array with one frame per row, grouped by trial.
+        offsets:
+            An array of length n_trials + 1 holding the first frame of each trial.
+        rows:
+            The row position within the original dataset of each frame in `frames`.
+        referent_codes, participant_codes, trial_codes:
+            The categorical codes of the referent, participant and trial of each trial.
+        referents, participants, trials:
+            The categories the codes refer to.
+        """
+        self.frames = frames
+        self.offsets = offsets
+        self.rows = rows
+        self.referent_codes = referent_codes
+        self.participant_codes = participant_codes
+        self.trial_codes = trial_codes
+        self.referents = referents
+        self.participants = participants
+        self.trials = trials
+
+        self.referent_offsets = np.searchsorted(referent_codes, np.arange(len(referents) + 1))
+        self._referent_lookup = {r: i for i, r in enumerate(referents.tolist())}
+        self._trial_lookup = {key: t for t, key in enumerate(zip(
+            referents[referent_codes].tolist(),
+            participants[participant_codes].tolist(),
+            trials[trial_codes].tolist()))}
+
+    @staticmethod
+    def from_dataframe(dataframe: pd.DataFrame) -> 'TrialStore':
+        """Builds a trial store from a dataset indexed by referent, participant and trial.
+
+        The order of the frames within a trial is preserved.
+        """
+        index = dataframe.index
+        r_codes, referents = pd.factorize(index.get_level_values('GestureType'), sort=True)
+        p_codes, participants = pd.factorize(index.get_level_values('ParticipantID'), sort=True)
+        t_codes, trials = pd.factorize(index.get_level_values('TrialID'), sort=True)
+
+        rows = np.lexsort((np.arange(len(index)), t_codes, p_codes, r_codes))
+        keys = np.stack([r_codes[rows], p_codes[rows], t_codes[rows]])
+
+        boundaries = np.flatnonzero(np.any(np.diff(keys, axis=1) != 0, axis=0)) + 1
+        offsets = np.concatenate([[0], boundaries, [len(rows)]]).astype(np.int64)
+        starts = offsets[:-1]
+
+        return TrialStore(
+            frames=np.ascontiguousarray(dataframe.values[rows]),
+            offsets=offsets,
+            rows=rows,
+            referent_codes=keys[0, starts],
+            participant_codes=keys[1, starts],
+            trial_codes=keys[2, starts],
+            referents=np.asarray(referents),
+            participants=np.asarray(participants),
+            trials=np.asarray(trials))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def find_trial(self, referent, participant, trial) -> Optional[int]:
+        """Returns the position of the given trial or None if it does not exist."""
+        return self._trial_lookup.get((referent, participant, trial))
+
+    def referent_trials(self, referent) -> range:
+        """Returns the positions of all trials of the given referent."""
+        code = self._referent_lookup.get(referent)
+        if code is None:
+            return range(0)
+        return range(self.referent_offsets[code], self.referent_offsets[code + 1])
+
+    def trial_slice(self, trial: int) -> slice:
+        """Returns the frame range of the given trial position."""
+        return slice(self.offsets[trial], self.offsets[trial + 1])
+
+    def referent_slice(self, referent) -> slice:
+        """Returns the frame range of all trials of the given referent."""
+        trials = self.referent_trials(referent)
+        return slice(self.offsets[trials.start], self.offsets[trials.stop])
+
+    def take(self, values: np.ndarray) -> np.ndarray:
+        """Reorders an array aligned with the rows of the original dataset into store order."""
+        return np.ascontiguousarray(values[self.rows])
+
+    def split(self, values: np.ndarray, trials: range) -> List[np.ndarray]:
+        """Splits an array in store order into one view per trial.
+
+        Parameters
+        ----------
+        values:
+            An array with the same number of rows as `frames`, e.g. the result of :meth take:.
+        trials:
+            A contiguous range of trial positions, e.g. the result of :meth referent_trials:.
+        """
+        if not trials:
+            return []
+
+        start = self.offsets[trials.start]
+        bounds = self.offsets[trials.start + 1:trials.stop] - start
+        return np.split(values[start:self.offsets[trials.stop]], bounds)
+
+    def trial_index(self, trials: Union[range, np.ndarray]) -> pd.MultiIndex:
+        """Returns the referent, participant and trial identifiers of the given trial positions."""
+        positions = np.asarray(trials, dtype=np.intp)
+        return pd.MultiIndex.from_arrays([
+            self.referents[self.referent_codes[positions]],
+            self.participants[self.participant_codes[positions]],
+            self.trials[self.trial_codes[positions]]
+        ], names=TRIAL_LEVELS)
@@ -1,6 +1,37 @@
 import { useEffect, useState, useRef } from 'react';
 import { BASE_URL } from './config';
 
+// Responses of the analytical POST routes by request, which are revalidated with their ETag
+const revalidated = new Map();
+const REVALIDATED_SIZE = 64;
+
+function fetch_revalidated(url, body) {
+    const key = `${url} ${body}`;
+    const cached = revalidated.get(key);
+    const headers = {'Content-Type': 'application/json'};
+    if (cached !== undefined) {
+        headers['If-None-Match'] = cached.etag;
+    }
+
+    return fetch(url, {method: 'POST', headers: headers, body: body})
+    .then(res => {
+        if (res.status === 304 && cached !== undefined) {
+            return cached.json;
+        }
+        return res.json().then(json => {
+            const etag = res.headers.get('ETag');
+            revalidated.delete(key);
+            if (etag) {
+                revalidated.set(key, {etag: etag, json: json});
+                if (revalidated.size > REVALIDATED_SIZE) {
+                    revalidated.delete(revalidated.keys().next().value);
+                }
+            }
+            return json;
+        })
+    })
+}
+
 export function useInitConfig(configID) {
     const [ loaded, setLoaded ] = useState("none");
 
@@ -39,7 +70,8 @@ export function useSkeletonGrid(domain, configID) {
             },
             body: JSON.stringify({
                 xrange: domain[0],
-                yrange: domain[1]
+                yrange: domain[1],
+                configID: configID
             })
         })
         .then(res => res.json())
@@ -52,12 +84,49 @@ export function useSkeletonGrid(domain, configID) {
 }
 
 
+export function fetch_decoded_batch(queries, configID, samples, mode) {
+    return fetch(`${BASE_URL}/api/data/decode/batch`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({queries: queries, samples: samples, mode: mode, configID: configID})
+    })
+    .then(res => res.json())
+}
+
+function fetch_frames(query, body) {
+    return fetch(`${BASE_URL}/api/data/frames/${query}`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify(body)
+    })
+    .then(res => res.json())
+}
+
+// The frame queries search the frames of all referents if gestures is undefined
+export function fetch_nearest_frames(point, configID, gestures, k) {
+    return fetch_frames('nearest', {point: point, k: k, gesture_type: gestures, configID: configID})
+}
+
+export function fetch_frames_within_radius(point, radius, configID, gestures) {
+    return fetch_frames('radius', {point: point, radius: radius, gesture_type: gestures, configID: configID})
+}
+
+export function fetch_frames_within_polygon(polygon, configID, gestures) {
+    return fetch_frames('polygon', {polygon: polygon, gesture_type: gestures, configID: configID})
+}
+
 export function useReconstructedSkeleton(hoverData, configID) {
     const [reconstructed, setReconstructed] = useState({data: undefined, type: undefined})
-    const [ isLoading, setIsLoading ] = useState(false);
+    const inFlight = useRef(false);
+    const pending = useRef(undefined);
 
     useEffect(() => {
         if (hoverData.latent_code.length === 0) {
+            pending.current = undefined
             setReconstructed({data: undefined, type: undefined})
             return;
         }
@@ -67,23 +136,31 @@ export function useReconstructedSkeleton(hoverData, configID) {
             return;
         }
 
-        if (!isLoading) {
-            setIsLoading(true)
-            fetch(`${BASE_URL}/api/data/decode/`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify(hoverData)
-            })
-            .then(res => res.json())
-            .then(setReconstructed)
-            .then(() => setIsLoading(false))
-            .catch(console.warn)
+        // Hover positions arriving while a request is in flight are coalesced,
+        // only the latest one is decoded once the request returned.
+        pending.current = hoverData.latent_code
+
+        const decodeNext = () => {
+            const latent_code = pending.current
+            pending.current = undefined
+
+            if (latent_code === undefined) {
+                inFlight.current = false
+                return;
             }
+
+            inFlight.current = true
+            // Hover previews are interpolated from the decoded lattice of the config
+            fetch_decoded_batch([latent_code], configID, undefined, 'lattice')
+            .then(res => setReconstructed({data: res.data[0].data, type: res.type}))
+            .catch(console.warn)
+            .then(decodeNext)
         }
-        
-    , [ hoverData, configID ])
+
+        if (!inFlight.current) {
+            decodeNext()
+        }
+    }, [ hoverData, configID ])
     return reconstructed
 }
 
@@ -107,7 +184,7 @@ export function useOriginalSkeleton(hoverData, configID) {
                 headers: {
                     'Content-Type': 'application/json'
                 },
-                body: JSON.stringify(hoverData)
+                body: JSON.stringify({...hoverData, configID: configID})
             })
             .then(res => res.json())
             .then(setOriginal)
@@ -132,7 +209,7 @@ export function useReferents(configID) {
             return;
         }
 
-        fetch(`${BASE_URL}/api/data/referents`)
+        fetch(`${BASE_URL}/api/data/referents?configID=${encodeURIComponent(configID)}`)
         .then(res => res.json())
         .then(setReferents)
         .catch(err => {
@@ -151,7 +228,11 @@ function get_selected_gestures(gestures) {
 }
 
 const defaultTrialData = {data: []};
-export function useLatentTrialData(gestures, configID) {
+
+// Approximate size in pixels of the main view, the trajectories are decimated for.
+const VIEWPORT_SIZE = 1024;
+
+export function useLatentTrialData(gestures, domain, configID) {
     const [trialData, setTrialData] = useState(defaultTrialData);
 
     useEffect(() => {
@@ -169,27 +250,55 @@ export function useLatentTrialData(gestures, configID) {
 
         console.log('Fetching latent trial data', gestures);
 
-        fetch(`${BASE_URL}/api/data/trials/values`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({gesture_type: selected_gestures})
-        })
-        .then(res => res.json())
+        fetch_revalidated(`${BASE_URL}/api/data/trials/values`, JSON.stringify({
+            gesture_type: selected_gestures,
+            viewport: {xrange: domain[0], yrange: domain[1], width: VIEWPORT_SIZE, height: VIEWPORT_SIZE},
+            configID: configID
+        }))
         .then(setTrialData)
         .catch(err => {
             console.log(err)
         })
     }
-    , [gestures, configID])
+    , [gestures, domain, configID])
 
     return trialData
 }
 
+const EMPTY_DENSITY_DATA = { data: [] }
+export function useDensityRaster(gestures, domain, configID) {
+    const [densityData, setDensityData] = useState(EMPTY_DENSITY_DATA);
+
+    useEffect(() => {
+        let selected_gestures = get_selected_gestures(gestures);
+
+        if (configID == "none") {
+            return;
+        }
+
+        if (selected_gestures.length === 0 || domain.length === 0) {
+            setDensityData(EMPTY_DENSITY_DATA)
+            return;
+        }
+
+        fetch_revalidated(`${BASE_URL}/api/data/density`, JSON.stringify({
+            gesture_type: selected_gestures,
+            xrange: domain[0],
+            yrange: domain[1],
+            configID: configID
+        }))
+        .then(setDensityData)
+        .catch(console.warn)
+    }
+    , [gestures, domain, configID])
+
+    return densityData
+}
+
 const EMPTY_BARYCENTER_DATA = { data: [] }
 export function useBaryCenters(gestures, configID) {
     const [barycenters, setBaryenters] = useState(EMPTY_BARYCENTER_DATA)
+    const [ retry, setRetry ] = useState(0)
     useEffect(() => {
         let selected_gestures = get_selected_gestures(gestures);
 
@@ -204,22 +313,23 @@ export function useBaryCenters(gestures, configID) {
         } else {
             console.log('Fetching barycenter data', gestures);
 
-            fetch(`${BASE_URL}/api/data/barycenters`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({
-                    gesture_type: selected_gestures,
-                    configID: configID,
-                })
+            fetch_revalidated(`${BASE_URL}/api/data/barycenters`, JSON.stringify({
+                gesture_type: selected_gestures,
+                configID: configID,
+            }))
+            .then(json => {
+                setBaryenters(json)
+
+                // Barycenters computed in the background are fetched again once they are ready
+                let pending = (json.pending || []).filter(item => item.status === "QUEUED" || item.status === "RUNNING")
+                if (pending.length > 0) {
+                    setTimeout(() => setRetry(prev => prev + 1), 3000)
+                }
             })
-            .then(res => res.json())
-            .then(setBaryenters)
             .catch(console.error)
         }
     }
-    , [ gestures, configID ])
+    , [ gestures, configID, retry ])
 
     return barycenters
 }
@@ -280,7 +390,8 @@ export function useClusteringConfig(referents, newConfig, configID) {
                         method: 'POST',
                         headers: {'Content-Type': 'application/json'},
                         body: JSON.stringify({
-                            referent: referent
+                            referent: referent,
+                            configID: configID
                         })
                     })
                         .then(res => res.json())
@@ -312,7 +423,8 @@ export function useClusteringConfig(referents, newConfig, configID) {
                             rid: referent,
                             k: config[referent].K,
                             init: config[referent].centroids,
-                            centroid_names: config[referent].centroid_names
+                            centroid_names: config[referent].centroid_names,
+                            configID: configID
                         })
                     })
                         .then(res => res.json())
@@ -385,7 +497,7 @@ export function useClusteringConfig(referents, newConfig, configID) {
                 .then(json => {
                     setConfigStatus(prev => ({...prev, ...json}))
 
-                    if (json.status !== "RUNNING") {
+                    if (json.status !== "RUNNING" && json.status !== "QUEUED") {
                         clearInterval(poller.current);
                         poller.current = null;
                     }
@@ -439,7 +551,7 @@ export function fetch_barycenter(callback, referent, configID) {
     })
 }
 
-export function fetch_animation_data(item, callback) {
+export function fetch_animation_data(item, callback, configID) {
     if ( item.ParticipantID !== undefined && item.TrialID !== undefined ) {
         console.log('fetch original data')
         fetch(`${BASE_URL}/api/data/raw/gesture`, {
@@ -448,7 +560,8 @@ export function fetch_animation_data(item, callback) {
             body: JSON.stringify({
                 rid: item.GestureType,
                 pid: item.ParticipantID,
-                tid: item.TrialID})
+                tid: item.TrialID,
+                configID: configID})
         })
         .then(res => res.json())
         .then(callback)
@@ -460,7 +573,8 @@ export function fetch_animation_data(item, callback) {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
-                latent_code: item.z1.map((coord, i) => [item.z1[i], item.z2[i]])
+                latent_code: item.z1.map((coord, i) => [item.z1[i], item.z2[i]]).filter(([z1, z2]) => z1 !== null && z2 !== null),
+                configID: configID
             })
         })
         .then(res => res.json())
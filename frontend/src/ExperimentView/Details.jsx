@@ -44,11 +44,12 @@ export default function Details(props) {
         referentSelections,
         colors,
         barycenters,
-        barycenterSelections
+        barycenterSelections,
+        configID
     } = props;
     
     const [ newClusterConfig, setNewClusterConfig ] = useState();
-    const [ clusteringConfig, configStatus, configList ] = useClusteringConfig(referents, newClusterConfig);
+    const [ clusteringConfig, configStatus, configList ] = useClusteringConfig(referents, newClusterConfig, configID);
     const [ onReferentSelected ] = useState(() => props.onReferentSelected);
     const [ onHighlighted ] = useState(() => props.onHighlighted);
     const [ handleSnackbar ] = useState(() => props.handleSnackbar);
@@ -40,6 +40,7 @@ export default function MainView(props) {
         animation2DData,
         barycenters,
         scatterPoints,
+        densityData,
         trialSelections,
         colors,
         skeletonGrid,
@@ -137,7 +138,10 @@ export default function MainView(props) {
             let xAxis = foregroundPlot.current._fullLayout.xaxis;
             let yAxis = foregroundPlot.current._fullLayout.yaxis;
 
-            let points = cc['z1'].map((p, i) => `${xAxis.c2p(p)},${yAxis.c2p(cc['z2'][i])}`).join(' ')
+            // Breaks between the parts of a trial within the viewport are null
+            let points = cc['z1'].map((p, i) => [p, cc['z2'][i]])
+                .filter(([x, y]) => x !== null && y !== null)
+                .map(([x, y]) => `${xAxis.c2p(x)},${yAxis.c2p(y)}`).join(' ')
 
             // Init Marker definition
             let markerDef = d3.select('#foreground .main-svg defs')
@@ -255,7 +259,7 @@ export default function MainView(props) {
             case 1:
                 return <DensityPlot
                     className={classes.background}
-                    data={scatterPoints}
+                    data={densityData}
                     colors={colors}
                     xrange={domain[0]}
                     yrange={domain[1]}/>
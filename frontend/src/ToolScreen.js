@@ -11,7 +11,7 @@ import AnimationSlider from './Animation';
 import { BASE_URL } from './config';
 import {
     fetch_animation_data, fetch_barycenter, useBaryCenters,
-    useInitConfig, useLatentTrialData,
+    useInitConfig, useLatentTrialData, useDensityRaster,
     useOriginalSkeleton, useReconstructedSkeleton,
     useReferents, useSkeletonGrid
 } from './DataServicec';
@@ -71,7 +71,8 @@ export default function ToolScreen() {
     const [referentSelections, setReferentSelections] = useReferentSelections(referents, configLoaded);
     const colors = useColors(referents);
 
-    const latentTrialDataValues = useLatentTrialData(referentSelections, configLoaded);
+    const latentTrialDataValues = useLatentTrialData(referentSelections, domain, configLoaded);
+    const densityData = useDensityRaster(referentSelections, domain, configLoaded);
     const barycenters = useBaryCenters(referentSelections, configLoaded);
 
     const [trialSelections, setTrialSelections] = useTrialSelections(latentTrialDataValues, configLoaded);
@@ -196,7 +197,7 @@ export default function ToolScreen() {
             setAnimationData(json);
             setPlayAnimation(true);
             setResetAnimation(true);
-        })
+        }, configLoaded)
     }
 
     function handleAnimationChanged(evt) {
@@ -281,6 +282,7 @@ export default function ToolScreen() {
                         onHighlighted={setCurrentHighlighted}
                         barycenters={barycenters}
                         barycenterSelections={barycenterSelections}
+                        configID={configLoaded}
                         hidden={false}
                     />
 
@@ -331,6 +333,7 @@ export default function ToolScreen() {
                         onChangeDimensions={onChangeDimensions}
                         skeletonGrid={skeletonGrid}
                         scatterPoints={latentTrialDataValues}
+                        densityData={densityData}
                         animation2DData={animation2DData}
                         trialSelections={trialSelections}
                         barycenters={barycenterSelections}
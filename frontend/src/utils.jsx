@@ -84,10 +84,11 @@ export function useTrialSelections(trialValues) {
             let updated = vals.map(item => {
                 let [key, updated_entries ] = item;
                 let prev_entries = prev[key];
+                // Trials are fetched again whenever the viewport changes, selections are kept
                 return [key, {
                     ...prev_entries,
                     ...updated_entries,
-                    checked: false}]
+                    checked: prev_entries !== undefined ? prev_entries.checked : false}]
             })
             return Object.fromEntries(updated)
         })
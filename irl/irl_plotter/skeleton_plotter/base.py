@@ -0,0 +1,64 @@
+import numpy as np
+
+from typing import List, Dict, Tuple
+
+
+class SkeletonPlotter():
+    """This class provides the batched extraction of skeleton paths shared by all plotters.
+
+    Subclasses define `PATHS`, a list of paths where each path is the list of joint names
+    that are connected by a line.
+    """
+
+    PATHS: List[List[str]] = []
+
+    def get_path_index(self, skeleton: Dict[str, int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Computes the gather index of all skeleton paths.
+
+        The index for the default skeleton mapping is computed once and reused.
+
+        Parameters
+        ----------
+        skeleton:
+            A dictionary mapping the joint names to their position in the data array.
+
+        Returns
+        -------
+            A tuple (index, offsets) where index holds the joint positions of all paths
+            concatenated and path `i` is `index[offsets[i]:offsets[i + 1]]`.
+        """
+        if skeleton is None and getattr(self, '_path_index', None) is not None:
+            return self._path_index
+
+        mapping = skeleton or self.skeleton
+        index = np.array([mapping[joint] for path in self.PATHS for joint in path])
+        offsets = np.cumsum([0] + [len(path) for path in self.PATHS])
+
+        if skeleton is None:
+            self._path_index = (index, offsets)
+
+        return index, offsets
+
+    def get_skeleton_paths_batch(self, data: np.ndarray, skeleton: Dict[str, int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Computes the skeleton paths of many poses at once.
+
+        Parameters
+        ----------
+        data:
+            A numpy array with shape [n_poses, n_joints, 3] representing the 3 dimensional
+            positions of the pose joints.
+        skeleton:
+            A dictionary mapping the joint names to their position in the data array.
+
+        Returns
+        -------
+            A tuple (points, offsets) where points is an array of shape [n_poses, n_points, 3]
+            and path `i` of pose `n` is `points[n, offsets[i]:offsets[i + 1]]`.
+        """
+        index, offsets = self.get_path_index(skeleton)
+        return data[:, index], offsets
+
+    @staticmethod
+    def split_paths(points: np.ndarray, offsets: np.ndarray) -> List[np.ndarray]:
+        """Splits the points of one pose returned by :meth get_skeleton_paths_batch: into paths."""
+        return np.split(points, offsets[1:-1])
@@ -4,10 +4,25 @@ from typing import List, Dict
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D  # noqa: F401 unused import
 
+from .base import SkeletonPlotter
 
-class HandPlotter():
+
+class HandPlotter(SkeletonPlotter):
     """This class provides utility methdos to create the data matrix to plot a hand pose"""
 
+    PATHS = [
+        # Path: palm -> thumb_metacarpal -> thumb_proximal -> thumb_middle -> thumb_distal
+        ['palm', 'thumb_metacarpal', 'thumb_proximal', 'thumb_middle', 'thumb_distal'],
+        # Path: palm -> index_metacarpal -> index_proximal -> index_middle -> index_distal
+        ['palm', 'index_metacarpal', 'index_proximal', 'index_middle', 'index_distal'],
+        # Path: palm -> middle_metacarpal -> middle_proximal -> middle_middle -> middle_distal
+        ['palm', 'middle_metacarpal', 'middle_proximal', 'middle_middle', 'middle_distal'],
+        # Path: palm -> ring_metacarpal -> ring_proximal -> ring_middle -> ring_distal
+        ['palm', 'ring_metacarpal', 'ring_proximal', 'ring_middle', 'ring_distal'],
+        # Path: palm -> pinky_metacarpal -> pinky_proximal -> pinky_middle -> pinky_distal
+        ['palm', 'pinky_metacarpal', 'pinky_proximal', 'pinky_middle', 'pinky_distal'],
+    ]
+
     def __init__(self, skeleton: Dict[str, int] = None):
         """Initializes a new HandPlotter instance.
 
@@ -79,40 +94,10 @@ class HandPlotter():
             A list of arrays of shape [-1, 3] where each element in the array defines a separate
             line in the graph.
         """
-        # Use the default skeleton mapping if not otherwise defined
-        skeleton = skeleton or self.skeleton
-
-        # initialize resulting path list
-        paths = []
-
-        # Path: palm -> thumb_metacarpal -> thumb_proximal -> thumb_middle -> thumb_distal
-        paths.append(data[[
-            skeleton['palm'], skeleton['thumb_metacarpal'], skeleton['thumb_proximal'], skeleton['thumb_middle'], skeleton['thumb_distal']
-        ]])
+        points, offsets = self.get_skeleton_paths_batch(data[np.newaxis], skeleton)
+        return self.split_paths(points[0], offsets)
 
-        # Path: palm -> index_metacarpal -> index_proximal -> index_middle -> index_distal
-        paths.append(data[[
-            skeleton['palm'], skeleton['index_metacarpal'], skeleton['index_proximal'], skeleton['index_middle'], skeleton['index_distal']
-        ]])
-
-        # Path: palm -> middle_metacarpal -> middle_proximal -> middle_middle -> middle_distal
-        paths.append(data[[
-            skeleton['palm'], skeleton['middle_metacarpal'], skeleton['middle_proximal'], skeleton['middle_middle'], skeleton['middle_distal']
-        ]])
-
-        # Path: palm -> ring_metacarpal -> ring_proximal -> ring_middle -> ring_distal
-        paths.append(data[[
-            skeleton['palm'], skeleton['ring_metacarpal'], skeleton['ring_proximal'], skeleton['ring_middle'], skeleton['ring_distal']
-        ]])
-
-        # Path: palm -> pinky_metacarpal -> pinky_proximal -> ankle_right -> foot_right
-        paths.append(data[[
-            skeleton['palm'], skeleton['pinky_metacarpal'], skeleton['pinky_proximal'], skeleton['pinky_middle'], skeleton['pinky_distal']
-        ]])
-
-        return paths
-
-    def plot(self, skeleton_data: np.ndarray, ax: plt.Axes, **kwargs) -> None:
+    def plot(self, skeleton_data: np.ndarray, ax: plt.Axes, paths: List[np.ndarray] = None, **kwargs) -> None:
         """Plots the skeleton data to a canvas.
         
         Parameters
@@ -121,13 +106,19 @@ class HandPlotter():
             A numpy array representing the individual skeleton joints.
         ax:
             A matplotlib Axis to plot the data against.
+        paths:
+            The skeleton paths of the pose if they have already been computed, e.g. with
+            :meth get_skeleton_paths_batch:.
         """
 
         skeleton_data = skeleton_data.reshape(-1, 3)
         palm = skeleton_data[self.skeleton['palm']]
         ax.scatter(palm[0], palm[1], palm[2], c="g", s=3)
 
-        for p in self.get_skeleton_paths(skeleton_data):
+        if paths is None:
+            paths = self.get_skeleton_paths(skeleton_data)
+
+        for p in paths:
             c = kwargs.get('color', 'b')
             ax.plot(xs=p[:, 0], ys=p[:, 1], zs=p[:, 2], c=c)
 
@@ -5,10 +5,25 @@ from typing import List, Dict
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D  # noqa: F401 unused import
 
+from .base import SkeletonPlotter
 
-class WholeBodyPlotter():
+
+class WholeBodyPlotter(SkeletonPlotter):
     """This class provides utility methdos to create the data matrix to plot a whole body gesture."""
 
+    PATHS = [
+        # Path: head -> shoulder_center -> spine -> hip_center
+        ['head', 'shoulder_center', 'spine', 'hip_center'],
+        # Path: shoulder_center -> shoulder_left -> elbow_left -> wrist_left -> hand_left
+        ['shoulder_center', 'shoulder_left', 'elbow_left', 'wrist_left', 'hand_left'],
+        # Path: shoulder_center -> shoulder_right -> elbow_right -> wrist_right -> hand_right
+        ['shoulder_center', 'shoulder_right', 'elbow_right', 'wrist_right', 'hand_right'],
+        # Path: hip_center -> hip_left -> knee_left -> ankle_left -> foot_left
+        ['hip_center', 'hip_left', 'knee_left', 'ankle_left', 'foot_left'],
+        # Path: hip_center -> hip_right -> knee_right -> ankle_right -> foot_right
+        ['hip_center', 'hip_right', 'knee_right', 'ankle_right', 'foot_right'],
+    ]
+
     def __init__(self, skeleton: Dict[str, int]):
         """Initializes a new WholeBodyPlotter instance.
 
@@ -86,40 +101,10 @@ class WholeBodyPlotter():
             A list of arrays of shape [-1, 3] where each element in the array defines a separate
             line in the graph.
         """
-        # Use the default skeleton mapping if not otherwise defined
-        skeleton = skeleton or self.skeleton
-
-        # initialize resulting path list
-        paths = []
-
-        # Path: head -> shoulder_center -> spine -> hip_center
-        paths.append(data[[
-            skeleton['head'], skeleton['shoulder_center'], skeleton['spine'], skeleton['hip_center']
-        ]])
-
-        # Path: shoulder_center -> shoulder_left -> elbow_left -> wrist_left -> hand_left
-        paths.append(data[[
-            skeleton['shoulder_center'], skeleton['shoulder_left'], skeleton['elbow_left'], skeleton['wrist_left'], skeleton['hand_left']
-        ]])
-
-        # Path: shoulder_center -> shoulder_right -> elbow_right -> wrist_right -> hand_right
-        paths.append(data[[
-            skeleton['shoulder_center'], skeleton['shoulder_right'], skeleton['elbow_right'], skeleton['wrist_right'], skeleton['hand_right']
-        ]])
-
-        # Path: hip_center -> hip_left -> knee_left -> ankle_left -> foot_left
-        paths.append(data[[
-            skeleton['hip_center'], skeleton['hip_left'], skeleton['knee_left'], skeleton['ankle_left'], skeleton['foot_left']
-        ]])
-
-        # Path: hip_center -> hip_right -> knee_right -> ankle_right -> foot_right
-        paths.append(data[[
-            skeleton['hip_center'], skeleton['hip_right'], skeleton['knee_right'], skeleton['ankle_right'], skeleton['foot_right']
-        ]])
-
-        return paths
+        points, offsets = self.get_skeleton_paths_batch(data[np.newaxis], skeleton)
+        return self.split_paths(points[0], offsets)
 
-    def plot(self, skeleton_data: np.ndarray, ax: plt.Axes, *args, **kwargs) -> None:
+    def plot(self, skeleton_data: np.ndarray, ax: plt.Axes, *args, paths: List[np.ndarray] = None, **kwargs) -> None:
         """Plots the skeleton data to a canvas.
 
         Parameters
@@ -128,10 +113,13 @@ class WholeBodyPlotter():
             A numpy array representing the individual skeleton joints.
         ax:
             A matplotlib Axis to plot the data against.
+        paths:
+            The skeleton paths of the pose if they have already been computed, e.g. with
+            :meth get_skeleton_paths_batch:.
         """
 
         skeleton_data = skeleton_data.reshape(-1, 3)
-        skeleton_paths = self.get_skeleton_paths(data=skeleton_data)
+        skeleton_paths = paths if paths is not None else self.get_skeleton_paths(data=skeleton_data)
 
         for p in skeleton_paths:
             ax.scatter(xs=p[:, 0], ys=p[:, 1], zs=p[:, 2], s=2, *args, **kwargs)
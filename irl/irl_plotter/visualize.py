@@ -17,6 +17,17 @@ class Visualizer:
 
     def __init__(self, plotter):
         self.plotter = plotter
+
+    def get_paths(self, data):
+        """Computes the skeleton paths of all poses in data with one batched call.
+
+        Returns
+        -------
+        A list containing the list of skeleton paths of each pose.
+        """
+        data = np.asarray(data)
+        points, offsets = self.plotter.get_skeleton_paths_batch(data.reshape(data.shape[0], -1, 3))
+        return [self.plotter.split_paths(p, offsets) for p in points]
         
     def get_random_samples(self, data, n_samples):
         N, feature_size = data.shape
@@ -36,13 +47,15 @@ class Visualizer:
         with torch.no_grad():
             model.eval()
             reconstruction, mean, logvar = model(torch.from_numpy(samples).double())
+            sample_paths = self.get_paths(samples)
+            reconstruction_paths = self.get_paths(reconstruction.numpy())
 
             for i in range(samples.shape[0]):
                 orig_ax = fig.add_subplot(nrows, ncols, next(subplot_iterator), projection='3d')
                 rec_ax = fig.add_subplot(nrows, ncols, next(subplot_iterator), projection='3d')
 
-                self.plotter.plot(samples[i], orig_ax, color='b')
-                self.plotter.plot(reconstruction[i], rec_ax, color='g')
+                self.plotter.plot(samples[i], orig_ax, color='b', paths=sample_paths[i])
+                self.plotter.plot(reconstruction[i], rec_ax, color='g', paths=reconstruction_paths[i])
 
         plt.tight_layout()
         return fig
@@ -72,9 +85,10 @@ class Visualizer:
                 reconstruction = model.decode(interpolated_samples)
 
                 row_samples = np.vstack([samples[start_sample_idx], reconstruction, samples[end_sample_idx]])
-                
-                for rw in row_samples:
-                    self.plotter.plot(rw, fig.add_subplot(nrows, ncols, next(subplot_iterator), projection='3d'))
+                row_paths = self.get_paths(row_samples)
+
+                for rw, paths in zip(row_samples, row_paths):
+                    self.plotter.plot(rw, fig.add_subplot(nrows, ncols, next(subplot_iterator), projection='3d'), paths=paths)
         
         return fig
 
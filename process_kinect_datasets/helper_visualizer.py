@@ -6,8 +6,8 @@ import mpl_toolkits.mplot3d.axes3d as p3
 import matplotlib.animation as animation
 from irl_plotter import WholeBodyPlotter
 
-def update_animation(num, skeletons, plots):
-    for path, plot in zip(skeletons[num], plots):
+def update_animation(num, points, offsets, plots):
+    for path, plot in zip(plotter.split_paths(points[num], offsets), plots):
         plot.set_data(path.transpose()[[0, 2], :])
         plot.set_3d_properties(path[:, 1])
     return plots
@@ -26,8 +26,8 @@ plotter = WholeBodyPlotter(skeleton=dict(
 
 
 data = pd.read_csv(sys.argv[1], index_col=['GestureType', 'ParticipantID', 'TrialID', 'Timestamp', 'NumJoints'])
-skeletons = [plotter.get_skeleton_paths(dat.reshape(20, 3)) for dat in data.values]
-plots = [ax.plot(p[:, 0], p[:, 2], p[:, 1], 'b-o', markersize=10, linewidth=3)[0] for i, p in enumerate(skeletons[0])]
+points, offsets = plotter.get_skeleton_paths_batch(data.values.reshape(-1, 20, 3))
+plots = [ax.plot(p[:, 0], p[:, 2], p[:, 1], 'b-o', markersize=10, linewidth=3)[0] for i, p in enumerate(plotter.split_paths(points[0], offsets))]
 
 # Setting the axes properties
 ax.set_xlabel('X')
@@ -39,7 +39,7 @@ ax.set_ylim((-1, 1))
 ax.set_title('3D Test')
 
 # Creating the Animation object
-play_sequence = animation.FuncAnimation(fig, update_animation, len(skeletons) - 1, fargs=(skeletons, plots),
+play_sequence = animation.FuncAnimation(fig, update_animation, len(points) - 1, fargs=(points, offsets, plots),
                                    interval=40, blit=False)
 
 plt.show()
\ No newline at end of file